@@ -0,0 +1,134 @@
+"""関西観光データ分析システムのコマンドライン（入力待ちをしない）
+
+  python cli.py ingest [地名 ...] [--catalogue PATH] [--full]
+  python cli.py report 地名
+  python cli.py batch-report [地名 ...] [--all] [--processes N]
+  python cli.py stats
+  python cli.py serve [--host 127.0.0.1] [--port 8000]
+
+環境変数 METRICS=1 / METRICS_PORT / METRICS_FILE で計測を有効にできる（計測.py を参照）
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# フォルダの場所を正しく認識させる設定（main.py と同じ）
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+# 共通モジュール（通信.py など）はリポジトリ直下にある
+sys.path.append(os.path.dirname(current_dir))
+
+import 起動計測
+
+
+def cmd_ingest(args):
+    from src.データベース import DBHandler
+    from src.データ取得 import WikiFetcher
+    from src.カタログ import KANSAI_SPOTS, CatalogueIngest
+    from src.更新 import refresh_spots
+
+    db = DBHandler(args.db, args.data_dir)
+    fetcher = WikiFetcher(api_url=args.api_url) if args.api_url else WikiFetcher()
+    if args.catalogue:
+        ingest = CatalogueIngest(db, fetcher, checkpoint_path=args.catalogue + ".checkpoint.json",
+                                 skip_fresh=not args.full)
+        counts = ingest.run(args.catalogue)
+    else:
+        counts = refresh_spots(db, fetcher, args.spots or KANSAI_SPOTS, full=args.full)
+    print(json.dumps(counts, ensure_ascii=False))
+
+
+def cmd_report(args):
+    from src.可視化 import TravelVisualizer
+
+    print(TravelVisualizer(args.db, args.data_dir).generate_report(args.area_name))
+
+
+def cmd_batch_report(args):
+    from src.データベース import DBHandler
+    from src.可視化 import TravelVisualizer
+
+    targets = DBHandler(args.db, args.data_dir).get_area_names() if args.all else args.spots
+    if not targets:
+        print("地名を指定するか、--all を付けてください。")
+        return 1
+    started = time.perf_counter()
+    results = TravelVisualizer(args.db, args.data_dir).generate_reports(targets, args.output_dir, args.processes)
+    failed = [message for message in results.values() if not message.startswith("【成功】")]
+    for message in failed:
+        print(message)
+    print(f"{len(results) - len(failed)} 枚を保存しました（{time.perf_counter() - started:.2f}秒）")
+    return 1 if failed else 0
+
+
+def cmd_stats(args):
+    from src.データベース import DBHandler
+
+    print(json.dumps(DBHandler(args.db, args.data_dir).get_stats(), ensure_ascii=False, indent=1))
+
+
+def cmd_serve(args):
+    from src.データベース import DBHandler
+    from src.可視化 import TravelVisualizer
+    from src.配信 import ReportService, make_server
+
+    service = ReportService(DBHandler(args.db, args.data_dir), TravelVisualizer(args.db, args.data_dir))
+    server = make_server(service, args.host, args.port, args.workers)
+    host, port = server.server_address[:2]
+    print(f"http://{host}:{port}/report/<地名>.png で配信中（/stats, /spots も利用可。Ctrl+C で終了）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="関西観光データ分析システム")
+    parser.add_argument("--db", default="travel_analysis.db", help="data フォルダ内のDBファイル名")
+    parser.add_argument("--data-dir", help="DBを置くフォルダ（省略時は data フォルダ）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="Wikipedia から取得してDBに保存")
+    p.add_argument("spots", nargs="*", help="地名（省略時は組み込みの関西の地名）")
+    p.add_argument("--catalogue", help="CSV / JSONL（地名、またはカテゴリ一覧の応答を1行に1つ）")
+    p.add_argument("--full", action="store_true", help="取得済みでもすべて取り直す")
+    p.add_argument("--api-url", help="MediaWiki API のURL（スタブサーバーで試すときなど）")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("report", help="1か所のグラフを保存")
+    p.add_argument("area_name")
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("batch-report", help="複数の地名のグラフをまとめて保存")
+    p.add_argument("spots", nargs="*")
+    p.add_argument("--all", action="store_true", help="DBにあるすべての地名")
+    p.add_argument("--output-dir", default="output")
+    p.add_argument("--processes", type=int, help="並列に描くプロセス数")
+    p.set_defaults(func=cmd_batch_report)
+
+    p = sub.add_parser("stats", help="DBの件数と鮮度を表示")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("serve", help="グラフを返すHTTPサーバーを起動")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--workers", type=int, default=8, help="同時に処理するリクエスト数")
+    p.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # 各コマンドは、必要なモジュールだけをその場で読み込む
+    起動計測.mark("引数の解析")
+    status = args.func(args) or 0
+    起動計測.mark("完了")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,39 +4,53 @@ import os
 # フォルダの場所を正しく認識させる設定
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
+# 共通モジュール（通信.py など）はリポジトリ直下にある
+sys.path.append(os.path.dirname(current_dir))
+
+import 起動計測
 
 # 自作したファイルの読み込み
+# （グラフの src.可視化 は pandas と matplotlib を使うので、地名が入力されてから読み込む）
 try:
     from src.データベース import DBHandler
     from src.データ取得 import WikiFetcher
-    from src.可視化 import TravelVisualizer
+    from src.更新 import refresh_spots
+    from src.カタログ import KANSAI_SPOTS, CatalogueIngest
 except ImportError as e:
     print(f"エラー: ファイルが見つかりません。フォルダ構造を確認してください。\n{e}")
     sys.exit()
 
-import random
-
 def main():
     print("--- システムを起動しています ---")
+    起動計測.mark("最初の出力")
     db = DBHandler()
     fetcher = WikiFetcher()
-    viz = TravelVisualizer()
 
-    kansai_spots = ["清水寺", "金閣寺", "東大寺", "ユニバーサル・スタジオ・ジャパン", "有馬温泉", "姫路城"]
+    kansai_spots = list(KANSAI_SPOTS)
     
     print("Wikipediaからデータを確認中...")
-    for spot in kansai_spots:
-        length = fetcher.fetch_length(spot)
-        # 知名度に応じた価格をシミュレーション
-        price = (length // 6) + random.randint(8000, 18000)
-        db.upsert_data(spot, length, price)
+    # 前回から時間がたった地名だけ版情報を問い合わせ、記事が変わったものだけ保存し直す
+    # （--full を付けると全件を取り直す）
+    counts = refresh_spots(db, fetcher, kansai_spots, full="--full" in sys.argv)
+    print(f"最新 {counts['fresh']} 件 / 変更なし {counts['unchanged']} 件 / "
+          f"更新 {counts['updated']} 件 / 失敗 {counts['failed']} 件")
+
+    # --catalogue <CSV/JSONL（地名、またはカテゴリ一覧の応答を1行に1つ）> で、大きなカタログをまとめて取り込む
+    if "--catalogue" in sys.argv[:-1]:
+        path = sys.argv[sys.argv.index("--catalogue") + 1]
+        print(f"カタログを取り込み中: {path}（中断しても次回は続きから）")
+        counts = CatalogueIngest(db, fetcher, checkpoint_path=path + ".checkpoint.json").run(path)
+        print(f"読み込み {counts['read']} 件 / 保存 {counts['updated']} 件 / "
+              f"取得済みで省略 {counts['skipped']} 件 / 失敗 {counts['failed']} 件")
 
     print("\n--- 関西観光データ分析システム ---")
     print(f"分析可能リスト: {', '.join(kansai_spots)}")
+    起動計測.mark("入力待ち")
     target = input("分析したい地名を入力してください: ")
     
     if target:
-        result = viz.generate_report(target)
+        from src.可視化 import TravelVisualizer
+        result = TravelVisualizer().generate_report(target)
         print(result)
     else:
         print("地名が入力されませんでした。")
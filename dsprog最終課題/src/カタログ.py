@@ -0,0 +1,240 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from itertools import islice
+
+from .更新 import MAX_AGE, simulate_price
+
+# 1回に Wikipedia へ問い合わせて DB に書く地名の数
+CHUNK_SIZE = 500
+# 段と段のあいだで待たせておけるチャンク数（これを超えると前の段が待つ）
+QUEUE_SIZE = 4
+# CSV で地名として読む列（最初に見つかったもの）
+NAME_COLUMNS = ("area_name", "name", "title", "地名")
+
+# カタログを指定しないときに使う、組み込みの地名
+KANSAI_SPOTS = ("清水寺", "金閣寺", "東大寺", "ユニバーサル・スタジオ・ジャパン", "有馬温泉", "姫路城")
+
+_DONE = object()
+
+
+# --- 読み込み元（どれも (通し番号, 地名) を1件ずつ返す） ---
+
+def iter_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        column = next((c for c in NAME_COLUMNS if c in (reader.fieldnames or [])), None)
+        if column is None:
+            raise ValueError(f"{path}: 地名の列（{', '.join(NAME_COLUMNS)}）がありません")
+        for i, row in enumerate(reader):
+            yield i, row[column].strip()
+
+
+def iter_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            name = record if isinstance(record, str) else next(
+                (record[c] for c in NAME_COLUMNS if c in record), None)
+            yield i, name
+
+
+def iter_category(path):
+    """list=categorymembers の応答を、続き（cmcontinue）の順に1行に1つずつ保存したファイルを読む"""
+    i = 0
+    with open(path, encoding="utf-8") as f:
+        # 1行（応答1つ）ずつ読むので、ファイル全体をメモリに載せない
+        for line in f:
+            if not line.strip():
+                continue
+            response = json.loads(line)
+            for member in response.get("query", {}).get("categorymembers", []):
+                # 記事（名前空間0）だけ。サブカテゴリやファイルは除く
+                if member.get("ns", 0) == 0:
+                    yield i, member["title"]
+                i += 1
+
+
+def _is_category_dump(path):
+    # 最初の行が API の応答（"query" を持つ辞書）なら、カテゴリ一覧を保存したもの
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                return isinstance(record, dict) and "query" in record
+    return False
+
+
+def open_catalogue(path):
+    """拡張子（.jsonl は最初の行）に合った読み込み元を返す"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return iter_csv(path)
+    if ext == ".jsonl":
+        return iter_category(path) if _is_category_dump(path) else iter_jsonl(path)
+    if ext == ".json":
+        raise ValueError(f"{path}: カテゴリ一覧は、応答を1行に1つずつ並べた JSON Lines（.jsonl）で保存してください")
+    raise ValueError(f"対応していない形式です: {path}")
+
+
+# --- 取り込み ---
+
+class CatalogueIngest:
+    """カタログを 読み込み → Wikipedia 取得 → DB 書き込み の3段で流し込む
+
+    段のあいだは上限つきのキューでつなぎ、後ろの段が遅いと前の段が待つので、
+    カタログが大きくてもメモリに載るのはチャンク数個分だけ。
+    書き込みが終わったところまでをチェックポイントに残し、中断しても続きから再開できる。
+    """
+    def __init__(self, db, fetcher, checkpoint_path=None, chunk_size=CHUNK_SIZE,
+                 queue_size=QUEUE_SIZE, skip_fresh=True, max_age=MAX_AGE):
+        self.db = db
+        self.fetcher = fetcher
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.skip_fresh = skip_fresh
+        self.max_age = max_age
+        self.stop_event = threading.Event()
+        self.error = None
+        self.counters = {"read": 0, "skipped": 0, "updated": 0, "failed": 0, "chunks": 0}
+
+    # --- チェックポイント ---
+
+    def load_checkpoint(self, source):
+        if not self.checkpoint_path:
+            return {"source": source, "done": 0, "failed": []}
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            checkpoint = None
+        if not checkpoint or checkpoint.get("source") != source:
+            # 別のカタログのチェックポイントは使わない
+            return {"source": source, "done": 0, "failed": []}
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint):
+        if not self.checkpoint_path:
+            return
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(tmp, self.checkpoint_path)
+
+    # --- 各段 ---
+
+    def _put(self, q, item):
+        # キューが空くまで待つ（止められたらあきらめる）
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self, records, done, retry, out):
+        try:
+            # 前回失敗した地名を先にやり直す（通し番号は進めない）
+            if retry:
+                self._put(out, (done, retry))
+            pending = ((i, name) for i, name in records if i >= done and name)
+            while not self.stop_event.is_set():
+                chunk = list(islice(pending, self.chunk_size))
+                if not chunk:
+                    break
+                self._put(out, (chunk[-1][0] + 1, [name for _, name in chunk]))
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(out, _DONE)
+
+    def _fetch(self, inp, out):
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    item = inp.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                end, names = item
+                names = list(dict.fromkeys(names))
+                self.counters["read"] += len(names)
+                if self.skip_fresh:
+                    names = self._drop_fresh(names)
+                infos = self.fetcher.fetch_page_info(names) if names else {}
+                self._put(out, (end, infos))
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(out, _DONE)
+
+    def _drop_fresh(self, names):
+        now = time.time()
+        known = self.db.get_freshness(names)
+        stale = [n for n in names
+                 if n not in known or known[n][1] is None or now - known[n][1] > self.max_age]
+        self.counters["skipped"] += len(names) - len(stale)
+        return stale
+
+    def _write(self, inp, checkpoint):
+        while True:
+            item = inp.get()
+            if item is _DONE:
+                break
+            end, infos = item
+            now = time.time()
+            rows = [(name, info["length"], simulate_price(info["length"]), now,
+                     info["lastrevid"], info["touched"])
+                    for name, info in infos.items() if info is not None]
+            failed = [name for name, info in infos.items() if info is None]
+            if rows:
+                self.db.upsert_pages(rows)
+
+            # 書き込めたところまで進める。失敗した地名は次回やり直す
+            if end > checkpoint["done"]:
+                checkpoint["done"] = end
+                checkpoint["failed"] = [n for n in checkpoint["failed"] if n not in infos]
+            else:
+                checkpoint["failed"] = []
+            checkpoint["failed"] += failed
+            self._save_checkpoint(checkpoint)
+
+            self.counters["updated"] += len(rows)
+            self.counters["failed"] += len(failed)
+            self.counters["chunks"] += 1
+
+    def run(self, path):
+        """カタログを取り込み、件数の内訳を返す（Ctrl+C で止めても続きから再開できる）"""
+        source = os.path.abspath(path)
+        checkpoint = self.load_checkpoint(source)
+        records = open_catalogue(path)
+
+        to_fetch = queue.Queue(maxsize=self.queue_size)
+        to_write = queue.Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(target=self._read, daemon=True, name="catalogue-read",
+                             args=(records, checkpoint["done"], list(checkpoint["failed"]), to_fetch)),
+            threading.Thread(target=self._fetch, daemon=True, name="catalogue-fetch",
+                             args=(to_fetch, to_write)),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            # DB への書き込みは呼び出し元のスレッドで行う（接続はスレッドごと）
+            self._write(to_write, checkpoint)
+        finally:
+            # 途中で止まった場合も、ほかの段を待たせたままにしない
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+        if self.error is not None:
+            raise self.error
+        return dict(self.counters, done=checkpoint["done"])
@@ -1,22 +1,40 @@
-import sqlite3
 import os
+import time
+
+import 計測
+from .接続管理 import DB_NAME, get_manager, resolve_db_path
+from .更新 import MAX_AGE
+
+# 文字数と価格だけを更新する（id と版情報の列はそのまま残す）
+UPSERT_SQL = """
+    INSERT INTO tourist_spots (area_name, wiki_length, avg_price)
+    VALUES (?, ?, ?)
+    ON CONFLICT(area_name) DO UPDATE SET
+        wiki_length = excluded.wiki_length, avg_price = excluded.avg_price
+"""
+# Wikipedia の版情報つきで保存する（id はそのまま残す）
+UPSERT_PAGE_SQL = """
+    INSERT INTO tourist_spots (area_name, wiki_length, avg_price, fetched_at, lastrevid, touched)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(area_name) DO UPDATE SET
+        wiki_length = excluded.wiki_length, avg_price = excluded.avg_price,
+        fetched_at = excluded.fetched_at, lastrevid = excluded.lastrevid, touched = excluded.touched
+"""
+# 後から追加した列（古いDBには ALTER TABLE で足す）
+FRESHNESS_COLUMNS = {"fetched_at": "REAL", "lastrevid": "INTEGER", "touched": "TEXT"}
 
 class DBHandler:
-    def __init__(self, db_name="travel_analysis.db"):
+    def __init__(self, db_name=DB_NAME, data_dir=None):
         # main.pyと同じ階層にある「data」フォルダを確実に指定する
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        self.data_dir = os.path.join(base_dir, "data")
-        
-        # もしdataフォルダがなければ、ここで自動作成する
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
-            
-        self.db_path = os.path.join(self.data_dir, db_name)
+        # （ベンチマークなどで別の場所に置くときは data_dir で指定）
+        self.db_path = resolve_db_path(db_name, data_dir)
+        self.data_dir = os.path.dirname(self.db_path)
+        # 接続は毎回開かず、同じDBを使うクラスどうしで共有する
+        self.manager = get_manager(self.db_path)
         self.create_table()
 
     def create_table(self):
-        # 確実に「絶対パス」を使ってデータベースを開く
-        with sqlite3.connect(self.db_path) as conn:
+        with self.manager.transaction() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS tourist_spots (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -25,10 +43,64 @@ class DBHandler:
                     avg_price INTEGER
                 )
             """)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(tourist_spots)")}
+            for name, type_ in FRESHNESS_COLUMNS.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE tourist_spots ADD COLUMN {name} {type_}")
 
     def upsert_data(self, area, length, price):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO tourist_spots (area_name, wiki_length, avg_price)
-                VALUES (?, ?, ?)
-            """, (area, length, price))
\ No newline at end of file
+        self.upsert_many([(area, length, price)])
+
+    def upsert_many(self, rows):
+        """(地名, 文字数, 価格) をまとめて1トランザクションで書き込む"""
+        rows = list(rows)
+        with self.manager.transaction() as conn:
+            conn.executemany(UPSERT_SQL, rows)
+        return len(rows)
+
+    def upsert_pages(self, rows):
+        """(地名, 文字数, 価格, 取得時刻, 最新版ID, 更新時刻) をまとめて書き込む"""
+        rows = list(rows)
+        with self.manager.transaction() as conn:
+            conn.executemany(UPSERT_PAGE_SQL, rows)
+        return len(rows)
+
+    def mark_fetched(self, areas, fetched_at):
+        """記事が変わっていなかった地名の、確認した時刻だけを更新する"""
+        with self.manager.transaction() as conn:
+            conn.executemany("UPDATE tourist_spots SET fetched_at = ? WHERE area_name = ?",
+                             [(fetched_at, area) for area in areas])
+
+    @計測.timed("db_seconds", op="get_freshness")
+    def get_freshness(self, areas):
+        """{地名: (最新版ID, 取得時刻)}（DBにない地名は含まない）"""
+        conn = self.manager.connection()
+        result = {}
+        areas = list(areas)
+        # SQLite の変数の上限を超えないよう、分けて問い合わせる
+        for i in range(0, len(areas), 500):
+            chunk = areas[i:i + 500]
+            cursor = conn.execute(
+                "SELECT area_name, lastrevid, fetched_at FROM tourist_spots "
+                f"WHERE area_name IN ({','.join('?' * len(chunk))})", chunk)
+            for area, lastrevid, fetched_at in cursor:
+                result[area] = (lastrevid, fetched_at)
+        return result
+
+    @計測.timed("db_seconds", op="get_stats")
+    def get_stats(self, max_age=MAX_AGE):
+        """件数・平均値・取得時刻の範囲と、取り直しが必要な件数"""
+        conn = self.manager.connection()
+        count, avg_length, avg_price, oldest, newest = conn.execute("""
+            SELECT COUNT(*), AVG(wiki_length), AVG(avg_price), MIN(fetched_at), MAX(fetched_at)
+            FROM tourist_spots
+        """).fetchone()
+        stale = conn.execute(
+            "SELECT COUNT(*) FROM tourist_spots WHERE fetched_at IS NULL OR fetched_at < ?",
+            (time.time() - max_age,)).fetchone()[0]
+        return {"spots": count, "avg_wiki_length": avg_length, "avg_price": avg_price,
+                "oldest_fetch": oldest, "newest_fetch": newest, "stale": stale}
+
+    def get_area_names(self):
+        conn = self.manager.connection()
+        return [row[0] for row in conn.execute("SELECT area_name FROM tourist_spots ORDER BY id")]
@@ -1,15 +1,110 @@
-import requests
+import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import 計測
+from 通信 import get_client
+
+API_URL = "https://ja.wikipedia.org/w/api.php"
+# MediaWiki API が1回のクエリで受け付けるタイトル数の上限（通常ユーザー）
+MAX_TITLES_PER_QUERY = 50
+# 記事が見つからなかったときの値
+MISSING_PAGE = {"length": 0, "lastrevid": 0, "touched": None}
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """一定間隔以上あけてリクエストを出すためのレート制限"""
+    def __init__(self, requests_per_sec=1.0):
+        self.interval = 1.0 / requests_per_sec if requests_per_sec > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        # 次に送信してよい時刻を予約してから、その時刻まで待つ
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
 
 class WikiFetcher:
+    def __init__(self, requests_per_sec=1.0, max_workers=4, batch_size=MAX_TITLES_PER_QUERY, client=None,
+                 api_url=API_URL):
+        self.client = client or get_client()
+        # ベンチマークではローカルのスタブサーバーに向ける
+        self.api_url = api_url
+        self.limiter = RateLimiter(requests_per_sec)
+        self.max_workers = max_workers
+        self.batch_size = min(batch_size, MAX_TITLES_PER_QUERY)
+
     def fetch_length(self, area_name):
-        url = "https://ja.wikipedia.org/w/api.php"
-        params = {"action": "query", "format": "json", "titles": area_name, "prop": "info"}
+        return self.fetch_lengths([area_name]).get(area_name, 0)
+
+    def fetch_lengths(self, titles):
+        """複数の記事の文字数をまとめて取得（{タイトル: 文字数}）"""
+        return {title: info["length"] if info else 0
+                for title, info in self.fetch_page_info(titles).items()}
+
+    def fetch_page_info(self, titles):
+        """記事の文字数・最新版ID・更新時刻をまとめて取得
+
+        {タイトル: {"length", "lastrevid", "touched"}} を返す。記事がなければ length と
+        lastrevid が 0、通信に失敗したタイトルは None。
+        """
+        titles = list(dict.fromkeys(titles))  # 重複を除いて順序は保持
+        batches = [titles[i:i + self.batch_size] for i in range(0, len(titles), self.batch_size)]
+
+        infos = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for result in executor.map(self._fetch_batch, batches):
+                infos.update(result)
+        return infos
+
+    def _fetch_batch(self, titles):
+        params = {
+            "action": "query",
+            "format": "json",
+            "titles": "|".join(titles),
+            "prop": "info",
+            "redirects": 1,
+        }
         try:
-            time.sleep(1.0)
-            res = requests.get(url, params=params).json()
-            pages = res.get("query", {}).get("pages", {})
-            for pid, info in pages.items():
-                return info.get("length", 0) if pid != "-1" else 0
-        except:
-            return 0
\ No newline at end of file
+            self.limiter.wait()
+            res = self.client.get_json(self.api_url, params=params)
+        except Exception as e:
+            # 失敗したタイトルは None にして、呼び出し側で次回やり直してもらう
+            logger.warning("Wikipedia の取得に失敗しました（%d件, 先頭: %s）: %s", len(titles), titles[0], e)
+            計測.inc("wiki_fetch_errors_total")
+            return {t: None for t in titles}
+
+        query = res.get("query", {})
+        # 表記ゆれの正規化とリダイレクトを、元のタイトルから辿れるようにする
+        mapping = {}
+        for item in query.get("normalized", []) + query.get("redirects", []):
+            mapping[item["from"]] = item["to"]
+
+        infos_by_title = {}
+        for pid, info in query.get("pages", {}).items():
+            if "missing" in info or "invalid" in info or pid.startswith("-"):
+                continue
+            infos_by_title[info["title"]] = {
+                "length": info.get("length", 0),
+                "lastrevid": info.get("lastrevid", 0),
+                "touched": info.get("touched"),
+            }
+
+        result = {}
+        for title in titles:
+            resolved = title
+            seen = set()
+            while resolved in mapping and resolved not in seen:
+                seen.add(resolved)
+                resolved = mapping[resolved]
+            result[title] = infos_by_title.get(resolved, dict(MISSING_PAGE))
+        return result
@@ -1,37 +1,265 @@
-import sqlite3
-import pandas as pd
-import matplotlib.pyplot as plt
+import io
 import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
-# 日本語フォントの設定（Mac用）
-plt.rcParams['font.family'] = 'Hiragino Sans'
+import numpy as np
+
+import 計測
+from .接続管理 import DB_NAME, get_manager, resolve_db_path
+
+# この件数以上をまとめて描くときはプロセスを分ける
+PARALLEL_THRESHOLD = 200
+# スポットがこの件数を超えたら、点と地名をすべて描くのをやめて密度で描く
+LARGE_THRESHOLD = 500
+HEXBIN_GRIDSIZE = 60
+# 大量モードで地名を付ける件数（外れ値の上位 / 対象の近く）
+TOP_OUTLIERS = 10
+NEAREST_LABELS = 8
+# 近傍検索の格子の1マスあたりの平均件数
+POINTS_PER_CELL = 4
+# ファイル名に使えない文字（パスの区切りや、Windows で使えない文字・制御文字）
+UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
 
 class TravelVisualizer:
-    def __init__(self, db_name="data/travel_analysis.db"):
-        self.db_name = db_name
+    def __init__(self, db_name=DB_NAME, data_dir=None):
+        # DBHandler と同じ場所のDBを、同じ接続管理で開く
+        self.db_name = resolve_db_path(db_name, data_dir)
+        self.manager = get_manager(self.db_name)
+        # tourist_spots 全体の読み込み結果と、そのときのDBの版
+        self.snapshot = None
+        self.snapshot_stamp = None
+        self.snapshot_reads = 0
+        # render_png 用に描いておく背景（スナップショットが変わったら描き直す）
+        self.canvas = None
+        self.canvas_stamp = None
+        self.render_lock = threading.Lock()
+
+    def load_spots(self):
+        """観光地の一覧（DBが変わっていなければ前回読んだものをそのまま返す）"""
+        stamp = self.manager.data_stamp()
+        if self.snapshot is None or stamp != self.snapshot_stamp:
+            import pandas as pd
+            with 計測.timer("db_seconds", op="load_spots"):
+                self.snapshot = pd.read_sql("SELECT area_name, wiki_length, avg_price FROM tourist_spots",
+                                            self.manager.connection())
+            self.snapshot_stamp = stamp
+            self.snapshot_reads += 1
+        return self.snapshot
 
     def generate_report(self, area_name):
-        os.makedirs("output", exist_ok=True) # フォルダ作成
-        with sqlite3.connect(self.db_name) as conn:
-            df_all = pd.read_sql("SELECT * FROM tourist_spots", conn)
-            df_target = pd.read_sql("SELECT * FROM tourist_spots WHERE area_name = ?", 
-                                   conn, params=(area_name,))
-
-        if df_target.empty:
-            return f"「{area_name}」は見つかりませんでした。"
-
-        plt.figure(figsize=(10, 6))
-        plt.scatter(df_all['wiki_length'], df_all['avg_price'], color='skyblue', label='関西の他スポット')
-        plt.scatter(df_target['wiki_length'], df_target['avg_price'], color='red', s=200, label='対象')
-        
-        for i, txt in enumerate(df_all['area_name']):
-            plt.annotate(txt, (df_all['wiki_length'].iat[i], df_all['avg_price'].iat[i]))
-
-        plt.title("関西観光地の知名度と宿泊価格の相関")
-        plt.xlabel("Wiki文字数")
-        plt.ylabel("平均価格(円)")
-        
-        save_path = f"output/{area_name}_analysis.png"
-        plt.savefig(save_path)
-        plt.close()
-        return f"【成功】グラフを保存しました: {save_path}"
\ No newline at end of file
+        return self.generate_reports([area_name])[area_name]
+
+    def render_png(self, area_name):
+        """グラフの PNG をバイト列で返す（地名がなければ None）。背景はプロセス内で使い回す"""
+        with self.render_lock:
+            df_all = self.load_spots()
+            if self.canvas is None or self.canvas_stamp != self.snapshot_stamp:
+                self.canvas = ReportCanvas(df_all['area_name'].tolist(), df_all['wiki_length'].tolist(),
+                                           df_all['avg_price'].tolist())
+                self.canvas_stamp = self.snapshot_stamp
+            if area_name not in self.canvas.positions:
+                return None
+            buffer = io.BytesIO()
+            self.canvas.render(area_name, buffer)
+            return buffer.getvalue()
+
+    def generate_reports(self, targets, output_dir="output", processes=None):
+        """複数の地名のグラフをまとめて保存する（{地名: 結果のメッセージ}）
+
+        背景（全スポットと地名）は1回だけ描き、地名ごとには赤い点だけを重ねる。
+        件数が多いときはプロセスを分けて並列に描く。
+        """
+        os.makedirs(output_dir, exist_ok=True) # フォルダ作成
+        # 全体は1回読んだものを使い回し、対象はその中から取り出す
+        df_all = self.load_spots()
+        spots = (df_all['area_name'].tolist(), df_all['wiki_length'].tolist(),
+                 df_all['avg_price'].tolist())
+
+        targets = list(dict.fromkeys(targets))
+        known = set(spots[0])
+        results = {t: f"「{t}」は見つかりませんでした。" for t in targets if t not in known}
+        found = [t for t in targets if t in known]
+
+        processes = processes or os.cpu_count() or 1
+        if len(found) < PARALLEL_THRESHOLD or processes == 1:
+            if found:
+                results.update(_render_chunk(spots, found, output_dir))
+        else:
+            # プロセスごとに背景を1回描き、担当分の地名を描く
+            chunks = [found[i::processes] for i in range(min(processes, len(found)))]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                for chunk_results in executor.map(_render_chunk, repeat(spots), chunks, repeat(output_dir)):
+                    results.update(chunk_results)
+        return {t: results[t] for t in targets}
+
+
+class SpotIndex:
+    """(文字数, 価格) を格子に分けて持ち、近くのスポットを速く探すための索引"""
+    def __init__(self, lengths, prices):
+        self.xs = np.asarray(lengths, dtype=float)
+        self.ys = np.asarray(prices, dtype=float)
+        # 軸ごとに 0〜1 にそろえてから距離を測る（文字数と価格では桁が違うため）
+        self.nx = _normalize(self.xs)
+        self.ny = _normalize(self.ys)
+        # 1マスに平均 POINTS_PER_CELL 件入るくらいの細かさにする
+        self.size = max(1, int(np.sqrt(len(self.xs) / POINTS_PER_CELL)))
+        self.cx = np.minimum((self.nx * self.size).astype(int), self.size - 1)
+        self.cy = np.minimum((self.ny * self.size).astype(int), self.size - 1)
+        cell = self.cx * self.size + self.cy
+        # マス番号順に並べ、各マスの範囲を starts で引けるようにする
+        self.order = np.argsort(cell, kind="stable")
+        self.starts = np.searchsorted(cell[self.order], np.arange(self.size * self.size + 1))
+
+    def _members(self, cx, cy):
+        cell = cx * self.size + cy
+        return self.order[self.starts[cell]:self.starts[cell + 1]]
+
+    def nearest(self, i, k):
+        """i 番目のスポットに近い k 件（i 自身を除く、近い順）"""
+        k = min(k, len(self.xs) - 1)
+        if k <= 0:
+            return []
+        cx, cy = self.cx[i], self.cy[i]
+        found = []
+        radius = 0
+        while True:
+            # 中心のマスから1周ずつ外側のマスを調べる
+            for x in range(cx - radius, cx + radius + 1):
+                for y in range(cy - radius, cy + radius + 1):
+                    on_ring = max(abs(x - cx), abs(y - cy)) == radius
+                    if on_ring and 0 <= x < self.size and 0 <= y < self.size:
+                        found.extend(self._members(x, y))
+            candidates = np.array([j for j in found if j != i], dtype=int)
+            if len(candidates) >= k:
+                dist = np.hypot(self.nx[candidates] - self.nx[i], self.ny[candidates] - self.ny[i])
+                best = np.argsort(dist)[:k]
+                # 調べた範囲の外に、これより近い点はもうない
+                if dist[best[-1]] <= radius / self.size or radius >= self.size:
+                    return candidates[best].tolist()
+            if radius >= self.size:
+                return candidates.tolist()
+            radius += 1
+
+    def outliers(self, k):
+        """周りのマス（3×3）にほかのスポットが少ない順に k 件"""
+        counts = np.zeros((self.size + 2, self.size + 2), dtype=int)
+        np.add.at(counts, (self.cx + 1, self.cy + 1), 1)
+        around = sum(counts[1 + dx:self.size + 1 + dx, 1 + dy:self.size + 1 + dy]
+                     for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+        density = around[self.cx, self.cy]
+        # 同じ密度なら、全体の中心から遠いものを先にする
+        spread = np.hypot(self.nx - np.median(self.nx), self.ny - np.median(self.ny))
+        ranked = np.lexsort((-spread, density))
+        # 地名が重ならないよう、1マスからは1件だけ選ぶ
+        cells = (self.cx * self.size + self.cy)[ranked]
+        _, first = np.unique(cells, return_index=True)
+        return ranked[np.sort(first)][:k].tolist()
+
+
+def _load_matplotlib():
+    """描画に使う matplotlib のクラスを読み込む（pyplot は使わない）"""
+    import matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # 日本語フォントの設定（Mac用）
+    matplotlib.rcParams['font.family'] = 'Hiragino Sans'
+    return Figure, FigureCanvasAgg
+
+
+def _normalize(values):
+    if not len(values):
+        return values
+    low, high = values.min(), values.max()
+    return (values - low) / (high - low) if high > low else np.zeros_like(values)
+
+
+class ReportCanvas:
+    """全スポットの散布図を背景として1回だけ描き、対象の点だけを重ねて保存する
+
+    スポットが LARGE_THRESHOLD 件を超えると、背景は密度（hexbin）にして、
+    地名は外れ値の上位と、対象の近くのスポットだけに付ける。
+    """
+    @計測.timed("render_seconds", stage="background")
+    def __init__(self, names, lengths, prices, large_threshold=None):
+        # pyplot の共有状態を使わないので、スレッドやプロセスをまたいでも安全
+        Figure, FigureCanvasAgg = _load_matplotlib()
+        self.figure = Figure(figsize=(10, 6))
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.names = list(names)
+        self.large = len(self.names) > (large_threshold or LARGE_THRESHOLD)
+
+        if self.large:
+            # 点を1つずつ描かず、マスごとの件数を色で表す（件数が増えても描く量は一定）
+            density = self.ax.hexbin(lengths, prices, gridsize=HEXBIN_GRIDSIZE, cmap='Blues',
+                                     mincnt=1, rasterized=True)
+            self.figure.colorbar(density, ax=self.ax, label="スポット数")
+            self.index = SpotIndex(lengths, prices)
+            for i in self.index.outliers(TOP_OUTLIERS):
+                self.ax.annotate(self.names[i], (lengths[i], prices[i]), fontsize=8, color='dimgray')
+            # 対象とその近くのスポットの地名（対象ごとに文字と位置だけを差し替える）
+            # 近くの点は重なりやすいので、ずらした位置に縦に並べて線で結ぶ
+            self.labels = [
+                self.ax.annotate("", (0, 0), xytext=(20, 48 - 12 * n), textcoords='offset points',
+                                 fontsize=8, animated=True,
+                                 arrowprops={"arrowstyle": "-", "color": "gray", "lw": 0.5})
+                for n in range(NEAREST_LABELS + 1)
+            ]
+        else:
+            self.ax.scatter(lengths, prices, color='skyblue', label='関西の他スポット')
+            for name, x, y in zip(self.names, lengths, prices):
+                self.ax.annotate(name, (x, y))
+            self.labels = []
+        # animated=True の点は背景の描画に含めず、draw_artist で後から重ねる
+        self.highlight = self.ax.scatter([], [], color='red', s=200, label='対象', animated=True)
+
+        self.ax.set_title("関西観光地の知名度と宿泊価格の相関")
+        self.ax.set_xlabel("Wiki文字数")
+        self.ax.set_ylabel("平均価格(円)")
+
+        self.lengths = list(lengths)
+        self.prices = list(prices)
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    @計測.timed("render_seconds", stage="target")
+    def render(self, area_name, save_path):
+        i = self.positions[area_name]
+        self.canvas.restore_region(self.background)
+        self.highlight.set_offsets([(self.lengths[i], self.prices[i])])
+        self.ax.draw_artist(self.highlight)
+        if self.large:
+            for label, j in zip(self.labels, [i] + self.index.nearest(i, NEAREST_LABELS)):
+                label.set_text(self.names[j])
+                label.xy = (self.lengths[j], self.prices[j])
+                label.set_fontweight('bold' if j == i else 'normal')
+                self.ax.draw_artist(label)
+        # save_path はファイル名のほか、BytesIO などのファイルオブジェクトでもよい
+        import matplotlib.image as mpimg
+        mpimg.imsave(save_path, np.asarray(self.canvas.buffer_rgba()), format="png")
+
+
+def _render_chunk(spots, targets, output_dir):
+    # プロセスプールからも呼べるよう、モジュールの関数にしておく
+    canvas = ReportCanvas(*spots)
+    results = {}
+    for area_name in targets:
+        save_path = os.path.join(output_dir, f"{_safe_filename(area_name)}_analysis.png")
+        try:
+            canvas.render(area_name, save_path)
+        except Exception as e:
+            # 1件の失敗でほかの地名の保存を止めない
+            results[area_name] = f"【失敗】グラフを保存できませんでした: {save_path}（{e}）"
+            continue
+        results[area_name] = f"【成功】グラフを保存しました: {save_path}"
+    return results
+
+
+def _safe_filename(name):
+    """地名をファイル名にする（区切り文字などを _ に置き換え、"." で始まらないようにする）"""
+    return UNSAFE_FILENAME.sub("_", name).lstrip(".") or "_"
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import 計測
+
+DB_NAME = "travel_analysis.db"
+# main.pyと同じ階層にある「data」フォルダ
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+# 1本の接続で覚えておくSQL文の数（同じ文はパースし直さない）
+CACHED_STATEMENTS = 256
+# 他の接続が書き込み中のとき、エラーにせず待つ秒数
+BUSY_TIMEOUT = 30
+
+
+def resolve_db_path(db_name=DB_NAME, data_dir=None):
+    """DBファイルの絶対パス（実行したフォルダに関係なく data フォルダを指す）"""
+    if os.path.isabs(db_name):
+        return db_name
+    data_dir = data_dir or DATA_DIR
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, db_name)
+
+
+class ConnectionManager:
+    """同じDBへの接続をスレッドごとに1本だけ開き、閉じずに使い回す"""
+    def __init__(self, db_path, cached_statements=CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+        # このマネージャー経由で commit した回数（キャッシュの作り直しの目安）
+        self.version = 0
+        # data_stamp 専用の接続（読み取りだけ）
+        self.stamp_conn = None
+
+    def _connect(self):
+        # 使うのは開いたスレッドだけ。close_all だけは別スレッドから呼べるようにする
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT,
+                               cached_statements=self.cached_statements, check_same_thread=False)
+        # WAL なら書き込み中でもレポート側の読み込みが止まらない
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _open(self):
+        conn = self._connect()
+        with self.lock:
+            self.connections.append(conn)
+        return conn
+
+    def connection(self):
+        """このスレッド用の接続（なければ開く）"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._open()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """with の中の書き込みをまとめて commit する（例外なら rollback）"""
+        conn = self.connection()
+        with 計測.timer("db_seconds", op="transaction"), conn:
+            yield conn
+        with self.lock:
+            self.version += 1
+
+    def data_stamp(self):
+        """DBの内容が変わると変わる値（自分の書き込み回数 + 他の接続の commit）"""
+        # PRAGMA data_version は接続ごとの値なので、どのスレッドからでも同じ接続で調べる。
+        # その接続自身は書き込まないので、ほかの接続の commit はすべてここに表れる
+        with self.lock:
+            if self.stamp_conn is None:
+                self.stamp_conn = self._connect()
+            data_version = self.stamp_conn.execute("PRAGMA data_version").fetchone()[0]
+            return self.version, data_version
+
+    def close_all(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
+            if self.stamp_conn is not None:
+                self.stamp_conn.close()
+                self.stamp_conn = None
+        self.local = threading.local()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_path):
+    """DBファイルごとに共有する ConnectionManager を返す"""
+    db_path = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(db_path)
+        if manager is None:
+            manager = _managers[db_path] = ConnectionManager(db_path)
+        return manager
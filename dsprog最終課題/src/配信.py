@@ -0,0 +1,156 @@
+import json
+import socket
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import unquote, urlsplit
+
+import 計測
+
+# 同時に処理するリクエスト数（スレッドごとにDB接続を1本持つので、増やしすぎない）
+MAX_WORKERS = 8
+# 描いた PNG を覚えておく枚数
+CACHE_SIZE = 256
+# 使われていない Keep-Alive 接続を閉じるまでの秒数
+IDLE_TIMEOUT = 5
+
+
+class ReportService:
+    """DB接続・スナップショット・描画済みの背景を保ったまま、グラフを返す"""
+    def __init__(self, db, viz, cache_size=CACHE_SIZE):
+        self.db = db
+        self.viz = viz
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        # 描画は1本ずつ。同じ地名を同時に頼まれても描くのは1回だけにする
+        self.render_lock = threading.Lock()
+        # (DBの版, 地名) -> PNG。DBが変わると版が変わり、古いものは使われなくなる
+        self.cache = OrderedDict()
+        self.counters = {"requests": 0, "rendered": 0, "cache_hits": 0, "not_found": 0}
+
+    def report_png(self, area_name):
+        key = (self.viz.manager.data_stamp(), area_name)
+        with self.lock:
+            self.counters["requests"] += 1
+        png = self._cached(key)
+        if png is not None:
+            return png
+
+        with self.render_lock:
+            # 待っているあいだに、ほかのスレッドが描き終えていることがある
+            png = self._cached(key)
+            if png is not None:
+                return png
+            png = self.viz.render_png(area_name)
+            with self.lock:
+                if png is None:
+                    self.counters["not_found"] += 1
+                    return None
+                self.counters["rendered"] += 1
+                self.cache[key] = png
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return png
+
+    def _cached(self, key):
+        with self.lock:
+            png = self.cache.get(key)
+            if png is not None:
+                self.cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+            return png
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return {"db": self.db.get_stats(), "service": counters}
+
+
+class PooledHTTPServer(HTTPServer):
+    """決まった数のスレッドでリクエストを処理する（スレッドを作り続けない）
+
+    Keep-Alive の接続はワーカーを1本占有するので、ワーカーより多い接続が
+    待っているときは、応答のたびに接続を閉じて順番を回す。
+    """
+    def __init__(self, address, handler, max_workers=MAX_WORKERS):
+        super().__init__(address, handler)
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self.pending_lock = threading.Lock()
+        self.pending = 0
+
+    def busy(self):
+        """処理中と順番待ちの接続が、ワーカーの数を超えているか"""
+        return self.pending > self.max_workers
+
+    def process_request(self, request, client_address):
+        with self.pending_lock:
+            self.pending += 1
+        self.executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.pending_lock:
+                self.pending -= 1
+
+    def handle_error(self, request, client_address):
+        # クライアントが先に切断しただけなら、トレースバックは出さない
+        if isinstance(sys.exc_info()[1], (ConnectionError, socket.timeout)):
+            return
+        super().handle_error(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def make_server(service, host="127.0.0.1", port=8000, max_workers=MAX_WORKERS):
+    """GET /report/<地名>.png, /stats, /spots, /metrics に答えるサーバーを作る（起動は serve_forever）"""
+    class ReportHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        # 接続がワーカーを占有し続けないようにする
+        timeout = IDLE_TIMEOUT
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = unquote(urlsplit(self.path).path)
+            if path.startswith("/report/") and path.endswith(".png"):
+                with 計測.timer("report_request_seconds"):
+                    png = service.report_png(path[len("/report/"):-len(".png")])
+                if png is None:
+                    return self._send_json(404, {"error": "見つかりませんでした"})
+                return self._send(200, png, "image/png")
+            if path == "/stats":
+                return self._send_json(200, service.stats())
+            if path == "/spots":
+                return self._send_json(200, service.db.get_area_names())
+            if path == "/metrics":
+                # Prometheus のテキスト形式（METRICS=1 で起動したときだけ値が入る）
+                return self._send(200, 計測.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+            self._send_json(404, {"error": "not found"})
+
+        def _send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self._send(status, body, "application/json; charset=utf-8")
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if self.server.busy():
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(body)
+
+    return PooledHTTPServer((host, port), ReportHandler, max_workers)
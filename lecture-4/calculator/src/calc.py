@@ -1,5 +1,13 @@
+import logging
+import threading
+
 import flet as ft
-import math # 科学計算のためにmathモジュールをインポート
+
+# キー入力の処理は 電卓エンジン.py、数式欄の計算は 数式.py で行う（この画面は表示するだけ）
+from 数式 import CalcError, compile_expression
+from 電卓エンジン import CalculatorEngine, format_number
+
+logger = logging.getLogger(__name__)
 
 # --- ボタンの基底クラス ---
 class CalcButton(ft.ElevatedButton):
@@ -40,12 +48,84 @@ class ScientificActionButton(CalcButton):
         self.color = ft.Colors.WHITE
 
 
+# --- x の範囲の表 ---
+class RangeTable(ft.Column):
+    """x と数式の値の表。表示している1ページ分の行だけを文字にする"""
+    PAGE_SIZE = 10
+
+    def __init__(self, format_number):
+        super().__init__(spacing=2)
+        self.format_number = format_number
+        self.xs = self.ys = self.valid = None
+        self.page_index = 0
+        # 行の Text はページをめくっても作り直さず、値だけ入れ替える
+        self.cells = [(ft.Text(size=12, color=ft.Colors.WHITE70, expand=1),
+                       ft.Text(size=12, color=ft.Colors.WHITE, expand=2, text_align="end"))
+                      for _ in range(self.PAGE_SIZE)]
+        self.status = ft.Text(size=12, color=ft.Colors.WHITE54, expand=1)
+        self.controls = [
+            *[ft.Row(controls=list(cells)) for cells in self.cells],
+            ft.Row(controls=[
+                ft.IconButton(icon=ft.Icons.CHEVRON_LEFT, on_click=lambda e: self.turn(-1)),
+                self.status,
+                ft.IconButton(icon=ft.Icons.CHEVRON_RIGHT, on_click=lambda e: self.turn(1)),
+            ]),
+        ]
+        self.visible = False
+
+    def set_data(self, xs, ys, valid):
+        self.xs, self.ys, self.valid = xs, ys, valid
+        self.page_index = 0
+        self.visible = True
+        self.show_page()
+
+    def page_count(self):
+        return max(1, -(-len(self.xs) // self.PAGE_SIZE))
+
+    def turn(self, step):
+        if self.xs is None:
+            return
+        self.page_index = min(max(self.page_index + step, 0), self.page_count() - 1)
+        self.show_page()
+        self.update()
+
+    def show_page(self):
+        start = self.page_index * self.PAGE_SIZE
+        for i, (x_text, y_text) in enumerate(self.cells):
+            j = start + i
+            if j < len(self.xs):
+                x_text.value = str(self.format_number(float(self.xs[j])))
+                # 計算できない点（log(0以下)・sqrt(負)・0 での割り算など）は Error
+                y_text.value = str(self.format_number(float(self.ys[j]))) if self.valid[j] else "Error"
+            else:
+                x_text.value = y_text.value = ""
+        self.status.value = (f"{self.page_index + 1:,} / {self.page_count():,} ページ"
+                             f"（{len(self.xs):,} 点, Error {len(self.xs) - int(self.valid.sum()):,}）")
+
+
 class CalculatorApp(ft.Container):
     def __init__(self):
         super().__init__()
-        self.reset()
+        self.engine = CalculatorEngine()
+        # まだ処理していないキーと、処理中かどうか
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.flushing = False
 
-        self.result = ft.Text(value="0", color=ft.Colors.WHITE, size=20)
+        self.result = ft.Text(value=self.engine.display, color=ft.Colors.WHITE, size=20)
+        # 数式をまとめて入力する欄（優先順位・括弧つきで計算する）
+        self.formula = ft.TextField(
+            hint_text="数式 (例: 2+3*sin(30))", text_size=14, color=ft.Colors.WHITE,
+            border_color=ft.Colors.WHITE24, dense=True, on_submit=self.formula_submitted,
+        )
+        # x を含む数式を範囲でまとめて計算し、表にする
+        self.range_fields = [
+            ft.TextField(label=label, value=value, text_size=12, color=ft.Colors.WHITE,
+                         border_color=ft.Colors.WHITE24, dense=True, expand=1,
+                         on_submit=self.table_requested)
+            for label, value in (("x の始め", "0"), ("終わり", "360"), ("刻み", "15"))
+        ]
+        self.table = RangeTable(format_number)
         self.width = 350
         self.bgcolor = ft.Colors.BLACK
         self.border_radius = ft.border_radius.all(20)
@@ -65,6 +145,10 @@ class CalculatorApp(ft.Container):
         self.content = ft.Column(
             controls=[
                 ft.Row(controls=[self.result], alignment="end"),
+                self.formula,
+                ft.Row(controls=[*self.range_fields,
+                                 ft.IconButton(icon=ft.Icons.TABLE_CHART, on_click=self.table_requested)]),
+                self.table,
                 # 科学計算ボタンの行
                 scientific_buttons, 
                 # 既存のボタンレイアウト
@@ -111,139 +195,53 @@ class CalculatorApp(ft.Container):
         )
 
     def button_clicked(self, e):
-        data = e.control.data
-        print(f"Button clicked with data = {data}")
-        
-        # AC (All Clear) or Error state
-        if self.result.value == "Error" or data == "AC":
-            self.result.value = "0"
-            self.reset()
-        
-        # Digits and Decimal Point
-        elif data in ("1", "2", "3", "4", "5", "6", "7", "8", "9", "0", "."):
-            if self.result.value == "0" or self.new_operand == True:
-                # 既に小数点が入力されている場合は、二重入力を防ぐ
-                if data == "." and "." in self.result.value and not self.new_operand:
-                    pass
-                else:
-                    self.result.value = data if data != "." or self.result.value == "0" else self.result.value + data
-                    self.new_operand = False
-            else:
-                # 既に小数点が入力されている場合は、二重入力を防ぐ
-                if data == "." and "." in self.result.value:
-                    pass
-                else:
-                    self.result.value = self.result.value + data
-
-        # Arithmetic Operators (+, -, *, /)
-        elif data in ("+", "-", "*", "/"):
-            # 前の演算を実行し、結果を次のオペランド1とする
-            self.result.value = self.calculate(self.operand1, float(self.result.value), self.operator)
-            self.operator = data
-            if self.result.value == "Error":
-                self.operand1 = "0"
-            else:
-                self.operand1 = float(self.result.value)
-            self.new_operand = True
-        
-        # Equals (=)
-        elif data in ("="):
-            self.result.value = self.calculate(self.operand1, float(self.result.value), self.operator)
-            self.reset()
+        self.keys_pressed([e.control.data])
 
-        # Percentage (%)
-        elif data in ("%"):
-            try:
-                self.result.value = self.format_number(float(self.result.value) / 100)
-                self.new_operand = True
-            except ValueError:
-                self.result.value = "Error"
-                self.reset()
-
-        # Sign Change (+/-)
-        elif data in ("+/-"):
-            try:
-                current_value = float(self.result.value)
-                self.result.value = self.format_number(-current_value)
-            except ValueError:
-                self.result.value = "Error"
-                self.reset()
-                
-        # --- 科学計算ボタンの処理 (新規追加) ---
-        elif data in ("sin", "cos", "tan", "log", "sqrt"):
-            try:
-                current_value = float(self.result.value)
-                
-                if data == "sin":
-                    # Fletは度数法ではないため、ラジアンに変換して計算
-                    self.result.value = self.format_number(math.sin(math.radians(current_value)))
-                elif data == "cos":
-                    self.result.value = self.format_number(math.cos(math.radians(current_value)))
-                elif data == "tan":
-                    self.result.value = self.format_number(math.tan(math.radians(current_value)))
-                elif data == "log":
-                    # 負の数やゼロの対数を防ぐ
-                    if current_value <= 0:
-                        self.result.value = "Error"
-                    else:
-                        # 自然対数 (ln) を使用 (必要に応じて math.log10 に変更可能)
-                        self.result.value = self.format_number(math.log(current_value))
-                elif data == "sqrt":
-                    # 負の数の平方根を防ぐ
-                    if current_value < 0:
-                        self.result.value = "Error"
-                    else:
-                        self.result.value = self.format_number(math.sqrt(current_value))
-                        
-                # 科学計算ボタンの実行後、次の入力を新しいオペランドとする
-                self.new_operand = True
-                self.operand1 = 0 # 連続計算をリセット
-                self.operator = "+" # 連続計算をリセット
-
-            except ValueError:
-                self.result.value = "Error"
-                self.reset()
-            except Exception: # ゼロ除算などのmathエラー対策
-                self.result.value = "Error"
-                self.reset()
+    def keys_pressed(self, keys):
+        """キーをエンジンに渡し、表示は最後の状態で1回だけ更新する
 
+        前のキーの処理中に押されたキーは、処理中のスレッドがまとめて続けて処理する。
+        """
+        with self.pending_lock:
+            self.pending.extend(keys)
+            if self.flushing:
+                return
+            self.flushing = True
+        while True:
+            with self.pending_lock:
+                keys, self.pending = self.pending, []
+                if not keys:
+                    self.flushing = False
+                    break
+            self.engine.feed(keys)
+        self.result.value = self.engine.display
         self.update()
 
-    def format_number(self, num):
-        # 浮動小数点数の桁数を丸める
-        if isinstance(num, (float, int)):
-            rounded_num = round(num, 10) # 小数点以下10桁に丸める
-            if rounded_num % 1 == 0:
-                return int(rounded_num)
-            else:
-                return rounded_num
-        return num # 数値でない場合はそのまま返す
-
-    def calculate(self, operand1, operand2, operator):
-        # ... (既存の calculate メソッドは変更なし) ...
-        if operator == "+":
-            return self.format_number(operand1 + operand2)
-
-        elif operator == "-":
-            return self.format_number(operand1 - operand2)
-
-        elif operator == "*":
-            return self.format_number(operand1 * operand2)
-
-        elif operator == "/":
-            if operand2 == 0:
-                return "Error"
-            else:
-                return self.format_number(operand1 / operand2)
-        
-        # 演算子が設定されていない場合 (例: AC後の=)
-        return self.format_number(operand2) 
+    def formula_submitted(self, e):
+        """数式欄の内容を、優先順位どおりに計算して表示する"""
+        try:
+            value = compile_expression(self.formula.value or "").evaluate()
+            self.engine.set_value(format_number(value))
+        except CalcError:
+            self.engine.set_value("Error")
+        self.result.value = self.engine.display
+        self.update()
 
-    def reset(self):
-        # ... (既存の reset メソッドは変更なし) ...
-        self.operator = "+"
-        self.operand1 = 0
-        self.new_operand = True
+    def table_requested(self, e):
+        """数式欄の式（x を含む）を、x の範囲のすべての点でまとめて計算して表にする"""
+        # NumPy は重いので、表を作るときに初めて読み込む
+        from 数式一括 import evaluate_range
+        try:
+            start, stop, step = (float(field.value) for field in self.range_fields)
+            xs, ys, valid = evaluate_range(self.formula.value or "", start, stop, step=step)
+        except ValueError as ex:  # CalcError も ValueError の一種
+            logger.debug("表を作れません: %s", ex)
+            self.engine.set_value("Error")
+            self.result.value = self.engine.display
+            self.table.visible = False
+        else:
+            self.table.set_data(xs, ys, valid)
+        self.update()
 
 
 def main(page: ft.Page):
@@ -255,4 +253,5 @@ def main(page: ft.Page):
     page.add(calc)
 
 
-ft.app(main)
+if __name__ == "__main__":
+    ft.app(main)
@@ -0,0 +1,331 @@
+"""電卓の数式エンジン（字句解析 → 構文木 → クロージャへのコンパイル）
+
+  compile_expression("2 + 3 * sin(30)").evaluate()      # 3.5
+  compile_expression("x^2 - 1").evaluate({"x": 3})       # 8.0
+
+- 優先順位: 括弧 > 後置 %（÷100）> ^（右結合, ** も可）> 単項 +- > * / > + -
+- 関数: sin cos tan（度数法）, log（自然対数）, sqrt。定数: pi, e。それ以外の名前は変数
+- 同じ文字列のコンパイル結果、同じ部分式のコンパイル結果、関数の計算結果は LRU で覚える。
+  変数を含まない部分式はコンパイルのときに計算を済ませておく。
+"""
+import math
+import operator
+import re
+from functools import lru_cache
+
+# 覚えておく数（文字列 / 部分式 / 関数ごとの引数）
+EXPRESSION_CACHE_SIZE = 8192
+NODE_CACHE_SIZE = 16384
+FUNCTION_CACHE_SIZE = 4096
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+      (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<name>[A-Za-z_]\w*)
+    | (?P<op>\*\*|[-+*/^%()])
+    )""", re.VERBOSE)
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+
+class CalcError(ValueError):
+    """数式の誤りや、定義域外の計算（0 での割り算、負の数の平方根など）"""
+
+
+# --- 関数（純粋なので結果を覚えておく） ---
+
+def _radians(name, value):
+    # inf の角度では math.sin などが ValueError になり、nan の角度も意味がない
+    if not math.isfinite(value):
+        raise CalcError(f"{name} の引数が有限の数ではありません: {value}")
+    # 電卓と同じく度数法
+    return math.radians(value)
+
+
+@lru_cache(maxsize=FUNCTION_CACHE_SIZE)
+def _sin(value):
+    return math.sin(_radians("sin", value))
+
+
+@lru_cache(maxsize=FUNCTION_CACHE_SIZE)
+def _cos(value):
+    return math.cos(_radians("cos", value))
+
+
+@lru_cache(maxsize=FUNCTION_CACHE_SIZE)
+def _tan(value):
+    return math.tan(_radians("tan", value))
+
+
+@lru_cache(maxsize=FUNCTION_CACHE_SIZE)
+def _log(value):
+    if value <= 0:
+        raise CalcError("log の引数は正の数にしてください")
+    return math.log(value)
+
+
+@lru_cache(maxsize=FUNCTION_CACHE_SIZE)
+def _sqrt(value):
+    if value < 0:
+        raise CalcError("負の数の平方根は計算できません")
+    return math.sqrt(value)
+
+
+FUNCTIONS = {"sin": _sin, "cos": _cos, "tan": _tan, "log": _log, "sqrt": _sqrt}
+
+
+def apply_function(name, value):
+    """電卓の科学計算ボタンと同じ計算（定義域外は CalcError）"""
+    return FUNCTIONS[name](float(value))
+
+
+def _div(a, b):
+    if b == 0:
+        raise CalcError("0 で割ることはできません")
+    return a / b
+
+
+def _pow(a, b):
+    try:
+        return math.pow(a, b)
+    except (OverflowError, ValueError) as e:
+        raise CalcError(f"累乗を計算できません: {a}^{b}") from e
+
+
+BINARY = {"+": operator.add, "-": operator.sub, "*": operator.mul, "/": _div, "^": _pow}
+
+
+# --- 字句解析と構文解析 ---
+
+def tokenize(text):
+    """[(種類, 値), ...]（種類は "number" / "name" / "op"）"""
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = TOKEN_RE.match(text, pos)
+        if not m:
+            raise CalcError(f"読めない文字があります: {text[pos:].strip()[:10]!r}")
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "number":
+            value = float(value)
+        elif value == "**":
+            value = "^"
+        tokens.append((kind, value))
+        pos = m.end()
+    return tokens
+
+
+# 二項演算子の (左の結合力, 右の結合力)。^ は右結合
+BINDING = {"+": (10, 11), "-": (10, 11), "*": (20, 21), "/": (20, 21), "^": (40, 39)}
+PREFIX_POWER = 30
+POSTFIX_POWER = 50
+
+
+class _Parser:
+    """Pratt 法で構文木（タプル）を作る
+
+    ("num", 値) / ("var", 名前) / ("neg", 式) / ("pct", 式) / ("bin", 演算子, 左, 右) / ("call", 関数名, 式)
+    """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def expect(self, value):
+        if self.next() != ("op", value):
+            raise CalcError(f"'{value}' が必要です")
+
+    def parse(self):
+        if not self.tokens:
+            raise CalcError("数式が空です")
+        node = self.expression(0)
+        if self.pos < len(self.tokens):
+            value = self.peek()[1]
+            raise CalcError(f"余分な '{value:g}' があります" if isinstance(value, float)
+                            else f"余分な '{value}' があります")
+        return node
+
+    def expression(self, min_power):
+        node = self.prefix()
+        while True:
+            kind, value = self.peek()
+            if kind != "op":
+                break
+            if value == "%":
+                if POSTFIX_POWER < min_power:
+                    break
+                self.next()
+                node = ("pct", node)
+                continue
+            if value not in BINDING:
+                break
+            left, right = BINDING[value]
+            if left < min_power:
+                break
+            self.next()
+            node = ("bin", value, node, self.expression(right))
+        return node
+
+    def prefix(self):
+        kind, value = self.next()
+        if kind == "number":
+            return ("num", value)
+        if kind == "name":
+            if value in FUNCTIONS:
+                self.expect("(")
+                arg = self.expression(0)
+                self.expect(")")
+                return ("call", value, arg)
+            if value in CONSTANTS:
+                return ("num", CONSTANTS[value])
+            return ("var", value)
+        if value == "(":
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        if value in ("-", "+"):
+            operand = self.expression(PREFIX_POWER)
+            return ("neg", operand) if value == "-" else operand
+        raise CalcError("数式が途中で終わっています" if kind is None else f"'{value}' の位置が正しくありません")
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def parse(text):
+    """数式の文字列を構文木にする（同じ文字列は解析し直さない）"""
+    return _Parser(tokenize(text)).parse()
+
+
+def variables(node):
+    """構文木に出てくる変数名の集合"""
+    kind = node[0]
+    if kind == "var":
+        return frozenset([node[1]])
+    if kind == "num":
+        return frozenset()
+    if kind == "bin":
+        return variables(node[2]) | variables(node[3])
+    return variables(node[-1])
+
+
+# --- コンパイル ---
+
+_VARIABLE = object()
+
+
+def _raiser(error):
+    def run(env):
+        # 同じ例外を投げ直すとトレースバックがつながって伸びていくので、毎回切り離す
+        raise error.with_traceback(None)
+    return run
+
+
+def _fold(func, *args):
+    """変数を含まない部分式を、コンパイルのときに計算しておく"""
+    try:
+        value = func(*args)
+    except CalcError as e:
+        # 誤りはその場で投げず、評価したときに投げる（コンパイル結果は覚えておける）
+        return _VARIABLE, _raiser(e)
+    return value, lambda env: value
+
+
+@lru_cache(maxsize=NODE_CACHE_SIZE)
+def _compile(node):
+    """構文木を (定数の値 または _VARIABLE, env を受け取って値を返す関数) にする
+
+    構文木はタプルなので、同じ部分式は別の数式に出てきてもコンパイル結果を使い回す。
+    """
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return value, lambda env: value
+    if kind == "var":
+        name = node[1]
+
+        def load(env):
+            try:
+                return env[name]
+            except (KeyError, TypeError):
+                raise CalcError(f"変数 {name} の値がありません") from None
+        return _VARIABLE, load
+
+    if kind == "bin":
+        func = BINARY[node[1]]
+        a_value, a = _compile(node[2])
+        b_value, b = _compile(node[3])
+        if a_value is not _VARIABLE and b_value is not _VARIABLE:
+            return _fold(func, a_value, b_value)
+        if a_value is not _VARIABLE:
+            return _VARIABLE, lambda env: func(a_value, b(env))
+        if b_value is not _VARIABLE:
+            return _VARIABLE, lambda env: func(a(env), b_value)
+        return _VARIABLE, lambda env: func(a(env), b(env))
+
+    func = {"neg": operator.neg, "pct": lambda v: v / 100}.get(kind) or FUNCTIONS[node[1]]
+    value, operand = _compile(node[-1])
+    if value is not _VARIABLE:
+        return _fold(func, value)
+    return _VARIABLE, lambda env: func(operand(env))
+
+
+class Expression:
+    """コンパイル済みの数式"""
+    __slots__ = ("text", "ast", "variables", "_value", "_run")
+
+    def __init__(self, text):
+        self.text = text
+        self.ast = parse(text)
+        self.variables = variables(self.ast)
+        self._value, self._run = _compile(self.ast)
+
+    def evaluate(self, env=None):
+        """値を返す（変数は env の辞書から読む。計算できなければ CalcError）"""
+        if self._value is not _VARIABLE:
+            return self._value
+        return self._run(env)
+
+    def __repr__(self):
+        return f"Expression({self.text!r})"
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(text):
+    """数式をコンパイルする（同じ文字列は前回の結果を返す）"""
+    return Expression(text)
+
+
+def evaluate(text, env=None):
+    return compile_expression(text).evaluate(env)
+
+
+def evaluate_sheet(lines, env=None):
+    """数式を1行ずつ評価する。計算できない行は CalcError のインスタンスを入れて続ける"""
+    results = []
+    for line in lines:
+        try:
+            results.append(compile_expression(line).evaluate(env))
+        except CalcError as e:
+            results.append(e)
+    return results
+
+
+def cache_info():
+    """各 LRU の hits / misses / currsize"""
+    info = {"expressions": compile_expression.cache_info(), "parse": parse.cache_info(),
+            "nodes": _compile.cache_info()}
+    info.update({f"fn_{name}": func.cache_info() for name, func in FUNCTIONS.items()})
+    return {name: c._asdict() for name, c in info.items()}
+
+
+def clear_caches():
+    for cached in (compile_expression, parse, _compile, *FUNCTIONS.values()):
+        cached.cache_clear()
@@ -0,0 +1,178 @@
+"""x を含む数式を、x の範囲全体についてまとめて計算する（NumPy のベクトル演算）
+
+  xs, ys, valid = evaluate_range("sqrt(x) + log(x)", -10, 10, step=0.5)
+
+構文は 数式.py と同じ（構文木も共有する）。1点ずつ Python で計算せず、演算ごとに
+配列全体を1回で計算する。log(0以下)・sqrt(負)・0 での割り算などは、その点だけを
+valid=False（値は nan）にして、ほかの点の計算は続ける。
+"""
+import math
+from functools import lru_cache
+
+import numpy as np
+
+from 数式 import CalcError, _VARIABLE, _compile, parse, variables
+
+# 範囲の点の数の上限（メモリを使いすぎないように）
+MAX_POINTS = 10_000_000
+
+
+def _bad_or(*masks):
+    masks = [m for m in masks if m is not None]
+    if not masks:
+        return None
+    bad = masks[0]
+    for m in masks[1:]:
+        bad = bad | m
+    return bad
+
+
+def _div(a, b):
+    zero = b == 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return a / b, zero if np.any(zero) else None
+
+
+def _pow(a, b):
+    with np.errstate(over="ignore", invalid="ignore"):
+        r = np.power(a, b)
+    # math.pow が例外にする組み合わせ（負の数の小数乗・桁あふれ）だけを無効にする
+    bad = ~np.isfinite(r) & np.isfinite(a) & np.isfinite(b)
+    return r, bad if np.any(bad) else None
+
+
+def _log(a):
+    bad = a <= 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.log(a), bad if np.any(bad) else None
+
+
+def _sqrt(a):
+    bad = a < 0
+    with np.errstate(invalid="ignore"):
+        return np.sqrt(a), bad if np.any(bad) else None
+
+
+def _plain(func):
+    return lambda a: (func(a), None)
+
+
+BINARY = {
+    "+": lambda a, b: (a + b, None),
+    "-": lambda a, b: (a - b, None),
+    "*": lambda a, b: (a * b, None),
+    "/": _div,
+    "^": _pow,
+}
+UNARY = {
+    "neg": _plain(np.negative),
+    "pct": _plain(lambda a: a / 100),
+    # 電卓と同じく度数法
+    "sin": _plain(lambda a: np.sin(np.radians(a))),
+    "cos": _plain(lambda a: np.cos(np.radians(a))),
+    "tan": _plain(lambda a: np.tan(np.radians(a))),
+    "log": _log,
+    "sqrt": _sqrt,
+}
+
+
+@lru_cache(maxsize=1024)
+def _compile_vector(node):
+    """構文木を env -> (値の配列, 無効な点のマスク または None) にする"""
+    # 変数を含まない部分式は、1点ずつの計算（数式.py）で1回だけ計算しておく
+    value, run = _compile(node)
+    if value is not _VARIABLE or not variables(node):
+        try:
+            value = run(None)
+        except CalcError:
+            return lambda env: (np.nan, True)
+        return lambda env: (value, None)
+
+    kind = node[0]
+    if kind == "var":
+        name = node[1]
+
+        def load(env):
+            try:
+                return env[name], None
+            except KeyError:
+                raise CalcError(f"変数 {name} の値がありません") from None
+        return load
+
+    if kind == "bin":
+        func = BINARY[node[1]]
+        a, b = _compile_vector(node[2]), _compile_vector(node[3])
+
+        def run_binary(env):
+            a_value, a_bad = a(env)
+            b_value, b_bad = b(env)
+            result, bad = func(a_value, b_value)
+            return result, _bad_or(a_bad, b_bad, bad)
+        return run_binary
+
+    func = UNARY[kind if kind != "call" else node[1]]
+    operand = _compile_vector(node[-1])
+
+    def run_unary(env):
+        value, value_bad = operand(env)
+        result, bad = func(value)
+        return result, _bad_or(value_bad, bad)
+    return run_unary
+
+
+class VectorExpression:
+    """x の配列をまとめて計算する数式"""
+    __slots__ = ("text", "var", "_run")
+
+    def __init__(self, text, var="x"):
+        ast = parse(text)
+        unknown = variables(ast) - {var}
+        if unknown:
+            raise CalcError(f"{var} 以外の変数には値を入れられません: {', '.join(sorted(unknown))}")
+        self.text = text
+        self.var = var
+        self._run = _compile_vector(ast)
+
+    def evaluate(self, xs):
+        """(値, 有効かどうか) の配列を返す（無効な点の値は nan）"""
+        xs = np.asarray(xs, dtype=np.float64)
+        values, bad = self._run({self.var: xs})
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), xs.shape)
+        if bad is None:
+            return values, np.ones(xs.shape, dtype=bool)
+        valid = ~np.broadcast_to(bad, xs.shape)
+        return np.where(valid, values, np.nan), valid
+
+
+@lru_cache(maxsize=256)
+def compile_vectorized(text, var="x"):
+    return VectorExpression(text, var)
+
+
+def make_range(start, stop, step=None, num=None):
+    """start から stop まで（stop を含む）の点。step か num のどちらかを指定する"""
+    # inf や 1e400（float にすると inf）・nan は点の数を数えられない
+    if not all(math.isfinite(v) for v in (start, stop) + (() if step is None else (step,))):
+        raise CalcError("範囲には有限の数を入れてください")
+    if num is None:
+        if not step or step <= 0:
+            raise CalcError("刻みは正の数にしてください")
+        count = (stop - start) / step
+        if not math.isfinite(count):
+            raise CalcError("点が多すぎます")
+        num = int(np.floor(count + 1e-9)) + 1
+        if num > MAX_POINTS:
+            raise CalcError(f"点が多すぎます（{num:,} 点。上限 {MAX_POINTS:,} 点）")
+        if num < 1:
+            raise CalcError("終わりは始めより大きくしてください")
+        return start + step * np.arange(num, dtype=np.float64)
+    if not 1 <= num <= MAX_POINTS:
+        raise CalcError(f"点の数は 1〜{MAX_POINTS:,} にしてください")
+    return np.linspace(start, stop, num)
+
+
+def evaluate_range(text, start, stop, step=None, num=None, var="x"):
+    """(x の配列, 値の配列, 有効かどうかの配列)"""
+    xs = make_range(start, stop, step, num)
+    values, valid = compile_vectorized(text, var).evaluate(xs)
+    return xs, values, valid
@@ -0,0 +1,146 @@
+"""電卓のキー入力の処理（画面を持たない）
+
+  engine = CalculatorEngine()
+  engine.feed(["1", "2", "+", "3", "="])   # 表示は 15
+
+画面（calc.py）はキーをここに渡して、最後の表示を出すだけにする。
+キーは電卓のボタンの文字（"0"〜"9" "." "+" "-" "*" "/" "=" "%" "+/-" "AC"
+"sin" "cos" "tan" "log" "sqrt"）。それ以外のキーは無視する。
+"""
+import logging
+
+from 数式 import apply_function
+
+logger = logging.getLogger(__name__)
+
+DIGITS = frozenset(("1", "2", "3", "4", "5", "6", "7", "8", "9", "0", "."))
+OPERATORS = frozenset(("+", "-", "*", "/"))
+SCIENTIFIC = frozenset(("sin", "cos", "tan", "log", "sqrt"))
+KEYS = DIGITS | OPERATORS | SCIENTIFIC | {"=", "%", "+/-", "AC"}
+
+
+def format_number(num):
+    # 浮動小数点数の桁数を丸める
+    if isinstance(num, (float, int)):
+        rounded_num = round(num, 10)  # 小数点以下10桁に丸める
+        if rounded_num % 1 == 0:
+            return int(rounded_num)
+        else:
+            return rounded_num
+    return num  # 数値でない場合はそのまま返す
+
+
+def calculate(operand1, operand2, operator):
+    if operator == "+":
+        return format_number(operand1 + operand2)
+    elif operator == "-":
+        return format_number(operand1 - operand2)
+    elif operator == "*":
+        return format_number(operand1 * operand2)
+    elif operator == "/":
+        if operand2 == 0:
+            return "Error"
+        else:
+            return format_number(operand1 / operand2)
+    # 演算子が設定されていない場合 (例: AC後の=)
+    return format_number(operand2)
+
+
+class CalculatorEngine:
+    """電卓の状態（表示の値・演算子・1つ目のオペランド・次が新しいオペランドか）"""
+    __slots__ = ("value", "operator", "operand1", "new_operand")
+
+    def __init__(self):
+        # 表示の値は入力中の文字列、計算結果の数値、"Error" のどれか
+        self.value = "0"
+        self.reset()
+
+    def reset(self):
+        self.operator = "+"
+        self.operand1 = 0
+        self.new_operand = True
+
+    @property
+    def display(self):
+        return str(self.value)
+
+    def state(self):
+        return self.value, self.operator, self.operand1, self.new_operand
+
+    def set_value(self, value):
+        """数式欄などで計算した値を表示して、続きの計算を始めからにする"""
+        self.value = value
+        self.reset()
+
+    def press(self, key):
+        try:
+            self._press(key)
+        except (TypeError, ValueError):
+            # 入力中の値に続けられないキー（計算結果のあとの "." など）は無視する。
+            # 状態を変える前に例外になるので、キーを押す前のまま
+            logger.debug("キー %r は無視しました（表示 %r）", key, self.value)
+        return self.value
+
+    def feed(self, keys):
+        """キーを順に処理して、最後の表示の値を返す"""
+        press = self.press
+        for key in keys:
+            press(key)
+        return self.value
+
+    def _press(self, key):
+        value = self.value
+        if value == "Error" or key == "AC":
+            self.value = "0"
+            self.reset()
+
+        elif key in DIGITS:
+            if value == "0" or self.new_operand:
+                # 既に小数点が入力されている場合は、二重入力を防ぐ
+                if key == "." and "." in value and not self.new_operand:
+                    return
+                self.value = key if key != "." or value == "0" else value + key
+                self.new_operand = False
+            elif key == "." and "." in value:
+                return
+            else:
+                self.value = value + key
+
+        elif key in OPERATORS:
+            # 前の演算を実行し、結果を次のオペランド1とする
+            result = calculate(self.operand1, float(value), self.operator)
+            self.value = result
+            self.operator = key
+            self.operand1 = "0" if result == "Error" else float(result)
+            self.new_operand = True
+
+        elif key == "=":
+            self.value = calculate(self.operand1, float(value), self.operator)
+            self.reset()
+
+        elif key == "%":
+            try:
+                self.value = format_number(float(value) / 100)
+                self.new_operand = True
+            except ValueError:
+                self.value = "Error"
+                self.reset()
+
+        elif key == "+/-":
+            try:
+                self.value = format_number(-float(value))
+            except ValueError:
+                self.value = "Error"
+                self.reset()
+
+        elif key in SCIENTIFIC:
+            try:
+                # sin/cos/tan は度数法、log は自然対数。log(0以下) と sqrt(負の数) は Error
+                self.value = format_number(apply_function(key, value))
+                # 科学計算のあとは、次の入力を新しいオペランドとし、連続計算をリセットする
+                self.new_operand = True
+                self.operand1 = 0
+                self.operator = "+"
+            except Exception:
+                self.value = "Error"
+                self.reset()
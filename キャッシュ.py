@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import 計測
+
+DEFAULT_CACHE_DIR = ".http_cache"
+# この秒数以内ならサーバーに問い合わせず、保存済みの本文をそのまま使う
+DEFAULT_TTL = 300
+# キャッシュ全体の容量上限（バイト）。超えたら古く使われたものから削除
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+
+class CachedResponse:
+    """キャッシュ経由で取得したレスポンス"""
+    def __init__(self, body, status, changed):
+        self.body = body
+        # "miss" / "hit" / "not_modified" / "stale" のいずれか
+        self.status = status
+        # 前回保存した本文から変わっていれば True（変わっていなければ解析不要）
+        self.changed = changed
+
+    def json(self):
+        with 計測.timer("json_parse_seconds", source="cache"):
+            return json.loads(self.body)
+
+
+class HTTPCache:
+    """ETag / Last-Modified を使った条件付きリクエスト対応のディスクキャッシュ"""
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL,
+                 max_bytes=DEFAULT_MAX_BYTES, client=None):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._client = client
+        self.lock = threading.Lock()
+        self.counters = {"hit": 0, "miss": 0, "not_modified": 0, "stale": 0, "evicted": 0}
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # key -> メタ情報。並び順がそのまま LRU の順（末尾が最近使ったもの）
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self._load_index()
+
+    @property
+    def client(self):
+        # requests の読み込み（0.1秒ほど）は、最初に通信するときまで遅らせる
+        if self._client is None:
+            from 通信 import get_client
+            self._client = get_client()
+        return self._client
+
+    def _load_index(self):
+        metas = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".meta.json"):
+                continue
+            key = name[:-len(".meta.json")]
+            try:
+                with open(self._meta_path(key), encoding="utf-8") as f:
+                    meta = json.load(f)
+                last_used = os.path.getmtime(self._body_path(key))
+                # 本文とメタ情報の組が合わない（書き込みの途中で止まった）ものは使わない
+                if os.path.getsize(self._body_path(key)) != meta["size"]:
+                    raise ValueError("本文の大きさがメタ情報と違います")
+            except (OSError, ValueError, KeyError):
+                self._remove_files(key)
+                continue
+            metas.append((last_used, key, meta))
+
+        for _, key, meta in sorted(metas):
+            self.entries[key] = meta
+            self.total_bytes += meta["size"]
+
+    def _key(self, url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, key + ".body")
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, key + ".meta.json")
+
+    def _remove_files(self, key):
+        for path in (self._body_path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _read_body(self, key):
+        with open(self._body_path(key), "rb") as f:
+            return f.read()
+
+    def _replace_file(self, path, data):
+        # 書きかけのファイルが残らないよう、一時ファイルに書いてから置き換える
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _write_meta(self, key, meta):
+        self._replace_file(self._meta_path(key), json.dumps(meta).encode("utf-8"))
+
+    def _touch(self, key):
+        self.entries.move_to_end(key)
+        try:
+            os.utime(self._body_path(key))
+        except OSError:
+            pass
+
+    def _store(self, key, url, res):
+        body = res.content
+        meta = {
+            "url": url,
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "size": len(body),
+            "digest": hashlib.sha1(body).hexdigest(),
+        }
+        old = self.entries.pop(key, None)
+        if old:
+            self.total_bytes -= old["size"]
+
+        # メタ情報（ETag など）は本文を書き終えてから書く
+        self._replace_file(self._body_path(key), body)
+        self._write_meta(key, meta)
+        self.entries[key] = meta
+        self.total_bytes += meta["size"]
+        self._evict()
+        return old is None or old["digest"] != meta["digest"]
+
+    def _evict(self):
+        # 容量を超えている間、最も長く使われていないものから削除する
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, meta = self.entries.popitem(last=False)
+            self.total_bytes -= meta["size"]
+            self._remove_files(key)
+            self.counters["evicted"] += 1
+
+    def get(self, url):
+        """URLの本文を取得（TTL内ならキャッシュ、期限切れなら条件付きリクエスト）"""
+        res = self._get(url)
+        計測.inc("http_cache_total", result=res.status)
+        return res
+
+    def _get(self, url):
+        key = self._key(url)
+        with self.lock:
+            meta = self.entries.get(key)
+            if meta and time.time() - meta["stored_at"] < self.ttl:
+                self._touch(key)
+                self.counters["hit"] += 1
+                return CachedResponse(self._read_body(key), "hit", False)
+
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            res = self.client.get(url, headers=headers)
+            if res.status_code != 304:
+                res.raise_for_status()
+        except Exception:
+            # 通信できないときは古い本文があればそれを返す
+            with self.lock:
+                if key not in self.entries:
+                    raise
+                self._touch(key)
+                self.counters["stale"] += 1
+                return CachedResponse(self._read_body(key), "stale", False)
+
+        if res.status_code == 304:
+            with self.lock:
+                # 確認と更新は同じロックの中で行う（その間に追い出されないように）
+                if key in self.entries:
+                    meta = self.entries[key]
+                    meta["stored_at"] = time.time()
+                    self._write_meta(key, meta)
+                    self._touch(key)
+                    self.counters["not_modified"] += 1
+                    return CachedResponse(self._read_body(key), "not_modified", False)
+            # 問い合わせ中に追い出された場合は、条件を付けずに本文ごと取り直す
+            # （古い本文も残っていないので、失敗したらそのまま例外にする）
+            res = self.client.get(url)
+            res.raise_for_status()
+
+        with self.lock:
+            changed = self._store(key, url, res)
+            self.counters["miss"] += 1
+            return CachedResponse(res.content, "miss", changed)
+
+    def peek(self, url):
+        """通信せずに、保存済みの本文を返す（期限切れでもよい。なければ None）"""
+        key = self._key(url)
+        with self.lock:
+            if key not in self.entries:
+                return None
+            return CachedResponse(self._read_body(key), "stale", False)
+
+    def stats(self):
+        """監視用のカウンター"""
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+            stats["bytes"] = self.total_bytes
+            return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """プロセス内で共有するHTTPCacheを返す"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HTTPCache()
+        return _cache
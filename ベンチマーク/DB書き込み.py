@@ -0,0 +1,80 @@
+"""WeatherDB の書き込み速度を1行ずつ / まとめて で比較する
+
+使い方: python ベンチマーク/DB書き込み.py [行数 ...]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# リポジトリ直下のモジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from 天気DB import INSERT_FORECAST_SQL, WeatherDB, encode_record
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+# 1回の発表に含まれる予報日数（気象庁の短期予報は3日分）
+DAYS_PER_REPORT = 3
+WEATHERS = ("晴れ", "くもり", "雨", "晴れ　時々　くもり", "くもり　一時　雨")
+
+
+def make_records(n_rows):
+    """(地域, 発表日時, 予報日, 天気) の合成データを n_rows 行作る"""
+    areas = [f"{code:02d}0000" for code in range(1, 48)]
+    start = datetime(2020, 1, 1, 5)
+    report_index = 0
+    rows = 0
+    while rows < n_rows:
+        report = start + timedelta(hours=6 * (report_index // len(areas)))
+        area = areas[report_index % len(areas)]
+        report_time = report.strftime("%Y-%m-%dT%H:%M:%S+09:00")
+        for day in range(DAYS_PER_REPORT):
+            if rows >= n_rows:
+                break
+            forecast_date = (report.date() + timedelta(days=day)).isoformat()
+            yield area, report_time, forecast_date, WEATHERS[(report_index + day) % len(WEATHERS)]
+            rows += 1
+        report_index += 1
+
+
+def ingest_single(db, records):
+    # 従来の save_forecast と同じく、1行ずつ execute して発表ごとに commit
+    cursor = db.conn.cursor()
+    last_report = None
+    for record in records:
+        if last_report is not None and record[:2] != last_report:
+            db.conn.commit()
+        cursor.execute(INSERT_FORECAST_SQL, encode_record(record))
+        last_report = record[:2]
+    db.conn.commit()
+
+
+def ingest_bulk(db, records):
+    db.save_forecasts_bulk(records)
+
+
+def run(n_rows, ingest, journal_mode, synchronous):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = WeatherDB(os.path.join(tmp, "bench.db"), journal_mode, synchronous)
+        records = list(make_records(n_rows))
+        started = time.perf_counter()
+        ingest(db, records)
+        elapsed = time.perf_counter() - started
+        db.conn.close()
+    return n_rows / elapsed
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'行数':>10} {'モード':<14} {'1行ずつ (行/秒)':>16} {'まとめて (行/秒)':>16} {'倍率':>6}")
+    for n_rows in sizes:
+        for journal_mode, synchronous in (("DELETE", "FULL"), ("WAL", "NORMAL")):
+            single = run(n_rows, ingest_single, journal_mode, synchronous)
+            bulk = run(n_rows, ingest_bulk, journal_mode, synchronous)
+            mode = f"{journal_mode}/{synchronous}"
+            print(f"{n_rows:>10,} {mode:<14} {single:>16,.0f} {bulk:>16,.0f} {bulk / single:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""気象庁・Wikipedia の代わりに、記録したレスポンスを返すローカルサーバー
+
+使い方: python ベンチマーク/スタブサーバ.py [--port 8765] [--latency 0.05] [--error-rate 0.1] [--scale 10]
+
+  /bosai/common/const/area.json             -> fixtures/area.json
+  /bosai/forecast/data/forecast/<code>.json -> fixtures/forecast_130000.json（地域コードを差し替え）
+  /w/api.php?action=query&titles=...        -> fixtures/wiki_pages.json から組み立てた query の結果
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+AREA_PATH = "/bosai/common/const/area.json"
+FORECAST_PREFIX = "/bosai/forecast/data/forecast/"
+WIKI_PATH = "/w/api.php"
+# fixtures に記録した予報の地域コード（差し替えの元）
+FIXTURE_OFFICE = "130000"
+# 記録していないタイトルのうち、これで始まるものは「記事なし」として返す
+MISSING_PREFIX = "存在しない"
+# scale で増やす架空の office の上限（コード 900000〜999900）
+MAX_EXTRA_OFFICES = 1000
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FixtureData:
+    """記録したレスポンスを読み込み、地域コード・規模・発表時刻を変えて組み立てる"""
+    def __init__(self, scale=1, advance_reports=False):
+        self.scale = max(int(scale), 1)
+        # True なら、取得のたびに発表時刻を6時間ずつ進める（毎回「新しい発表」になる）
+        self.advance_reports = advance_reports
+        self.area = self._scaled_area(_load_fixture("area.json"))
+        self.forecast = _load_fixture(f"forecast_{FIXTURE_OFFICE}.json")
+        wiki = _load_fixture("wiki_pages.json")
+        self.pages = wiki["pages"]
+        self.redirects = wiki["redirects"]
+        self.lock = threading.Lock()
+        self.report_counts = {}
+        self.area_body = json.dumps(self.area, ensure_ascii=False).encode("utf-8")
+
+    def _scaled_area(self, area):
+        # scale 倍になるよう、架空の office（9xxx00）を追加する
+        offices = area["offices"]
+        originals = list(offices.values())
+        for i in range(min(len(originals) * (self.scale - 1), MAX_EXTRA_OFFICES)):
+            office = originals[i % len(originals)]
+            office = dict(office, name=f"{office['name']}{i // len(originals) + 2}")
+            offices[f"9{i:03d}00"] = office
+        return area
+
+    def office_codes(self):
+        return list(self.area["offices"])
+
+    def forecast_body(self, code):
+        with self.lock:
+            count = self.report_counts.get(code, 0)
+            self.report_counts[code] = count + 1
+        shift = timedelta(hours=6 * count) if self.advance_reports else timedelta(0)
+
+        data = copy.deepcopy(self.forecast)
+        for report in data:
+            report["reportDatetime"] = _shift(report["reportDatetime"], shift)
+            for series in report["timeSeries"]:
+                series["timeDefines"] = [_shift(t, shift) for t in series["timeDefines"]]
+                series["areas"] = self._scaled_areas(series["areas"])
+        text = json.dumps(data, ensure_ascii=False)
+        # 細分区域のコード（130010 など）も office に合わせる
+        return text.replace(f'"code": "{FIXTURE_OFFICE[:4]}', f'"code": "{code[:4]}').encode("utf-8")
+
+    def _scaled_areas(self, areas):
+        # 細分区域を scale 倍に増やす（コードの末尾を変えて別の区域にする）
+        scaled = list(areas)
+        for n in range(1, self.scale):
+            for area in areas:
+                area = copy.deepcopy(area)
+                area["area"]["code"] = f"{area['area']['code']}{n:03d}"
+                scaled.append(area)
+        return scaled
+
+    def wiki_query(self, titles):
+        """MediaWiki の action=query&prop=info&redirects=1 と同じ形の結果"""
+        query = {"redirects": [], "pages": {}}
+        missing = 0
+        for title in titles:
+            if title in self.redirects:
+                query["redirects"].append({"from": title, "to": self.redirects[title]})
+                title = self.redirects[title]
+            info = self.pages.get(title)
+            if info is None and title.startswith(MISSING_PREFIX):
+                missing += 1
+                query["pages"][str(-missing)] = {"ns": 0, "title": title, "missing": ""}
+                continue
+            if info is None:
+                # 記録していないタイトルは、名前から決まる値で作る（何度呼んでも同じ）
+                seed = zlib.crc32(title.encode("utf-8"))
+                info = {"length": 1000 + seed % 100_000, "lastrevid": 100_000_000 + seed % 10_000_000,
+                        "touched": "2025-01-01T00:00:00Z"}
+            pageid = zlib.crc32(title.encode("utf-8")) % 10_000_000 + 1
+            query["pages"][str(pageid)] = {"pageid": pageid, "ns": 0, "title": title,
+                                           "contentmodel": "wikitext", "pagelanguage": "ja", **info}
+        if not query["redirects"]:
+            del query["redirects"]
+        return json.dumps({"batchcomplete": "", "query": query}, ensure_ascii=False).encode("utf-8")
+
+
+def _shift(text, delta):
+    if not delta:
+        return text
+    return (datetime.fromisoformat(text) + delta).isoformat()
+
+
+class StubServer:
+    """スタブサーバーを別スレッドで動かす（with 文で使える）"""
+    def __init__(self, port=0, latency=0.0, jitter=0.0, error_rate=0.0, scale=1,
+                 advance_reports=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.data = FixtureData(scale, advance_reports)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "connections": 0, "errors": 0, "not_modified": 0}
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _handler_class(self))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def area_url(self):
+        return self.url + AREA_PATH
+
+    @property
+    def forecast_url(self):
+        return self.url + FORECAST_PREFIX + "{}.json"
+
+    @property
+    def wiki_url(self):
+        return self.url + WIKI_PATH
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def delay(self):
+        with self.lock:
+            seconds = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate > 0 and self.random.random() < self.error_rate
+        if seconds > 0:
+            time.sleep(seconds)
+        return fail
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _handler_class(server):
+    class StubHandler(BaseHTTPRequestHandler):
+        # Keep-Alive を有効にして、クライアント側の接続の使い回しを測れるようにする
+        protocol_version = "HTTP/1.1"
+        # 小さいレスポンスが Nagle アルゴリズムで待たされないようにする
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            server.count("connections")
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            server.count("requests")
+            if server.delay():
+                server.count("errors")
+                return self._send(503, b'{"error": "stub"}', {"Retry-After": "0"})
+
+            url = urlsplit(self.path)
+            if url.path == AREA_PATH:
+                body = server.data.area_body
+            elif url.path.startswith(FORECAST_PREFIX) and url.path.endswith(".json"):
+                code = url.path[len(FORECAST_PREFIX):-len(".json")]
+                if not (code.isdigit() and len(code) == 6):
+                    return self._send(404, b"{}")
+                body = server.data.forecast_body(code)
+            elif url.path == WIKI_PATH:
+                titles = parse_qs(url.query).get("titles", [""])[0]
+                body = server.data.wiki_query([t for t in titles.split("|") if t])
+            else:
+                return self._send(404, b"{}")
+
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                server.count("not_modified")
+                return self._send(304, b"", {"ETag": etag})
+            self._send(200, body, {"ETag": etag})
+
+        def _send(self, status, body, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="気象庁・Wikipedia のスタブサーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に足すばらつきの上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 を返す割合（0〜1）")
+    parser.add_argument("--scale", type=int, default=1, help="office 数と細分区域数の倍率")
+    parser.add_argument("--advance-reports", action="store_true", help="取得のたびに発表時刻を進める")
+    args = parser.parse_args()
+
+    server = StubServer(args.port, args.latency, args.jitter, args.error_rate, args.scale,
+                        args.advance_reports)
+    print(f"スタブサーバーを起動しました: {server.url}（Ctrl+C で終了）")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(server.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""観光地グラフの描画時間を、1枚ずつ描き直す方法 / 背景を使い回す方法 で比較する
+
+使い方: python ベンチマーク/レポート描画.py [スポット数]（全スポットのグラフを描く）
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# リポジトリ直下と旅行アプリのモジュールを読み込めるようにする
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "dsprog最終課題"))
+sys.path.append(ROOT_DIR)
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from src.データベース import DBHandler
+from src.可視化 import TravelVisualizer
+
+DEFAULT_SPOTS = 200
+
+
+def render_legacy(df_all, area_name, output_dir):
+    # 以前の generate_report と同じく、pyplot で毎回すべて描き直す
+    df_target = df_all[df_all['area_name'] == area_name]
+    plt.figure(figsize=(10, 6))
+    plt.scatter(df_all['wiki_length'], df_all['avg_price'], color='skyblue', label='関西の他スポット')
+    plt.scatter(df_target['wiki_length'], df_target['avg_price'], color='red', s=200, label='対象')
+    for i, txt in enumerate(df_all['area_name']):
+        plt.annotate(txt, (df_all['wiki_length'].iat[i], df_all['avg_price'].iat[i]))
+    plt.title("関西観光地の知名度と宿泊価格の相関")
+    plt.xlabel("Wiki文字数")
+    plt.ylabel("平均価格(円)")
+    plt.savefig(f"{output_dir}/{area_name}_analysis.png")
+    plt.close()
+
+
+def main():
+    n_spots = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SPOTS
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBHandler("bench.db", data_dir=tmp)
+        db.upsert_many((f"スポット{i}", rng.randint(1000, 150_000), rng.randint(8000, 40_000))
+                       for i in range(n_spots))
+        viz = TravelVisualizer("bench.db", data_dir=tmp)
+        df_all = viz.load_spots()
+        targets = df_all['area_name'].tolist()
+
+        print(f"スポット {n_spots:,} 件 / グラフ {len(targets):,} 枚")
+        cases = [
+            ("1枚ずつ描き直す", lambda out: [render_legacy(df_all, t, out) for t in targets]),
+            ("背景を使い回す", lambda out: viz.generate_reports(targets, out, processes=1)),
+            ("+ プロセス並列", lambda out: viz.generate_reports(targets, out)),
+        ]
+        for label, render in cases:
+            out = os.path.join(tmp, label)
+            os.makedirs(out)
+            started = time.perf_counter()
+            render(out)
+            elapsed = time.perf_counter() - started
+            print(f"  {label:<10} {elapsed:7.2f} 秒  ({elapsed / len(targets) * 1000:6.1f} ms/枚)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""グラフ配信サーバー（src/配信.py）に同時にリクエストを送り、1秒あたりの処理数と遅延を測る
+
+使い方: python ベンチマーク/レポート配信.py [--spots 200] [--clients 16] [--requests 2000] [--workers 8]
+
+1回目は描画、2回目以降は描画済みの PNG を返すので、「初回」と「2周目以降」を分けて表示する。
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+# リポジトリ直下と旅行アプリのモジュールを読み込めるようにする
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "dsprog最終課題"))
+sys.path.append(ROOT_DIR)
+
+import matplotlib
+matplotlib.use("Agg")
+
+from 通信 import HTTPClient
+from src.データベース import DBHandler
+from src.可視化 import TravelVisualizer
+from src.配信 import ReportService, make_server
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_round(base_url, names, clients, n_requests, seed):
+    """clients 本の接続から合計 n_requests 件を送る。(経過秒, 遅延の一覧, 失敗数) を返す"""
+    rng = random.Random(seed)
+    paths = [f"{base_url}/report/{quote(rng.choice(names))}.png" for _ in range(n_requests)]
+    client = HTTPClient(max_per_host=clients)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def fetch(url):
+        started = time.perf_counter()
+        res = client.get(url)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if res.status_code != 200 or not res.content.startswith(b"\x89PNG"):
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(fetch, paths))
+    elapsed = time.perf_counter() - started
+    opened = client.stats.snapshot()["opened"]
+    client.close()
+    return elapsed, latencies, errors[0], opened
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spots", type=int, default=200, help="DBに入れるスポット数")
+    parser.add_argument("--clients", type=int, default=16, help="同時に送るクライアント数")
+    parser.add_argument("--requests", type=int, default=2000, help="1周で送るリクエスト数")
+    parser.add_argument("--workers", type=int, default=8, help="サーバー側のワーカー数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBHandler("bench.db", data_dir=tmp)
+        db.upsert_many((f"スポット{i}", rng.randint(1000, 150_000), rng.randint(8000, 40_000))
+                       for i in range(args.spots))
+        service = ReportService(db, TravelVisualizer("bench.db", data_dir=tmp))
+        server = make_server(service, port=0, max_workers=args.workers)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+        base_url = f"http://{host}:{port}"
+        names = db.get_area_names()
+
+        print(f"スポット {args.spots:,} 件 / クライアント {args.clients} / ワーカー {args.workers}")
+        for label, seed in (("初回", 1), ("2周目以降", 2)):
+            elapsed, latencies, errors, opened = run_round(
+                base_url, names, args.clients, args.requests, seed)
+            print(f"  {label:<6} {len(latencies) / elapsed:8.1f} req/s  "
+                  f"p50 {percentile(latencies, 0.50) * 1000:6.1f} ms  "
+                  f"p95 {percentile(latencies, 0.95) * 1000:6.1f} ms  "
+                  f"p99 {percentile(latencies, 0.99) * 1000:6.1f} ms  "
+                  f"接続 {opened} 本  失敗 {errors}")
+        print(f"  サーバー: {service.stats()['service']}")
+
+        server.shutdown()
+        server.server_close()
+        service.viz.manager.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""地域階層の索引（地域索引.py）の作成・保存・読み込みと、1文字ごとの検索の時間を測る
+
+使い方: python ベンチマーク/地域検索.py [class20s の数]
+
+実際の area.json と同じくらいの規模（地方 11・府県 58・class10s 約140・class15s 約370・
+市区町村 約1,900）の架空の階層を作る。すべての市区町村の名前・かなを1文字ずつ入力したときの
+検索時間を、一覧を毎回前から順に調べる方法と比べる。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from 天気DB import WeatherDB
+from 地域索引 import AreaIndex, normalize
+
+DEFAULT_CLASS20S = 1_900
+# 1文字入力するごとの検索時間の目標
+BUDGET_MS = 1.0
+SYLLABLES = [("山", "やま"), ("川", "かわ"), ("田", "た"), ("中", "なか"), ("大", "おお"), ("小", "こ"),
+             ("石", "いし"), ("井", "い"), ("本", "もと"), ("木", "き"), ("松", "まつ"), ("原", "はら"),
+             ("野", "の"), ("島", "しま"), ("北", "きた"), ("南", "みなみ"), ("東", "ひがし"),
+             ("西", "にし"), ("高", "たか"), ("浜", "はま"), ("宮", "みや"), ("岡", "おか")]
+SUFFIXES = [("市", "し"), ("町", "まち"), ("村", "むら"), ("区", "く")]
+
+
+def make_area_json(n_class20s, seed=0):
+    rng = random.Random(seed)
+
+    def name():
+        parts = rng.sample(SYLLABLES, rng.randint(2, 3))
+        return "".join(k for k, _ in parts), "".join(r for _, r in parts)
+
+    area = {level: {} for level in ("centers", "offices", "class10s", "class15s", "class20s")}
+    for c in range(11):
+        area["centers"][f"01{c:02d}00"] = {"name": f"{name()[0]}地方", "children": []}
+    centers = list(area["centers"])
+    for o in range(58):
+        office = f"{o + 1:02d}0000"
+        area["offices"][office] = {"name": f"{name()[0]}県", "enName": f"Pref {o}",
+                                   "parent": centers[o % len(centers)]}
+        for t in range(rng.randint(2, 3)):
+            class10 = f"{o + 1:02d}00{t + 1}0"
+            area["class10s"][class10] = {"name": f"{name()[0]}地方", "parent": office}
+            for f in range(rng.randint(2, 3)):
+                area["class15s"][f"{o + 1:02d}00{t + 1}{f + 1}"] = {"name": f"{name()[0]}地域",
+                                                                     "parent": class10}
+    class15s = list(area["class15s"])
+    for i in range(n_class20s):
+        parent = class15s[i % len(class15s)]
+        kanji, kana = name()
+        suffix, suffix_kana = rng.choice(SUFFIXES)
+        area["class20s"][f"{parent[:2]}{i:05d}"] = {"name": kanji + suffix, "kana": kana + suffix_kana,
+                                                   "enName": f"Town {i}", "parent": parent}
+    return area
+
+
+def linear_search(items, query):
+    # 以前のような一覧を、毎回前から順に調べる方法（表記をそろえて前方一致）
+    key = normalize(query)
+    return [(code, label) for code, label, keys in items if any(k.startswith(key) for k in keys)]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    n_class20s = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CLASS20S
+    area = make_area_json(n_class20s)
+
+    started = time.perf_counter()
+    index = AreaIndex.from_area_json(area)
+    build = time.perf_counter() - started
+    print(f"地域 {len(index):,} 件  索引の作成 {build * 1000:.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = WeatherDB(os.path.join(tmp, "areas.db"))
+        started = time.perf_counter()
+        db.save_area_index(index)
+        saved = time.perf_counter() - started
+        started = time.perf_counter()
+        loaded = db.get_area_index()
+        load = time.perf_counter() - started
+        db.conn.close()
+    print(f"  DB へ保存 {saved * 1000:.1f} ms / DB から読み込み（索引の作り直しを含む） {load * 1000:.1f} ms")
+
+    # すべての市区町村の名前とかなを、1文字ずつ入力していく
+    queries = [text[:n] for info in area["class20s"].values()
+               for text in (info["name"], info["kana"]) for n in range(1, len(text) + 1)]
+    items = [(e.code, e.label, e.search_keys()) for e in index.entries.values()]
+    mismatches = 0
+    for label, search in (("トライ", loaded.search), ("順に調べる", lambda q: linear_search(items, q))):
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            latencies.append(time.perf_counter() - started)
+        p50, p99 = percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+        print(f"  {label:<6} {len(queries):,} 回  p50 {p50:.4f} ms  p99 {p99:.4f} ms  最大 {max(latencies) * 1000:.3f} ms")
+        if label == "トライ":
+            trie_p99 = p99
+    for query in queries[::50]:
+        if sorted(loaded.search(query)) != sorted(linear_search(items, query)):
+            mismatches += 1
+    print(f"  検索結果の不一致: {mismatches} 件  （目標: p99 {BUDGET_MS} ms 未満）")
+    return 1 if mismatches or trie_p99 >= BUDGET_MS else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""スポット数を増やしたときの、グラフ1枚の描画時間とファイルサイズを測る
+
+使い方: python ベンチマーク/大規模描画.py [スポット数 ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# 旅行アプリのモジュールを読み込めるようにする
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "dsprog最終課題"))
+sys.path.append(ROOT_DIR)
+
+from src.可視化 import ReportCanvas
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000, 100_000)
+# 1つの背景に重ねて描く枚数
+REPORTS = 20
+
+
+def make_spots(n, rng):
+    # 文字数は少数の有名スポットに偏り、価格は正規分布に近い形にする
+    lengths = np.exp(rng.normal(9, 1, n)).astype(int) + 100
+    prices = np.clip(rng.normal(15_000, 4_000, n), 3_000, None).astype(int)
+    return [f"スポット{i}" for i in range(n)], lengths.tolist(), prices.tolist()
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            names, lengths, prices = make_spots(n, rng)
+            started = time.perf_counter()
+            canvas = ReportCanvas(names, lengths, prices)
+            background = time.perf_counter() - started
+
+            started = time.perf_counter()
+            paths = []
+            for i in range(min(REPORTS, n)):
+                paths.append(os.path.join(tmp, f"{n}_{i}.png"))
+                canvas.render(names[i], paths[-1])
+            per_report = (time.perf_counter() - started) / len(paths)
+            size = sum(os.path.getsize(p) for p in paths) / len(paths)
+
+            mode = "密度" if canvas.large else "全点"
+            print(f"{n:>8,} 件 ({mode})  背景 {background * 1000:7.1f} ms  "
+                  f"1枚 {per_report * 1000:6.1f} ms  {size / 1024:6.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
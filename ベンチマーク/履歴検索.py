@@ -0,0 +1,77 @@
+"""スキーマのバージョンごとに get_forecast_by_date の速度と実行計画を比べる
+
+使い方: python ベンチマーク/履歴検索.py [行数] [検索回数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DB書き込み import make_records
+from 天気DB import MIGRATIONS, WeatherDB
+
+DEFAULT_ROWS = 10_000_000
+DEFAULT_QUERIES = 2_000
+
+
+def build(path, version, n_rows):
+    """旧スキーマで n_rows 行を入れてから version までマイグレーションする"""
+    db = WeatherDB(path, migrate=False)
+    db.save_forecasts_bulk(make_records(n_rows))
+    started = time.perf_counter()
+    db.migrate(version)
+    return db, time.perf_counter() - started
+
+
+def check_plan(db, version, area_code, target_date):
+    plan = db.explain_forecast_query(area_code, target_date)
+    print(f"  実行計画: {' / '.join(plan)}")
+    if version >= 1:
+        # 索引だけで検索・並べ替えが終わり、全件走査も一時ソートもしないこと
+        assert all(not step.startswith("SCAN") for step in plan), plan
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+        assert any("COVERING INDEX" in step or "PRIMARY KEY" in step for step in plan), plan
+
+
+def measure(db, lookups):
+    latencies = []
+    for area_code, target_date in lookups:
+        started = time.perf_counter()
+        db.get_forecast_by_date(area_code, target_date)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    pick = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1e6
+    return pick(0.5), pick(0.99)
+
+
+def used_bytes(db):
+    # マイグレーションで空いたページは除いた、実際に使っている容量
+    pragma = lambda name: db.conn.execute(f"PRAGMA {name}").fetchone()[0]
+    return (pragma("page_count") - pragma("freelist_count")) * pragma("page_size")
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_QUERIES
+
+    samples = random.Random(0).sample(range(n_rows), min(n_queries, n_rows))
+    wanted = set(samples)
+    lookups = [(r[0], r[2]) for i, r in enumerate(make_records(n_rows)) if i in wanted]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for version in range(len(MIGRATIONS) + 1):
+            print(f"スキーマ v{version} ({n_rows:,} 行)")
+            db, migrate_time = build(os.path.join(tmp, f"v{version}.db"), version, n_rows)
+            check_plan(db, version, *lookups[0])
+            p50, p99 = measure(db, lookups)
+            size = used_bytes(db) / 1024 / 1024
+            print(f"  p50 {p50:8.1f} µs  p99 {p99:8.1f} µs  サイズ {size:7.1f} MB  "
+                  f"マイグレーション {migrate_time:.1f} 秒")
+            db.conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""x を含む数式を x の範囲全体で計算する時間を、1点ずつの計算と NumPy でまとめて計算する方法とで比べる
+
+使い方: python ベンチマーク/数式範囲評価.py [点の数]
+
+1点ずつの計算は 数式.py のエンジン（コンパイル済み）で x を入れ替えて呼ぶ。
+まとめて計算した結果が、すべての点で1点ずつの結果と一致すること
+（計算できない点の位置も含めて）を確かめる。
+"""
+import math
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "lecture-4", "calculator", "src"))
+
+import numpy as np
+
+from 数式 import CalcError, compile_expression
+from 数式一括 import compile_vectorized, make_range
+
+DEFAULT_POINTS = 1_000_000
+EXPRESSIONS = [
+    "x^2 - 3*x + 2",
+    "sin(x)^2 + cos(x)^2",
+    "sqrt(x) + log(x)",
+    "1 / (x - 10) + tan(x) * 2%",
+    "(x / 100) ^ 0.5 * log(x^2)",
+]
+
+
+def evaluate_scalar(text, xs):
+    expression = compile_expression(text)
+    values, valid = [], []
+    for x in xs:
+        try:
+            values.append(expression.evaluate({"x": x}))
+            valid.append(True)
+        except CalcError:
+            values.append(math.nan)
+            valid.append(False)
+    return np.array(values), np.array(valid)
+
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_POINTS
+    xs = make_range(-500, 500, num=n_points)
+    xs_list = xs.tolist()
+    print(f"{n_points:,} 点（x = -500 〜 500）")
+    mismatches = 0
+    for text in EXPRESSIONS:
+        started = time.perf_counter()
+        expected, expected_valid = evaluate_scalar(text, xs_list)
+        scalar = time.perf_counter() - started
+
+        vector = compile_vectorized(text)
+        vector.evaluate(xs[:10])  # 初回のコンパイルを除く
+        started = time.perf_counter()
+        values, valid = vector.evaluate(xs)
+        batch = time.perf_counter() - started
+
+        # 三角関数は NumPy と math で最後の桁が違うことがあるので、相対誤差で比べる
+        bad = (valid != expected_valid) | (valid & ~np.isclose(values, expected, rtol=1e-9, atol=1e-12))
+        mismatches += int(bad.sum())
+        print(f"  {text:<28} 1点ずつ {scalar * 1000:8.1f} ms  まとめて {batch * 1000:6.1f} ms"
+              f"  ({scalar / batch:5.0f} 倍)  Error {int((~valid).sum()):,} 点  不一致 {int(bad.sum())}")
+    print(f"  結果の不一致: {mismatches} 点")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""電卓の数式エンジン（lecture-4/calculator/src/数式.py）で長い数式シートを評価する時間を測る
+
+使い方: python ベンチマーク/数式評価.py [行数]
+
+毎回 字句解析・構文解析して構文木をたどる方法と、コンパイル結果と関数の結果を
+LRU で覚えるエンジンとを比べ、すべての行で結果が一致することも確かめる。
+"""
+import math
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "lecture-4", "calculator", "src"))
+
+import 数式
+from 数式 import BINARY, FUNCTIONS, CalcError, _Parser, evaluate_sheet, tokenize
+
+DEFAULT_LINES = 200_000
+# シートに出てくる式のひな形（同じ部分式がくり返し出てくる）
+TEMPLATES = [
+    "{a} + {b} * {c}",
+    "({a} + {b}) * ({a} + {b}) / {c}",
+    "sqrt({a}^2 + {b}^2)",
+    "sin({d}) ^ 2 + cos({d}) ^ 2",
+    "log({a} * {b}) - log({a}) - log({b})",
+    "{a} * 1.08 + {b}% * {c}",
+    "x ^ 2 - {a} * x + {b}",
+    "sqrt(x) * tan({d}) / ({c} - {c})",
+]
+# 角度が inf・nan になる式（例外で止まらず、すべて CalcError になること）
+NON_FINITE = ["sin(1e400)", "sin(1e308*10)", "cos(x)*1e400", "tan(x - x)", "cos(-x) + 1"]
+
+
+def make_sheet(n_lines, seed=0):
+    rng = random.Random(seed)
+    values = [str(v) for v in (1, 2, 3, 5, 7.5, 10, 12, 100, 250, 1000)]
+    angles = [str(v) for v in (0, 15, 30, 45, 60, 90, 180)]
+    return [rng.choice(TEMPLATES).format(a=rng.choice(values), b=rng.choice(values),
+                                         c=rng.choice(values), d=rng.choice(angles))
+            for _ in range(n_lines)]
+
+
+def interpret(node, env):
+    # 以前のやり方: 毎回構文木をたどって計算する（何も覚えない）
+    kind = node[0]
+    if kind == "num":
+        return node[1]
+    if kind == "var":
+        return env[node[1]]
+    if kind == "bin":
+        return BINARY[node[1]](interpret(node[2], env), interpret(node[3], env))
+    value = interpret(node[-1], env)
+    if kind == "neg":
+        return -value
+    if kind == "pct":
+        return value / 100
+    return FUNCTIONS[node[1]].__wrapped__(value)
+
+
+def evaluate_uncached(lines, env):
+    results = []
+    for line in lines:
+        try:
+            results.append(interpret(_Parser(tokenize(line)).parse(), env))
+        except CalcError as e:
+            results.append(e)
+    return results
+
+
+def same(a, b):
+    if isinstance(a, CalcError) or isinstance(b, CalcError):
+        return type(a) is type(b) and str(a) == str(b)
+    return a == b or (math.isnan(a) and math.isnan(b))
+
+
+def check_non_finite():
+    """NON_FINITE の各行を x = inf で評価し、CalcError にならなかった行を返す"""
+    results = evaluate_sheet(NON_FINITE, {"x": math.inf})
+    return [line for line, result in zip(NON_FINITE, results) if not isinstance(result, CalcError)]
+
+
+def main():
+    n_lines = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LINES
+    sheet = make_sheet(n_lines)
+    env = {"x": 4.0}
+    print(f"{n_lines:,} 行（異なる式 {len(set(sheet)):,} 種類）")
+
+    started = time.perf_counter()
+    expected = evaluate_uncached(sheet, env)
+    legacy = time.perf_counter() - started
+
+    数式.clear_caches()
+    started = time.perf_counter()
+    actual = evaluate_sheet(sheet, env)
+    cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    evaluate_sheet(sheet, env)
+    warm = time.perf_counter() - started
+
+    mismatches = sum(not same(a, b) for a, b in zip(expected, actual))
+    for label, elapsed in (("毎回解析してたどる", legacy), ("エンジン（1回目）", cold), ("エンジン（2回目）", warm)):
+        print(f"  {label:<12} {elapsed:7.3f} 秒  ({elapsed / n_lines * 1e6:6.2f} µs/行)")
+    info = 数式.cache_info()
+    print(f"  コンパイル結果の再利用 {info['expressions']['hits']:,} 回 / 部分式 {info['nodes']['hits']:,} 回")
+    print(f"  結果の不一致: {mismatches} 行")
+    failures = check_non_finite()
+    print(f"  角度が inf・nan の式で CalcError にならなかった行: {failures or 'なし'}")
+    return 1 if mismatches or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""予報の履歴を従来の forecasts と省スペース形式（compact）とで保存し、大きさと検索の速さを比べる
+
+使い方: python ベンチマーク/省スペース保存.py [日数] [検索回数]
+
+全 office（58 地域）・1日4回の発表・各発表に3日分の予報がある履歴を作る。同じ予報日の天気は
+発表ごとに一定の確率でしか変わらない（実際の発表と同じく、ほとんどの発表は前回と同じ文章）。
+検索1回あたりにファイルから読んだページ数を /proc/self/io の読み込み量から数える。キャッシュを
+ほぼ無効にした場合（たどったページ数）と、SQLite の既定のキャッシュ（2MB）の場合の2通り。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from 天気DB import WeatherDB
+
+DEFAULT_DAYS = 365
+DEFAULT_QUERIES = 2_000
+N_OFFICES = 58
+REPORTS_PER_DAY = 4
+DAYS_PER_REPORT = 3
+# 発表ごとに、予報日の天気が前回から変わる確率
+CHANGE_RATE = 0.2
+WEATHERS = ("晴れ", "くもり", "雨", "晴れ　時々　くもり", "くもり　時々　晴れ", "くもり　一時　雨",
+            "雨　時々　くもり", "くもり　夜　雨", "晴れ　夕方　から　くもり", "雪　時々　くもり",
+            "くもり　所により　昼過ぎ　から　雨　で　雷を伴い　激しく　降る")
+
+
+def make_history(n_days, seed=0):
+    """発表ごとの (地域, 発表日時, 予報日, 天気) のリストを、発表日時の順に返す"""
+    rng = random.Random(seed)
+    areas = [f"{code:02d}0000" for code in range(1, N_OFFICES + 1)]
+    current = {}
+    start = datetime(2024, 1, 1, 5)
+    for i in range(n_days * REPORTS_PER_DAY):
+        report = start + timedelta(hours=24 // REPORTS_PER_DAY * i)
+        report_time = report.strftime("%Y-%m-%dT%H:%M:%S+09:00")
+        for area in areas:
+            rows = []
+            for day in range(DAYS_PER_REPORT):
+                forecast_date = (report.date() + timedelta(days=day)).isoformat()
+                key = (area, forecast_date)
+                if key not in current or rng.random() < CHANGE_RATE:
+                    current[key] = rng.choice(WEATHERS)
+                rows.append((area, report_time, forecast_date, current[key]))
+            yield rows
+
+
+def build(path, compact, history):
+    db = WeatherDB(path, journal_mode="DELETE", compact=compact)
+    started = time.perf_counter()
+    for rows in history:
+        db.save_forecasts_bulk(rows)
+    elapsed = time.perf_counter() - started
+    db.conn.execute("VACUUM")
+    return db, elapsed
+
+
+def read_bytes():
+    with open("/proc/self/io") as f:
+        return int(next(line for line in f if line.startswith("rchar:")).split()[1])
+
+
+def measure(path, compact, lookups, cache_size):
+    # 新しい接続（キャッシュが空の状態）から検索し、ファイルから読んだページ数を数える
+    db = WeatherDB(path, journal_mode="DELETE", migrate=False, compact=compact)
+    db.conn.execute(f"PRAGMA cache_size = {cache_size}")
+    db.conn.execute("PRAGMA mmap_size = 0")
+    page_size = db.conn.execute("PRAGMA page_size").fetchone()[0]
+    results = []
+    before = read_bytes()
+    started = time.perf_counter()
+    for area_code, target_date in lookups:
+        results.append(db.get_forecast_by_date(area_code, target_date))
+    elapsed = time.perf_counter() - started
+    pages = (read_bytes() - before) / page_size / len(lookups)
+    db.conn.close()
+    return results, elapsed / len(lookups), pages
+
+
+def main():
+    n_days = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DAYS
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_QUERIES
+    history = list(make_history(n_days))
+    n_rows = sum(map(len, history))
+    print(f"{N_OFFICES} 地域 × {n_days} 日 × 1日{REPORTS_PER_DAY}回の発表（{n_rows:,} 行）")
+
+    rng = random.Random(1)
+    lookups = [(f"{rng.randint(1, N_OFFICES):02d}0000",
+                (datetime(2024, 1, 1) + timedelta(days=rng.randrange(n_days))).strftime("%Y-%m-%d"))
+               for _ in range(n_queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        answers = {}
+        for label, compact in (("従来（forecasts）", False), ("省スペース形式", True)):
+            path = os.path.join(tmp, f"{'compact' if compact else 'legacy'}.db")
+            db, write = build(path, compact, history)
+            if compact:
+                counts = {table: db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                          for table in ("weather_texts", "reports", "forecast_revisions")}
+                detail = "  " + " / ".join(f"{t} {n:,} 行" for t, n in counts.items())
+            else:
+                detail = f"  forecasts {db.conn.execute('SELECT COUNT(*) FROM forecasts').fetchone()[0]:,} 行"
+            db.conn.close()
+            answers[label], per_query, pages = measure(path, compact, lookups, cache_size=1)
+            _, _, cached_pages = measure(path, compact, lookups, cache_size=-2000)
+            print(f"  {label:<14} 保存 {write:6.2f} 秒  大きさ {os.path.getsize(path) / 1e6:7.2f} MB  "
+                  f"検索 {per_query * 1e6:6.1f} µs/回")
+            print(f"{detail}\n  読んだページ /回: キャッシュなし {pages:5.1f}  既定のキャッシュ {cached_pages:5.2f}")
+        mismatches = sum(a != b for a, b in zip(*answers.values()))
+    print(f"  検索結果の不一致: {mismatches} 件")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
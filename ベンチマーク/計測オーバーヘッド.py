@@ -0,0 +1,47 @@
+"""計測.py の呼び出し1回あたりの時間を、無効 / 有効 で比べる
+
+使い方: python ベンチマーク/計測オーバーヘッド.py [回数]
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import 計測
+
+
+@計測.timed("bench_seconds", op="timed")
+def decorated():
+    pass
+
+
+def plain():
+    pass
+
+
+def with_timer():
+    with 計測.timer("bench_seconds", op="timer"):
+        pass
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    cases = [
+        ("何もしない関数", plain),
+        ("inc()", lambda: 計測.inc("bench_total", op="inc")),
+        ("with timer()", with_timer),
+        ("@timed の関数", decorated),
+    ]
+    base = min(timeit.repeat(plain, number=n, repeat=3)) / n
+    for label, enabled in (("無効", False), ("有効", True)):
+        計測.enable() if enabled else 計測.disable()
+        計測.reset()
+        print(f"--- {label} ---")
+        for name, func in cases:
+            per_call = min(timeit.repeat(func, number=n, repeat=3)) / n
+            print(f"  {name:<14} {per_call * 1e9:7.0f} ns/回  (関数呼び出しとの差 {(per_call - base) * 1e9:+6.0f} ns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""スタブサーバーを相手に、取得から保存までの遅延・スループット・メモリを測る
+
+使い方: python ベンチマーク/負荷試験.py [--titles 5000] [--rounds 3] [--rows 100000]
+                                     [--latency 0.02] [--error-rate 0.01] [--scale 5]
+                                     [--save 結果.json] [--baseline 前回.json]
+
+シナリオごとに新しいプロセスで実行するので、ピークRSSはそのシナリオだけの値になる。
+--baseline を指定すると、p95 の悪化やスループットの低下が許容幅を超えたときに終了コード1で終わる。
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+# リポジトリ直下（通信.py など）、旅行アプリ（src.データベース など）、このフォルダを読み込めるようにする
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "dsprog最終課題"), BENCH_DIR):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from スタブサーバ import StubServer
+from 通信 import HTTPClient
+
+# 比較するときの許容幅（0.2 なら 20% までの悪化は許す）
+DEFAULT_TOLERANCE = 0.2
+# 1発表あたりの行数（DB書き込み.py の合成データと同じ）
+ROWS_PER_REPORT = 3
+# DBHandler.upsert_many に1回で渡す件数
+BULK_SIZE = 1000
+
+
+class TimedClient(HTTPClient):
+    """リクエストごとの所要時間（再試行を含む）を記録する HTTPClient"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        started = time.perf_counter()
+        try:
+            return super().get(url, params=params, headers=headers, timeout=timeout)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def peak_rss_mb():
+    """このプロセスのピークRSS（MB）。取得できない環境では None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(name, unit, count, seconds, latencies, **extra):
+    latencies = sorted(latencies)
+    return {
+        "name": name,
+        "unit": unit,
+        "count": count,
+        "seconds": seconds,
+        "throughput": count / seconds if seconds else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+        "extra": extra,
+    }
+
+
+def _client(config):
+    # 再試行の待ち時間は短くして、エラー率を上げても測定が長引きすぎないようにする
+    return TimedClient(max_per_host=config["workers"], backoff_factor=0.01)
+
+
+# --- シナリオ（それぞれ別プロセスで動く） ---
+
+def bench_wiki(config):
+    """WikiFetcher でタイトルをまとめて問い合わせる"""
+    from src.データ取得 import WikiFetcher
+
+    titles = ["清水寺", "USJ", "存在しない観光地"]
+    titles += [f"観光地{i}" for i in range(config["titles"] - len(titles))]
+    client = _client(config)
+    fetcher = WikiFetcher(requests_per_sec=0, max_workers=config["workers"], client=client,
+                          api_url=config["wiki_url"])
+
+    started = time.perf_counter()
+    lengths = fetcher.fetch_lengths(titles)
+    seconds = time.perf_counter() - started
+
+    # 記録したレスポンスどおりに解釈できているか（リダイレクト・記事なしを含む）
+    assert lengths["清水寺"] == 48213 and lengths["USJ"] == 151409, lengths
+    assert lengths["存在しない観光地"] == 0
+    failed = sum(1 for title in titles[3:] if lengths[title] == 0)
+    return summarize("wiki_fetch", "titles/s", len(titles), seconds, client.latencies,
+                     batches=len(client.latencies), failed_titles=failed,
+                     **client.stats.snapshot())
+
+
+def bench_sync(config):
+    """WeatherApp.sync_weather で全 office の取得・解析・保存を繰り返す"""
+    import importlib
+    from キャッシュ import HTTPCache
+    from 天気DB import WeatherDB
+
+    # ファイル名に全角数字を含むので、import 文ではなく importlib で読む
+    WeatherApp = importlib.import_module("天気課題２").WeatherApp
+
+    client = _client(config)
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = WeatherDB(os.path.join(tmp, "weather.db"))
+        cache = HTTPCache(os.path.join(tmp, "cache"), ttl=0, client=client)
+        app = WeatherApp(db, cache, config["area_url"], config["forecast_url"])
+        app.initialize_data()
+        codes = [code for code, _ in db.get_areas()]
+
+        started = time.perf_counter()
+        for _ in range(config["rounds"]):
+            for code in codes:
+                t = time.perf_counter()
+                app.sync_weather(code)
+                latencies.append(time.perf_counter() - t)
+        seconds = time.perf_counter() - started
+
+        elements = db.conn.execute("SELECT COUNT(*) FROM forecast_elements").fetchone()[0]
+        db.conn.close()
+    return summarize("weather_sync", "sync/s", len(latencies), seconds, latencies,
+                     offices=len(codes), elements=elements, cache=cache.stats(),
+                     **client.stats.snapshot())
+
+
+def bench_weather_db(config):
+    """WeatherDB.save_forecasts_bulk に1発表ずつ書き込む"""
+    from DB書き込み import make_records
+    from 天気DB import WeatherDB
+
+    records = list(make_records(config["rows"]))
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = WeatherDB(os.path.join(tmp, "weather.db"))
+        started = time.perf_counter()
+        for i in range(0, len(records), ROWS_PER_REPORT):
+            t = time.perf_counter()
+            db.save_forecasts_bulk(records[i:i + ROWS_PER_REPORT])
+            latencies.append(time.perf_counter() - t)
+        seconds = time.perf_counter() - started
+        db.conn.close()
+    return summarize("weather_db_write", "rows/s", len(records), seconds, latencies,
+                     reports=len(latencies))
+
+
+def bench_dbhandler(config):
+    """DBHandler.upsert_data で観光地を1件ずつ書き込む"""
+    from src.データベース import DBHandler
+
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBHandler("bench.db", data_dir=tmp)
+        started = time.perf_counter()
+        for i in range(config["spots"]):
+            t = time.perf_counter()
+            db.upsert_data(f"観光地{i}", 1000 + i, 8000 + i % 10_000)
+            latencies.append(time.perf_counter() - t)
+        seconds = time.perf_counter() - started
+    return summarize("dbhandler_upsert", "rows/s", len(latencies), seconds, latencies)
+
+
+def bench_dbhandler_bulk(config):
+    """DBHandler.upsert_many で観光地を1000件ずつまとめて書き込む"""
+    from src.データベース import DBHandler
+
+    rows = [(f"観光地{i}", 1000 + i, 8000 + i % 10_000) for i in range(config["spots"] * 10)]
+    latencies = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBHandler("bench.db", data_dir=tmp)
+        started = time.perf_counter()
+        for i in range(0, len(rows), BULK_SIZE):
+            t = time.perf_counter()
+            db.upsert_many(rows[i:i + BULK_SIZE])
+            latencies.append(time.perf_counter() - t)
+        seconds = time.perf_counter() - started
+    return summarize("dbhandler_bulk", "rows/s", len(rows), seconds, latencies,
+                     batches=len(latencies))
+
+
+SCENARIOS = {
+    "wiki_fetch": bench_wiki,
+    "weather_sync": bench_sync,
+    "weather_db_write": bench_weather_db,
+    "dbhandler_upsert": bench_dbhandler,
+    "dbhandler_bulk": bench_dbhandler_bulk,
+}
+
+
+# --- 実行と比較 ---
+
+def run_isolated(scenario, config):
+    # シナリオごとに新しいプロセスを立ち上げ、ピークRSSが前のシナリオの影響を受けないようにする
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(scenario, config).result()
+
+
+def print_result(result):
+    rss = f"{result['peak_rss_mb']:7.1f} MB" if result["peak_rss_mb"] is not None else "      - "
+    print(f"{result['name']:<18} {result['count']:>9,} 件  {result['throughput']:>11,.1f} {result['unit']:<9}"
+          f" p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms"
+          f"  RSS {rss}")
+    if result["extra"]:
+        print(f"{'':<18} {json.dumps(result['extra'], ensure_ascii=False)}")
+
+
+def compare(results, baseline, tolerance):
+    """前回の結果と比べて、悪化したシナリオの説明を返す"""
+    previous = {result["name"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['name']}: p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms")
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{result['name']}: スループット {before['throughput']:,.1f} -> "
+                               f"{result['throughput']:,.1f} {result['unit']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="スタブサーバーを使った負荷・遅延ベンチマーク")
+    parser.add_argument("--only", nargs="+", choices=list(SCENARIOS), help="実行するシナリオ")
+    parser.add_argument("--titles", type=int, default=5000, help="WikiFetcher で問い合わせるタイトル数")
+    parser.add_argument("--rounds", type=int, default=3, help="sync_weather で全 office を回る回数")
+    parser.add_argument("--rows", type=int, default=100_000, help="WeatherDB に書き込む行数")
+    parser.add_argument("--spots", type=int, default=2000, help="DBHandler に1件ずつ書き込む件数（まとめて書く方はこの10倍）")
+    parser.add_argument("--workers", type=int, default=8, help="同時接続数・並列数")
+    parser.add_argument("--latency", type=float, default=0.02, help="スタブサーバーの応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のばらつきの上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="スタブサーバーが 503 を返す割合")
+    parser.add_argument("--scale", type=int, default=1, help="office 数と細分区域数の倍率")
+    parser.add_argument("--save", help="結果を JSON で保存するパス")
+    parser.add_argument("--baseline", help="比較する前回の結果（JSON）")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="許容する悪化の割合")
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        scale=args.scale, advance_reports=True, seed=0)
+    config = {
+        "titles": args.titles, "rounds": args.rounds, "rows": args.rows, "spots": args.spots,
+        "workers": args.workers, "wiki_url": server.wiki_url, "area_url": server.area_url,
+        "forecast_url": server.forecast_url,
+    }
+    print(f"スタブサーバー {server.url}（遅延 {args.latency * 1000:.0f} ms, "
+          f"エラー率 {args.error_rate:.0%}, 規模 x{args.scale}）\n")
+
+    results = []
+    with server:
+        for name in args.only or list(SCENARIOS):
+            before = server.stats()
+            result = run_isolated(SCENARIOS[name], config)
+            after = server.stats()
+            # サーバー側から見た、このシナリオの接続数・エラー数
+            result["extra"]["server"] = {key: after[key] - before[key] for key in after}
+            print_result(result)
+            results.append(result)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n前回より悪化しています（許容幅 {args.tolerance:.0%}）:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n前回の結果と比べて悪化はありません")
+
+
+if __name__ == "__main__":
+    main()
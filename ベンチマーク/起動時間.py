@@ -0,0 +1,112 @@
+"""各入口の起動時間（最初に表示できるまで）と、そこまでに読み込んだ重いライブラリを測る
+
+使い方: python ベンチマーク/起動時間.py [--rounds 5]
+
+入口ごとに新しいプロセスを STARTUP_PROFILE=1 と -X importtime 付きで起動し、
+起動計測.mark() が出した時刻の中央値と、読み込んだ重いライブラリごとの
+読み込み時間（-X importtime の cumulative を配下まで合計したもの）を表示する。
+天気アプリは画面を開けないので、モジュールを読み込み終えた時点を測る。
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAVEL_DIR = os.path.join(ROOT_DIR, "dsprog最終課題")
+for path in (ROOT_DIR, os.path.dirname(os.path.abspath(__file__))):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from スタブサーバ import StubServer
+from 起動計測 import HEAVY_MODULES
+
+CLI = os.path.join(TRAVEL_DIR, "cli.py")
+MARK_RE = re.compile(r"^startup \|\s*([\d.]+) ms \| (.+?) \|")
+IMPORT_RE = re.compile(r"^import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)")
+
+
+def import_module_code(module):
+    # 全角数字を含むモジュール名は import 文では書けないので importlib を使う
+    return (f"import importlib, 起動計測; importlib.import_module({module!r}); "
+            f"起動計測.mark('モジュール読み込み完了')")
+
+
+def scenarios(tmp, stub):
+    base = [sys.executable, "-X", "importtime"]
+    db = ["--data-dir", tmp]
+    return [
+        ("cli stats", base + [CLI] + db + ["stats"]),
+        ("cli ingest", base + [CLI] + db + ["ingest", "--api-url", stub.wiki_url]),
+        ("cli report", base + [CLI] + db + ["report", "清水寺"]),
+        ("天気課題２", base + ["-c", import_module_code("天気課題２")]),
+        ("課題天気", base + ["-c", import_module_code("課題天気")]),
+        ("課題天気２", base + ["-c", import_module_code("課題天気２")]),
+    ]
+
+
+def run_once(cmd, cwd):
+    env = dict(os.environ, STARTUP_PROFILE="1", STARTUP_T0=repr(time.time()),
+               PYTHONPATH=ROOT_DIR, MPLBACKEND="Agg")
+    proc = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} が失敗しました:\n{proc.stderr[-2000:]}")
+
+    marks = {}
+    imports = []
+    for line in proc.stderr.splitlines():
+        m = MARK_RE.match(line)
+        if m:
+            marks[m.group(2)] = float(m.group(1))
+            continue
+        m = IMPORT_RE.match(line)
+        if m:
+            imports.append((len(m.group(3)), m.group(4), int(m.group(2))))
+    return marks, heavy_import_times(imports)
+
+
+def heavy_import_times(imports):
+    """重いライブラリごとの読み込み時間（ms）。配下のモジュールも含める
+
+    -X importtime は読み込みが終わった順（子が先）に出すので、逆順にたどって親子関係を作り、
+    親が同じライブラリでない行の cumulative を足し合わせる。
+    """
+    totals = {}
+    stack = []
+    for indent, name, cumulative in reversed(imports):
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        root = name.split(".")[0]
+        parent_root = stack[-1][1] if stack else None
+        if root in HEAVY_MODULES and root != parent_root:
+            totals[root] = totals.get(root, 0) + cumulative / 1000
+        stack.append((indent, root))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, StubServer() as stub:
+        # report と stats に使うデータを先に入れておく
+        subprocess.run([sys.executable, CLI, "--data-dir", tmp, "ingest", "--api-url", stub.wiki_url],
+                       check=True, capture_output=True)
+        for label, cmd in scenarios(tmp, stub):
+            runs = [run_once(cmd, tmp) for _ in range(args.rounds)]
+            names = list(runs[0][0])
+            summary = "  ".join(
+                f"{name} {statistics.median(r[0][name] for r in runs):7.1f} ms" for name in names)
+            heavy = runs[-1][1]
+            loaded = ", ".join(f"{name} {ms:.0f}ms" for name, ms in heavy.items()) or "なし"
+            print(f"{label:<12} {summary}")
+            print(f"{'':<12} 読み込んだライブラリ: {loaded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""電卓のキー入力を大量に再生して、画面なしのエンジン（電卓エンジン.py）の速さと結果を確かめる
+
+使い方: python ベンチマーク/電卓キー入力.py [入力列の数]
+
+入力列（乱数で作ったボタン操作の列）ごとに、以前の画面クラスの button_clicked と
+同じ処理（下の LegacyCalculator。1キーごとに画面を更新していた）と、エンジンの feed() とで
+最後の状態（表示・演算子・オペランド・次が新しいオペランドか）がすべて一致することを確かめる。
+"""
+import math
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, "lecture-4", "calculator", "src"))
+
+from 電卓エンジン import CalculatorEngine
+
+DEFAULT_SEQUENCES = 1_000_000
+# 押されやすさの重み（数字が多く、AC や科学計算は少なめ）
+KEY_WEIGHTS = {
+    **{d: 6 for d in "0123456789"}, ".": 3,
+    "+": 3, "-": 3, "*": 3, "/": 3, "=": 4, "%": 1, "+/-": 1, "AC": 1,
+    "sin": 1, "cos": 1, "tan": 1, "log": 1, "sqrt": 1,
+}
+
+
+class LegacyCalculator:
+    """以前の CalculatorApp のキー処理（画面の部品を値に置き換えただけ）"""
+
+    def __init__(self):
+        self.value = "0"
+        self.updates = 0
+        self.reset()
+
+    def press(self, data):
+        try:
+            self.button_clicked(data)
+        except Exception:
+            # Flet はイベント処理の例外を記録するだけで、画面はそのまま
+            return
+        self.updates += 1  # self.update()
+
+    def button_clicked(self, data):
+        # AC (All Clear) or Error state
+        if self.value == "Error" or data == "AC":
+            self.value = "0"
+            self.reset()
+
+        # Digits and Decimal Point
+        elif data in ("1", "2", "3", "4", "5", "6", "7", "8", "9", "0", "."):
+            if self.value == "0" or self.new_operand == True:
+                # 既に小数点が入力されている場合は、二重入力を防ぐ
+                if data == "." and "." in self.value and not self.new_operand:
+                    pass
+                else:
+                    self.value = data if data != "." or self.value == "0" else self.value + data
+                    self.new_operand = False
+            else:
+                # 既に小数点が入力されている場合は、二重入力を防ぐ
+                if data == "." and "." in self.value:
+                    pass
+                else:
+                    self.value = self.value + data
+
+        # Arithmetic Operators (+, -, *, /)
+        elif data in ("+", "-", "*", "/"):
+            # 前の演算を実行し、結果を次のオペランド1とする
+            self.value = self.calculate(self.operand1, float(self.value), self.operator)
+            self.operator = data
+            if self.value == "Error":
+                self.operand1 = "0"
+            else:
+                self.operand1 = float(self.value)
+            self.new_operand = True
+
+        # Equals (=)
+        elif data in ("="):
+            self.value = self.calculate(self.operand1, float(self.value), self.operator)
+            self.reset()
+
+        # Percentage (%)
+        elif data in ("%"):
+            try:
+                self.value = self.format_number(float(self.value) / 100)
+                self.new_operand = True
+            except ValueError:
+                self.value = "Error"
+                self.reset()
+
+        # Sign Change (+/-)
+        elif data in ("+/-"):
+            try:
+                current_value = float(self.value)
+                self.value = self.format_number(-current_value)
+            except ValueError:
+                self.value = "Error"
+                self.reset()
+
+        # --- 科学計算ボタンの処理 (新規追加) ---
+        elif data in ("sin", "cos", "tan", "log", "sqrt"):
+            try:
+                current_value = float(self.value)
+
+                if data == "sin":
+                    # Fletは度数法ではないため、ラジアンに変換して計算
+                    self.value = self.format_number(math.sin(math.radians(current_value)))
+                elif data == "cos":
+                    self.value = self.format_number(math.cos(math.radians(current_value)))
+                elif data == "tan":
+                    self.value = self.format_number(math.tan(math.radians(current_value)))
+                elif data == "log":
+                    # 負の数やゼロの対数を防ぐ
+                    if current_value <= 0:
+                        self.value = "Error"
+                    else:
+                        # 自然対数 (ln) を使用 (必要に応じて math.log10 に変更可能)
+                        self.value = self.format_number(math.log(current_value))
+                elif data == "sqrt":
+                    # 負の数の平方根を防ぐ
+                    if current_value < 0:
+                        self.value = "Error"
+                    else:
+                        self.value = self.format_number(math.sqrt(current_value))
+
+                # 科学計算ボタンの実行後、次の入力を新しいオペランドとする
+                self.new_operand = True
+                self.operand1 = 0 # 連続計算をリセット
+                self.operator = "+" # 連続計算をリセット
+
+            except ValueError:
+                self.value = "Error"
+                self.reset()
+            except Exception: # ゼロ除算などのmathエラー対策
+                self.value = "Error"
+                self.reset()
+
+    def format_number(self, num):
+        # 浮動小数点数の桁数を丸める
+        if isinstance(num, (float, int)):
+            rounded_num = round(num, 10) # 小数点以下10桁に丸める
+            if rounded_num % 1 == 0:
+                return int(rounded_num)
+            else:
+                return rounded_num
+        return num # 数値でない場合はそのまま返す
+
+    def calculate(self, operand1, operand2, operator):
+        # ... (既存の calculate メソッドは変更なし) ...
+        if operator == "+":
+            return self.format_number(operand1 + operand2)
+
+        elif operator == "-":
+            return self.format_number(operand1 - operand2)
+
+        elif operator == "*":
+            return self.format_number(operand1 * operand2)
+
+        elif operator == "/":
+            if operand2 == 0:
+                return "Error"
+            else:
+                return self.format_number(operand1 / operand2)
+
+        # 演算子が設定されていない場合 (例: AC後の=)
+        return self.format_number(operand2)
+
+    def reset(self):
+        # ... (既存の reset メソッドは変更なし) ...
+        self.operator = "+"
+        self.operand1 = 0
+        self.new_operand = True
+
+
+def make_sequences(n_sequences, seed=0):
+    rng = random.Random(seed)
+    keys = list(KEY_WEIGHTS)
+    weights = list(KEY_WEIGHTS.values())
+    return [rng.choices(keys, weights, k=rng.randint(4, 20)) for _ in range(n_sequences)]
+
+
+def main():
+    n_sequences = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SEQUENCES
+    sequences = make_sequences(n_sequences)
+    n_keys = sum(map(len, sequences))
+    print(f"入力列 {n_sequences:,} 本（キー {n_keys:,} 回）")
+
+    started = time.perf_counter()
+    expected = []
+    updates = 0
+    for keys in sequences:
+        calc = LegacyCalculator()
+        for key in keys:
+            calc.press(key)
+        updates += calc.updates
+        expected.append((calc.value, calc.operator, calc.operand1, calc.new_operand))
+    legacy = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = []
+    for keys in sequences:
+        engine = CalculatorEngine()
+        engine.feed(keys)
+        actual.append(engine.state())
+    batch = time.perf_counter() - started
+
+    # nan どうしや 1 と 1.0 も区別して比べる
+    mismatches = sum(repr(a) != repr(b) for a, b in zip(expected, actual))
+    for label, elapsed, n_updates in (("以前の button_clicked", legacy, updates),
+                                      ("エンジンの feed()", batch, n_sequences)):
+        print(f"  {label:<20} {elapsed:6.2f} 秒  ({n_keys / elapsed / 1e6:5.2f} M キー/秒)  画面の更新 {n_updates:,} 回")
+    print(f"  最後の状態の不一致: {mismatches:,} 本")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import io
+import json
+import re
+from itertools import repeat
+
+# ijson があれば JSON を少しずつ読み進め、細分区域1つ分ずつ処理する（メモリが一定で済む）
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+import 計測
+from 天気DB import encode_area, encode_report
+
+# 予報の種類（data[0] が3日予報、data[1] が週間予報）
+KIND_SHORT = 0
+KIND_WEEKLY = 1
+# 週間予報の平年値（timeDefines を持たない）に割り当てる series 番号
+AVERAGE_SERIES = {"tempAverage": 100, "precipAverage": 101}
+# 3日予報の発表日時は本文の先頭（data[0] の publishingOffice の次）にある
+_REPORT_TIME = re.compile(rb'"reportDatetime"\s*:\s*"([^"]+)"')
+_REPORT_TIME_HEAD = 1024
+
+
+class ForecastColumns:
+    """1つの office の予報を、forecast_elements テーブルの列ごとのリストで持つ"""
+    COLUMNS = ("report_datetime", "kind", "series", "sub_area_code",
+               "time_define", "element", "value_num", "value_text")
+
+    def __init__(self, area_code):
+        self.area_code = area_code
+        self.columns = {name: [] for name in self.COLUMNS}
+        # 細分区域のコード -> 名前
+        self.sub_areas = {}
+        # 従来の forecasts テーブル用（3日予報の最初の区域の天気）
+        self.report_time = None
+        self.forecast_list = []
+
+    def __len__(self):
+        return len(self.columns["element"])
+
+    def append(self, report_time, kind, series, sub_area_code, time_define, element, value):
+        c = self.columns
+        c["report_datetime"].append(encode_report(report_time))
+        c["kind"].append(kind)
+        c["series"].append(series)
+        c["sub_area_code"].append(sub_area_code)
+        c["time_define"].append(encode_report(time_define) if time_define else 0)
+        c["element"].append(element)
+        c["value_num"].append(_to_number(value))
+        c["value_text"].append(None if value is None else str(value))
+
+    def rows(self):
+        """executemany にそのまま渡せる行のイテレータ"""
+        area = repeat(encode_area(self.area_code))
+        return zip(area, *(self.columns[name] for name in self.COLUMNS))
+
+
+def _to_number(value):
+    # 降水確率や気温は数値として、天気の文章などは None（value_text だけに入れる）
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _iter_areas_streaming(stream):
+    """ijson で (種類, series, 発表日時, timeDefines, 区域) を1区域ずつ取り出す
+
+    JSON全体を辞書にせず、区域の辞書を1つずつ組み立てては捨てる。気象庁の JSON では
+    reportDatetime は timeSeries より前、timeDefines は areas より前にあるので、ふつうは
+    組み立てた区域をすぐに返す。キーの順番が違うときは、その値が出てくるまで
+    （なければその timeSeries・予報の終わりまで）区域を取っておいてから返す。
+    """
+    kind = -1
+    report_time = None
+    series = -1
+    times = None  # timeDefines を読み終わるまでは None
+    time_buffer = []
+    builder = None
+    area_prefix = None
+    # timeDefines を待っている区域 / reportDatetime を待っている (series, timeDefines, 区域)
+    waiting_times = []
+    waiting_report = []
+
+    for prefix, event, value in ijson.parse(stream):
+        ready = []
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == area_prefix and event == "end_map":
+                if not area_prefix.startswith("item.timeSeries"):
+                    # 平年値は timeDefines を持たない
+                    ready.append((AVERAGE_SERIES[area_prefix.split(".")[1]], [], builder.value))
+                elif times is None:
+                    waiting_times.append(builder.value)
+                else:
+                    ready.append((series, times, builder.value))
+                builder = None
+        elif prefix == "item":
+            if event == "start_map":
+                kind += 1
+                series = -1
+                report_time = None
+            elif event == "end_map" and waiting_report:
+                # reportDatetime のない予報
+                for area_series, area_times, area in waiting_report:
+                    yield kind, area_series, None, area_times, area
+                waiting_report = []
+        elif prefix == "item.reportDatetime":
+            report_time = value
+            for area_series, area_times, area in waiting_report:
+                yield kind, area_series, report_time, area_times, area
+            waiting_report = []
+        elif prefix == "item.timeSeries.item":
+            if event == "start_map":
+                series += 1
+                times = None
+            elif event == "end_map" and waiting_times:
+                # timeDefines のない timeSeries
+                ready = [(series, [], area) for area in waiting_times]
+                waiting_times = []
+        elif prefix == "item.timeSeries.item.timeDefines":
+            if event == "start_array":
+                time_buffer = []
+            elif event == "end_array":
+                times = time_buffer
+                ready = [(series, times, area) for area in waiting_times]
+                waiting_times = []
+        elif prefix == "item.timeSeries.item.timeDefines.item":
+            time_buffer.append(value)
+        elif event == "start_map" and prefix in ("item.timeSeries.item.areas.item",
+                                                  "item.tempAverage.areas.item",
+                                                  "item.precipAverage.areas.item"):
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            area_prefix = prefix
+
+        if ready:
+            if report_time is None:
+                waiting_report.extend(ready)
+                continue
+            for area_series, area_times, area in ready:
+                yield kind, area_series, report_time, area_times, area
+
+
+def _iter_areas_loaded(data):
+    """ijson がない場合: 読み込み済みの JSON から同じ形で取り出す"""
+    for kind, report in enumerate(data):
+        report_time = report.get("reportDatetime")
+        for series, time_series in enumerate(report.get("timeSeries", [])):
+            for area in time_series.get("areas", []):
+                yield kind, series, report_time, time_series.get("timeDefines", []), area
+        for name, series in AVERAGE_SERIES.items():
+            for area in report.get(name, {}).get("areas", []):
+                yield kind, series, report_time, [], area
+
+
+def peek_report_time(body):
+    """本文を解析せずに、先頭から3日予報の発表日時だけを読む（見つからなければ None）"""
+    match = _REPORT_TIME.search(body, 0, _REPORT_TIME_HEAD)
+    return match.group(1).decode("utf-8") if match else None
+
+
+@計測.timed("json_parse_seconds", source="forecast")
+def parse_forecast(body, area_code):
+    """気象庁の予報JSON（bytes）のすべての timeSeries・細分区域を列形式に変換"""
+    if ijson is not None:
+        areas = _iter_areas_streaming(io.BytesIO(body))
+    else:
+        areas = _iter_areas_loaded(json.loads(body))
+
+    columns = ForecastColumns(area_code)
+    for kind, series, report_time, times, area in areas:
+        info = area.get("area", {})
+        sub_code = info.get("code", "")
+        columns.sub_areas[sub_code] = info.get("name", "")
+        if kind == KIND_SHORT and columns.report_time is None:
+            columns.report_time = report_time
+
+        for element, values in area.items():
+            if element == "area":
+                continue
+            if isinstance(values, list):
+                for i, value in enumerate(values):
+                    time_define = times[i] if i < len(times) else None
+                    columns.append(report_time, kind, series, sub_code, time_define, element, value)
+            else:
+                # 平年値の min / max など
+                columns.append(report_time, kind, series, sub_code, None, element, values)
+
+        # 従来の forecasts（3日予報の最初の区域の天気だけ）
+        if kind == KIND_SHORT and series == 0 and not columns.forecast_list and "weathers" in area:
+            columns.forecast_list = [(t[:10], w) for t, w in zip(times, area["weathers"])]
+    return columns
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import flet as ft
+
+import 計測
+
+# 最初に作るリスト行の数と、スクロールで末尾に近づいたときに追加する数
+PAGE_SIZE = 40
+# 末尾までこのピクセル数以内に来たら次のページを作る
+PRELOAD_PIXELS = 400
+
+logger = logging.getLogger(__name__)
+
+
+class UIMetrics:
+    """操作ごとに、作ったコントロール数と送った更新量を数える
+
+    操作は UI のハンドラ（flet はスレッドプールから呼ぶ）と裏のスレッドの両方から始まる。
+    operation() の間は lock を持つので、同じ metrics を使う画面の操作は1つずつ順に行われる。
+    """
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.history = []
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.name = None
+        self.started = None
+        self.created = 0
+        self.updated = 0
+        self.update_calls = 0
+        self.payload_bytes = 0
+
+    def begin(self, name):
+        self._reset()
+        self.name = name
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def operation(self, name):
+        """begin〜end を、ほかのスレッドの操作と重ならないように行う"""
+        with self.lock:
+            self.begin(name)
+            try:
+                yield self
+            finally:
+                self.end()
+
+    def created_controls(self, n=1):
+        self.created += n
+
+    def sent_update(self, controls, texts=()):
+        # 送信量の目安: 更新したコントロール数 + 変わった文字列のバイト数
+        self.update_calls += 1
+        self.updated += controls
+        self.payload_bytes += sum(len(str(t).encode("utf-8")) for t in texts)
+
+    def end(self):
+        record = {
+            "name": self.name,
+            "created": self.created,
+            "updated": self.updated,
+            "update_calls": self.update_calls,
+            "payload_bytes": self.payload_bytes,
+            "ms": (time.perf_counter() - self.started) * 1000 if self.started else 0.0,
+        }
+        self.history.append(record)
+        計測.observe("ui_update_seconds", record["ms"] / 1000, op=record["name"])
+        計測.inc("ui_controls_created_total", record["created"])
+        計測.inc("ui_controls_updated_total", record["updated"])
+        計測.inc("ui_payload_bytes_total", record["payload_bytes"])
+        if self.verbose:
+            logger.info("[UI] %s: 作成 %d / 更新 %d (%d回, 約%dB) %.1fms", record["name"], record["created"],
+                        record["updated"], record["update_calls"], record["payload_bytes"], record["ms"])
+        return record
+
+
+class LazyListView:
+    """見える範囲の行だけを作るリスト。行のコントロールは使い回す"""
+    def __init__(self, on_click, metrics=None, page_size=PAGE_SIZE, item_extent=56,
+                 tile_style=None, **kwargs):
+        self.on_click = on_click
+        self.tile_style = tile_style or {}
+        self.metrics = metrics or UIMetrics()
+        self.page_size = page_size
+        self.items = []
+        # 作ったことのある ListTile（表示件数が減っても捨てずに取っておく）
+        self.pool = []
+        self.view = ft.ListView(item_extent=item_extent, on_scroll=self._on_scroll, **kwargs)
+
+    def _tile(self, index):
+        if index < len(self.pool):
+            return self.pool[index]
+        tile = ft.ListTile(title=ft.Text(""), on_click=self.on_click, **self.tile_style)
+        self.pool.append(tile)
+        self.metrics.created_controls(2)
+        return tile
+
+    def _fill(self, tile, item):
+        code, label = item
+        tile.data = code
+        tile.title.value = label
+
+    def set_items(self, items):
+        """(コード, 表示名) のリストを表示する。最初の1ページ分だけ行を作る"""
+        self.items = list(items)
+        count = min(len(self.items), self.page_size)
+        self.view.controls = [self._tile(i) for i in range(count)]
+        for tile, item in zip(self.view.controls, self.items):
+            self._fill(tile, item)
+
+    def _on_scroll(self, e):
+        if e.max_scroll_extent - e.pixels > PRELOAD_PIXELS:
+            return
+        shown = len(self.view.controls)
+        if shown >= len(self.items):
+            return
+        with self.metrics.operation("scroll"):
+            more = [self._tile(i) for i in range(shown, min(shown + self.page_size, len(self.items)))]
+            for tile, item in zip(more, self.items[shown:]):
+                self._fill(tile, item)
+            self.view.controls.extend(more)
+            self.view.update()
+            self.metrics.sent_update(len(more), (item[1] for item in self.items[shown:shown + len(more)]))
+
+
+class CardGrid:
+    """キー付きのカード一覧。内容が変わったカードだけを更新し、カードは使い回す"""
+    def __init__(self, metrics=None, col=None, title_style=None, body_style=None):
+        self.metrics = metrics or UIMetrics()
+        self.col = col or {"sm": 12, "md": 6}
+        self.title_style = title_style or {}
+        self.body_style = body_style or {}
+        self.grid = ft.ResponsiveRow()
+        self.cards = {}  # キー -> (カード, 見出しText, 本文Text)
+        self.pool = []
+
+    def _new_card(self):
+        title = ft.Text("", **self.title_style)
+        body = ft.Text("", **self.body_style)
+        card = ft.Card(content=ft.Container(content=ft.Column([title, body]), padding=15),
+                       col=self.col)
+        self.metrics.created_controls(5)
+        return card, title, body
+
+    def render(self, items):
+        """items は (キー, 見出し, 本文) のリスト。コントロールの中身だけを書き換える"""
+        keys = [key for key, _, _ in items]
+        # なくなったカードはプールに戻して、次の表示で使い回す
+        wanted = set(keys)
+        for key in [key for key in self.cards if key not in wanted]:
+            self.pool.append(self.cards.pop(key))
+
+        changed = []
+        for key, title_text, body_text in items:
+            entry = self.cards.get(key)
+            if entry is None:
+                entry = self.pool.pop() if self.pool else self._new_card()
+                self.cards[key] = entry
+            card, title, body = entry
+            if title.value != title_text or body.value != body_text:
+                title.value = title_text
+                body.value = body_text
+                changed.append(entry)
+
+        ordered = [self.cards[key][0] for key in keys]
+        structure_changed = [id(c) for c in ordered] != [id(c) for c in self.grid.controls]
+        if structure_changed:
+            self.grid.controls = ordered
+        return structure_changed, changed
+
+    def flush(self, structure_changed, changed):
+        """render の結果を送る（並びが変わらなければ変わったカードだけ）"""
+        texts = [t for _, title, body in changed for t in (title.value, body.value)]
+        if structure_changed:
+            self.grid.update()
+            self.metrics.sent_update(len(self.grid.controls), texts)
+        elif changed:
+            for card, _, _ in changed:
+                card.update()
+            self.metrics.sent_update(len(changed), texts)
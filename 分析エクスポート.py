@@ -0,0 +1,256 @@
+import json
+import os
+import time
+from datetime import date
+from itertools import islice
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = None
+
+from 天気DB import decode_date
+
+EXPORT_DIR = "forecast_export"
+WATERMARK_FILE = "_watermark.json"
+# 書き出し中の回の印（途中で止まったら、次の回でその回のファイルを消してから書き直す）
+PENDING_FILE = "_pending.json"
+# 1回に SQLite から読み出して Parquet に書く行数
+CHUNK_ROWS = 200_000
+# 発表日時（UNIX秒）を日本時間の日付（1970-01-01 からの日数）にするためのずれ
+JST_OFFSET = 9 * 3600
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("area_code", pa.int32()),
+        ("month", pa.int32()),
+        ("forecast_date", pa.date32()),
+        ("report_datetime", pa.int64()),
+        ("weather_text", pa.string()),
+    ])
+    # 地域・月ごとのフォルダに分ける（area_code=130000/month=202501/...）
+    PARTITIONING = ds.partitioning(
+        pa.schema([("area_code", pa.int32()), ("month", pa.int32())]), flavor="hive"
+    )
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("分析エクスポートには pyarrow が必要です（pip install pyarrow）")
+
+
+class ForecastExporter:
+    """forecasts テーブルを Parquet に追記し、集計をベクトル演算で行う"""
+    def __init__(self, db, export_dir=EXPORT_DIR):
+        _require_pyarrow()
+        if not db.integer_encoded:
+            raise RuntimeError("エクスポートにはスキーマ v2 以降が必要です")
+        self.db = db
+        self.export_dir = export_dir
+        os.makedirs(self.export_dir, exist_ok=True)
+        self._days = {}
+        # 並べ替え済みの履歴（集計ごとに読み直さない。書き出すと作り直す）
+        self._history = {}
+
+    # --- 書き出し ---
+
+    def _watermark_path(self):
+        return os.path.join(self.export_dir, WATERMARK_FILE)
+
+    def load_watermark(self):
+        """地域ごとの、書き出し済みの最新の発表日時（UNIX秒）"""
+        try:
+            with open(self._watermark_path(), encoding="utf-8") as f:
+                return {int(code): value for code, value in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_json(self, path, data):
+        # 書きかけのファイルが残らないよう、一時ファイルに書いてから置き換える
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _save_watermark(self, watermark):
+        self._write_json(self._watermark_path(), {str(code): value for code, value in watermark.items()})
+
+    def _discard_incomplete(self, watermark):
+        """前の回が途中で止まっていたら、その回が書いたファイルを消す（書き直したときに行が重ならない）"""
+        path = os.path.join(self.export_dir, PENDING_FILE)
+        try:
+            with open(path, encoding="utf-8") as f:
+                pending = json.load(f)
+        except (OSError, ValueError):
+            return
+        # ウォーターマークが進んでいれば、その回は最後まで書けている
+        if pending["watermark"] == {str(code): value for code, value in watermark.items()}:
+            prefix = f"part-{pending['run_id']}-"
+            for root, _, names in os.walk(self.export_dir):
+                for name in names:
+                    if name.startswith(prefix):
+                        os.remove(os.path.join(root, name))
+        os.remove(path)
+
+    def _to_day(self, value):
+        # 20250118 -> 1970-01-01 からの日数（同じ日付が何度も出るので覚えておく）
+        day = self._days.get(value)
+        if day is None:
+            y, m, d = map(int, decode_date(value).split("-"))
+            day = self._days[value] = (date(y, m, d) - _EPOCH).days
+        return day
+
+    def _new_rows(self, watermark):
+        # 地域ごとに、その地域のウォーターマークより新しい発表だけを読む
+        # （発表は地域単位で1トランザクションで保存されるので、途中の状態は見えない）
+        # （省スペース形式のDBでも、forecasts と同じ形の行で返ってくる）
+        for code in self.db.forecast_area_codes():
+            yield from self.db.forecast_rows(code, watermark.get(code, -1))
+
+    def export_incremental(self):
+        """前回の続き（ウォーターマークより新しい発表）だけを書き出す。書いた行数を返す"""
+        watermark = self.load_watermark()
+        self._discard_incomplete(watermark)
+        rows_iter = self._new_rows(watermark)
+
+        run_id = int(time.time() * 1000)
+        pending_path = os.path.join(self.export_dir, PENDING_FILE)
+        self._write_json(pending_path, {"run_id": run_id,
+                                        "watermark": {str(code): value for code, value in watermark.items()}})
+        total = 0
+        chunk_no = 0
+        while True:
+            rows = list(islice(rows_iter, CHUNK_ROWS))
+            if not rows:
+                break
+            areas, dates, reports, texts = zip(*rows)
+            table = pa.table({
+                "area_code": pa.array(areas, pa.int32()),
+                "month": pa.array([d // 100 for d in dates], pa.int32()),
+                "forecast_date": pa.array([self._to_day(d) for d in dates], pa.int32()).cast(pa.date32()),
+                "report_datetime": pa.array(reports, pa.int64()),
+                "weather_text": pa.array(texts, pa.string()),
+            }, schema=SCHEMA)
+            ds.write_dataset(
+                table, self.export_dir, format="parquet", partitioning=PARTITIONING,
+                basename_template=f"part-{run_id}-{chunk_no}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            for code, report in zip(areas, reports):
+                if report > watermark.get(code, -1):
+                    watermark[code] = report
+            total += len(rows)
+            chunk_no += 1
+
+        if total:
+            self._save_watermark(watermark)
+            self._history.clear()
+        os.remove(pending_path)
+        return total
+
+    # --- 集計 ---
+
+    def load(self, area_code=None, columns=None):
+        """書き出したデータを Arrow のテーブルとして読む（地域を指定するとそのフォルダだけ）"""
+        if not any(name.startswith("area_code=") for name in os.listdir(self.export_dir)):
+            return pa.table({name: pa.array([], SCHEMA.field(name).type) for name in SCHEMA.names})
+        dataset = ds.dataset(self.export_dir, format="parquet", partitioning=PARTITIONING,
+                             exclude_invalid_files=True)
+        filter_ = None if area_code is None else (ds.field("area_code") == int(area_code))
+        return dataset.to_table(columns=columns, filter=filter_)
+
+    def _sorted_history(self, area_code=None):
+        # (地域, 予報日, 発表日時) の順に並べ、同じ地域・予報日の行を隣り合わせにする
+        if area_code not in self._history:
+            table = self.load(area_code, ["area_code", "forecast_date", "report_datetime", "weather_text"])
+            self._history[area_code] = table.sort_by([
+                ("area_code", "ascending"), ("forecast_date", "ascending"),
+                ("report_datetime", "ascending"),
+            ])
+        return self._history[area_code]
+
+    def change_frequency(self, area_code=None):
+        """office ごとに、同じ予報日の天気が発表のたびに変わった割合"""
+        t = self._sorted_history(area_code)
+        if t.num_rows < 2:
+            return []
+        area = t["area_code"].combine_chunks()
+        day = t["forecast_date"].combine_chunks()
+        text = t["weather_text"].combine_chunks()
+
+        # 隣の行と同じ地域・予報日か、天気が変わったか（1つずらした配列どうしの比較）
+        same_group = pc.and_(pc.equal(area[1:], area[:-1]), pc.equal(day[1:], day[:-1]))
+        changed = pc.and_(same_group, pc.not_equal(text[1:], text[:-1]))
+        pairs = pa.table({"area_code": area[1:], "pair": pc.cast(same_group, pa.int64()),
+                          "changed": pc.cast(changed, pa.int64())})
+        result = pairs.group_by("area_code").aggregate([("pair", "sum"), ("changed", "sum")])
+
+        rows = []
+        for code, n_pairs, n_changed in zip(result["area_code"].to_pylist(),
+                                            result["pair_sum"].to_pylist(),
+                                            result["changed_sum"].to_pylist()):
+            rate = n_changed / n_pairs if n_pairs else 0.0
+            rows.append((f"{code:06d}", n_changed, n_pairs, rate))
+        return sorted(rows)
+
+    def accuracy_by_lead(self, area_code=None):
+        """N日前の予報の天気が、最終発表の天気と一致していた割合（N ごと）"""
+        t = self._sorted_history(area_code)
+        if t.num_rows == 0:
+            return []
+        area = t["area_code"].combine_chunks()
+        day = t["forecast_date"].combine_chunks()
+        text = t["weather_text"].combine_chunks()
+        report = t["report_datetime"].combine_chunks()
+
+        # 地域・予報日のまとまりに番号を振り、各まとまりの最後（最終発表）の天気を全行に配る
+        starts = pc.or_(pc.not_equal(area[1:], area[:-1]), pc.not_equal(day[1:], day[:-1]))
+        starts = pa.concat_arrays([pa.array([True]), starts])
+        group_id = pc.subtract(pc.cumulative_sum(pc.cast(starts, pa.int64())), 1)
+        last_index = pc.subtract(pc.cast(pc.indices_nonzero(starts)[1:], pa.int64()), 1)
+        last_index = pa.concat_arrays([last_index, pa.array([t.num_rows - 1], pa.int64())])
+        final_text = pc.take(pc.take(text, last_index), group_id)
+
+        # 何日前の発表か = 予報日 - 発表日（日本時間）
+        report_day = pc.divide(pc.add(report, JST_OFFSET), 86400)
+        lead = pc.subtract(pc.cast(pc.cast(day, pa.int32()), pa.int64()), report_day)
+        hit = pc.cast(pc.equal(text, final_text), pa.int64())
+
+        result = pa.table({"lead": lead, "hit": hit}).group_by("lead").aggregate(
+            [("hit", "sum"), ("hit", "count")])
+        rows = [
+            (n, hits / count, count)
+            for n, hits, count in zip(result["lead"].to_pylist(), result["hit_sum"].to_pylist(),
+                                      result["hit_count"].to_pylist())
+            if n >= 0
+        ]
+        return sorted(rows)
+
+
+def main():
+    from 天気DB import WeatherDB
+
+    exporter = ForecastExporter(WeatherDB())
+    started = time.perf_counter()
+    written = exporter.export_incremental()
+    print(f"{written:,} 行を書き出しました（{time.perf_counter() - started:.2f}秒）")
+
+    started = time.perf_counter()
+    changes = exporter.change_frequency()
+    print(f"\n予報の変更頻度（{(time.perf_counter() - started) * 1000:.1f} ms）")
+    for code, n_changed, n_pairs, rate in changes:
+        print(f"  {code}: {n_changed}/{n_pairs} 回 ({rate:.1%})")
+
+    started = time.perf_counter()
+    accuracy = exporter.accuracy_by_lead()
+    print(f"\nN日前の予報の一致率（{(time.perf_counter() - started) * 1000:.1f} ms）")
+    for lead, rate, count in accuracy:
+        print(f"  {lead}日前: {rate:.1%} ({count:,} 件)")
+
+
+if __name__ == "__main__":
+    main()
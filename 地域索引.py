@@ -0,0 +1,170 @@
+"""気象庁 area.json の地域階層（centers → offices → class10s → class15s → class20s）の索引
+
+  index = AreaIndex.from_area_json(res.json())
+  index.search("ちよだ")      # [("1310100", "千代田区（東京都）"), ...]
+  index.office_of("1310100")  # "130000"（予報はこの office のコードで取得する）
+
+検索は名前・かな・英語名・コードの前方一致。全角/半角・カタカナ/ひらがな・大文字/小文字は
+区別しない。文字ごとの木（トライ）の各ノードに、そこで一致する結果の並びを作っておくので、
+1文字入力するたびの検索は入力の長さぶんたどるだけで済む。
+"""
+import unicodedata
+
+# 上の階層から順に（この順番が検索結果の並び順にもなる）
+LEVELS = ("centers", "offices", "class10s", "class15s", "class20s")
+OFFICE_LEVEL = LEVELS.index("offices")
+
+# カタカナ → ひらがな
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord("ァ"), ord("ヶ") + 1)}
+
+
+def normalize(text):
+    """検索用に表記をそろえる（NFKC・ひらがな・小文字・空白なし）"""
+    text = unicodedata.normalize("NFKC", text or "").translate(_KATAKANA_TO_HIRAGANA)
+    return "".join(text.lower().split())
+
+
+class AreaEntry:
+    __slots__ = ("code", "name", "level", "parent", "kana", "en_name", "up", "children", "label")
+
+    def __init__(self, code, name, level, parent=None, kana=None, en_name=None):
+        self.code = code
+        self.name = name
+        self.level = level
+        self.parent = parent
+        self.kana = kana
+        self.en_name = en_name
+        self.up = None  # 1つ上の階層の AreaEntry
+        self.children = []
+        self.label = name
+
+    def search_keys(self):
+        keys = [self.name, self.kana, self.en_name, self.code]
+        # 英語名は単語の途中からでも引けるようにする（"Chiyoda City" → "city" でも一致）
+        if self.en_name:
+            keys.extend(self.en_name.split()[1:])
+        return [k for k in map(normalize, keys) if k]
+
+
+class _Node:
+    __slots__ = ("children", "items")
+
+    def __init__(self):
+        self.children = {}
+        self.items = []
+
+
+class AreaIndex:
+    """地域コード → 地域、親子関係、検索用のトライ
+
+    大阪府の office と class10s（どちらも 270000）のように、階層が違っても同じコードのことがある。
+    コードで引くときは上の階層のものを返し、検索結果にも上の階層のものだけを出す。
+    """
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda e: (e.level, e.code))
+        by_level = {(e.level, e.code): e for e in entries}
+        self.entries = {}
+        for entry in entries:
+            self.entries.setdefault(entry.code, entry)
+            # 親は1つ上の階層から探す
+            entry.up = by_level.get((entry.level - 1, entry.parent))
+            if entry.up is not None:
+                entry.up.children.append(entry)
+        for entry in entries:
+            office = self._office_entry(entry)
+            if entry.level > OFFICE_LEVEL and office is not None and office.code != entry.code:
+                entry.label = f"{entry.name}（{office.name}）"
+        self.offices = [(e.code, e.label) for e in entries if e.level == OFFICE_LEVEL]
+        self.root = self._build_trie(entries)
+        self._rows = [(e.code, e.name, e.level, e.parent, e.kana, e.en_name) for e in entries]
+
+    @classmethod
+    def from_area_json(cls, data):
+        """area.json の辞書から作る"""
+        entries = []
+        for level, name in enumerate(LEVELS):
+            for code, info in (data.get(name) or {}).items():
+                entries.append(AreaEntry(code, info.get("name", code), level, info.get("parent"),
+                                         info.get("kana"), info.get("enName")))
+        return cls(entries)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows() で書き出した行（DB の area_hierarchy）から作る"""
+        return cls(AreaEntry(*row) for row in rows)
+
+    def rows(self):
+        """(コード, 名前, 階層, 親コード, かな, 英語名) の行"""
+        return list(self._rows)
+
+    def _build_trie(self, entries):
+        root = _Node()
+        # 上の階層・コード順に入れていけば、各ノードの結果も同じ順に並ぶ
+        for entry in entries:
+            if self.entries[entry.code] is not entry:
+                continue  # 上の階層に同じコードがある
+            item = (entry.code, entry.label)
+            for key in entry.search_keys():
+                node = root
+                for char in key:
+                    node = node.children.get(char) or node.children.setdefault(char, _Node())
+                    # 名前とかなが同じ文字で始まるときなどに、同じ地域を2回入れない
+                    if not node.items or node.items[-1] is not item:
+                        node.items.append(item)
+        return root
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, code):
+        return code in self.entries
+
+    def search(self, query):
+        """前方一致する地域の (コード, 表示名) のリスト。空なら office の一覧"""
+        key = normalize(query)
+        if not key:
+            return self.offices
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.items
+
+    def parent_of(self, code):
+        entry = self.entries.get(code)
+        return entry.up.code if entry and entry.up else None
+
+    def children_of(self, code):
+        """子の地域の (コード, 表示名) のリスト（同じコードの下の階層は飛ばしてその子を返す）"""
+        entry = self.entries.get(code)
+        children = list(entry.children) if entry else []
+        while any(child.code == code for child in children):
+            children = [c for child in children for c in (child.children if child.code == code else [child])]
+        return [(child.code, child.label) for child in children]
+
+    def path(self, code):
+        """上の階層から code までのコードのリスト"""
+        path = []
+        entry = self.entries.get(code)
+        while entry is not None:
+            if not path or path[-1] != entry.code:
+                path.append(entry.code)
+            entry = entry.up
+        return path[::-1]
+
+    @staticmethod
+    def _office_entry(entry):
+        while entry is not None and entry.level > OFFICE_LEVEL:
+            entry = entry.up
+        return entry if entry is not None and entry.level == OFFICE_LEVEL else None
+
+    def office_of(self, code):
+        """code を含む office のコード（centers など office より上なら None）"""
+        office = self._office_entry(self.entries.get(code))
+        return office.code if office else None
+
+    def name_of(self, code):
+        entry = self.entries.get(code)
+        return entry.name if entry else None
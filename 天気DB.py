@@ -0,0 +1,624 @@
+import glob
+import os
+import re
+import sqlite3
+from itertools import groupby
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+
+import 計測
+from 地域索引 import AreaIndex
+
+DB_NAME = "weather_history_app.db"
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+JST = timezone(timedelta(hours=9))
+
+INSERT_FORECAST_SQL = """
+    INSERT OR IGNORE INTO forecasts (area_code, report_datetime, forecast_date, weather_text)
+    VALUES (?, ?, ?, ?)
+"""
+
+INSERT_ELEMENT_SQL = """
+    INSERT OR IGNORE INTO forecast_elements
+    (area_code, report_datetime, kind, series, sub_area_code, time_define, element, value_num, value_text)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# --- 省スペース形式（compact） ---
+# 天気の文章は weather_texts に1回だけ入れて id で参照する。予報日ごとの天気は、同じ文章が
+# 続いた発表の範囲（valid_from〜valid_to。その地域の連続した発表）を1行にまとめる。
+# reports にはその地域で受け取った発表日時をすべて入れる。
+# 検索では予報日の区間（数行）と、その範囲の reports とを1回ずつ範囲で読んで組み合わせる。
+
+COMPACT_REVISIONS_SQL = """
+    SELECT valid_from, valid_to, text_id FROM forecast_revisions
+    WHERE area_code = ? AND forecast_date = ?
+"""
+
+INSERT_REVISION_SQL = """
+    INSERT INTO forecast_revisions (area_code, forecast_date, valid_from, valid_to, text_id)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# --- 整数エンコード ---
+# forecasts テーブルの地域コード・予報日・発表日時は整数で保存する
+# （文字列より小さく、比較も速い）。読み出すときに元の文字列へ戻す。
+
+def encode_area(area_code):
+    return int(area_code)
+
+def decode_area(value):
+    return f"{value:06d}"
+
+def encode_date(date_text):
+    # "2025-01-18" -> 20250118
+    return int(date_text[:10].replace("-", ""))
+
+def decode_date(value):
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+def encode_report(report_time):
+    # "2025-01-18T11:00:00+09:00" -> UNIX時刻（秒）
+    return int(datetime.fromisoformat(report_time).timestamp())
+
+@lru_cache(maxsize=4096)
+def decode_report(value):
+    return datetime.fromtimestamp(value, JST).isoformat()
+
+def encode_record(record):
+    area_code, report_time, forecast_date, weather = record
+    return encode_area(area_code), encode_report(report_time), encode_date(forecast_date), weather
+
+
+# --- マイグレーション ---
+# 1つの関数が1バージョン分のスキーマ変更。適用済みのバージョンは PRAGMA user_version に記録する。
+
+def _migrate_v1(conn):
+    # 日付検索（地域+予報日 → 発表日時の新しい順）と最新発表の検索に合う索引
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forecasts_date
+        ON forecasts (area_code, forecast_date, report_datetime DESC, weather_text)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forecasts_latest
+        ON forecasts (area_code, report_datetime)
+    """)
+
+def _create_forecasts_v2(conn, schema="main"):
+    # 主キー順に行が並ぶ WITHOUT ROWID テーブル。日付検索は主キーの範囲読みだけで済む
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.forecasts (
+            area_code INTEGER NOT NULL,
+            forecast_date INTEGER NOT NULL,
+            report_datetime INTEGER NOT NULL,
+            weather_text TEXT,
+            PRIMARY KEY (area_code, forecast_date, report_datetime)
+        ) WITHOUT ROWID
+    """)
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS {schema}.idx_forecasts_latest
+        ON forecasts (area_code, report_datetime)
+    """)
+
+def _migrate_v2(conn):
+    # 地域コード・日付・発表日時を整数に変換したテーブルへ作り直す
+    leftover = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'forecasts_v1'").fetchone()
+    if leftover:
+        # 以前の途中で止まった変換の残り。forecasts_v1 が元のデータなので、開き直したときに
+        # create_tables が作った旧形式の forecasts（や作りかけの新しい forecasts）は捨てる
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(forecasts)")]
+        if "id" in columns:
+            conn.execute("""
+                INSERT OR IGNORE INTO forecasts_v1 (area_code, report_datetime, forecast_date, weather_text)
+                SELECT area_code, report_datetime, forecast_date, weather_text FROM forecasts
+            """)
+        conn.execute("DROP TABLE IF EXISTS forecasts")
+    else:
+        conn.execute("ALTER TABLE forecasts RENAME TO forecasts_v1")
+    conn.execute("DROP INDEX IF EXISTS idx_forecasts_date")
+    conn.execute("DROP INDEX IF EXISTS idx_forecasts_latest")
+    _create_forecasts_v2(conn)
+    conn.execute("""
+        INSERT OR IGNORE INTO forecasts (area_code, forecast_date, report_datetime, weather_text)
+        SELECT CAST(area_code AS INTEGER),
+               CAST(REPLACE(SUBSTR(forecast_date, 1, 10), '-', '') AS INTEGER),
+               CAST(strftime('%s', report_datetime) AS INTEGER),
+               weather_text
+        FROM forecasts_v1
+    """)
+    conn.execute("DROP TABLE forecasts_v1")
+
+def _migrate_v3(conn):
+    # 予報JSONの全 timeSeries・細分区域・要素（天気/風/波/降水確率/気温/信頼度…）
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_elements (
+            area_code INTEGER NOT NULL,
+            report_datetime INTEGER NOT NULL,
+            kind INTEGER NOT NULL,
+            series INTEGER NOT NULL,
+            sub_area_code TEXT NOT NULL,
+            time_define INTEGER NOT NULL,
+            element TEXT NOT NULL,
+            value_num REAL,
+            value_text TEXT,
+            PRIMARY KEY (area_code, report_datetime, kind, series, sub_area_code, element, time_define)
+        ) WITHOUT ROWID
+    """)
+    # 細分区域（class10s や気温の観測地点）の名前
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sub_areas (
+            code TEXT PRIMARY KEY,
+            name TEXT
+        )
+    """)
+
+def _migrate_v4(conn):
+    # area.json の全階層（centers〜class20s）。areas には従来どおり offices だけを入れる。
+    # 大阪府の office と class10s のように、階層が違えば同じコードもある
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS area_hierarchy (
+            code TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            parent TEXT,
+            kana TEXT,
+            en_name TEXT,
+            PRIMARY KEY (code, level)
+        ) WITHOUT ROWID
+    """)
+
+def _migrate_v5(conn):
+    # 省スペース形式のテーブル（WeatherDB(compact=True) か compact_forecasts() で使い始める）
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS weather_texts (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reports (
+            area_code INTEGER NOT NULL,
+            report_datetime INTEGER NOT NULL,
+            PRIMARY KEY (area_code, report_datetime)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS forecast_revisions (
+            area_code INTEGER NOT NULL,
+            forecast_date INTEGER NOT NULL,
+            valid_from INTEGER NOT NULL,
+            valid_to INTEGER NOT NULL,
+            text_id INTEGER,
+            PRIMARY KEY (area_code, forecast_date, valid_from)
+        ) WITHOUT ROWID
+    """)
+
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5]
+
+
+class WeatherDB:
+    def __init__(self, db_name=DB_NAME, journal_mode="WAL", synchronous="NORMAL", migrate=True,
+                 compact=None):
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+        self.set_pragmas(journal_mode, synchronous)
+        self.create_tables()
+        if migrate:
+            self.migrate()
+        # 省スペース形式で読み書きするか（None なら、すでに省スペース形式で保存したDBかどうかで決める）
+        if compact is None:
+            compact = self.schema_version >= 5 and self.conn.execute(
+                "SELECT EXISTS (SELECT 1 FROM reports)").fetchone()[0] == 1
+        elif compact and self.schema_version < 5:
+            raise RuntimeError("省スペース形式にはスキーマ v5 以降が必要です")
+        self.compact = compact
+        # 天気の文章 <-> weather_texts の id（文章の種類は少ないので全部覚えておける）
+        self._text_ids = {}
+        self._texts = {}
+        # 年ごとのアーカイブDB（weather_history_app_2024.db など）
+        self.archives = {}
+        self.attach_archives()
+
+    def set_pragmas(self, journal_mode, synchronous):
+        """ジャーナルモードと同期レベルを設定（WAL + NORMAL なら書き込み中も読める）"""
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in JOURNAL_MODES or synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"不正なPRAGMA設定: {journal_mode}, {synchronous}")
+        self.conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        self.conn.execute(f"PRAGMA synchronous = {synchronous}")
+
+    def create_tables(self):
+        cursor = self.conn.cursor()
+        # エリア情報（オプション: エリア情報をDBに格納）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS areas (
+                code TEXT PRIMARY KEY,
+                name TEXT
+            )
+        """)
+        # 天気予報（最初のバージョン。以降の変更は MIGRATIONS で行う）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS forecasts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                area_code TEXT,
+                report_datetime TEXT,
+                forecast_date TEXT,
+                weather_text TEXT,
+                UNIQUE(area_code, report_datetime, forecast_date)
+            )
+        """)
+        self.conn.commit()
+
+    @property
+    def schema_version(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self, target=None):
+        """未適用のマイグレーションを順番に適用（target を指定するとそのバージョンまで）"""
+        version = self.schema_version
+        target = len(MIGRATIONS) if target is None else target
+        for number, migration in enumerate(MIGRATIONS[version:target], start=version + 1):
+            # sqlite3 は ALTER / CREATE / DROP を自動ではトランザクションに入れないので、
+            # BEGIN から明示して、スキーマ変更と user_version を一緒に確定する（失敗したら何も変わらない）
+            if self.conn.in_transaction:
+                self.conn.commit()
+            self.conn.execute("BEGIN")
+            try:
+                migration(self.conn)
+                self.conn.execute(f"PRAGMA user_version = {number}")
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+
+    @property
+    def integer_encoded(self):
+        return self.schema_version >= 2
+
+    def attach_archives(self):
+        """同じフォルダにある年別アーカイブDBを読み取り用に接続"""
+        base, ext = os.path.splitext(self.db_name)
+        for path in sorted(glob.glob(f"{base}_[0-9][0-9][0-9][0-9]{ext}")):
+            year = int(re.search(r"_(\d{4})" + re.escape(ext) + "$", path).group(1))
+            self._attach(year, path)
+
+    def _attach(self, year, path):
+        schema = f"archive_{year}"
+        if year not in self.archives:
+            self.conn.execute("ATTACH DATABASE ? AS " + schema, (path,))
+            self.archives[year] = schema
+        return schema
+
+    def archive_year(self, year):
+        """指定した年の予報を年別アーカイブDBへ移す（年ごとのパーティション）"""
+        if not self.integer_encoded:
+            raise RuntimeError("アーカイブにはスキーマ v2 以降が必要です")
+        if self.compact:
+            raise RuntimeError("省スペース形式のDBはアーカイブできません")
+        base, ext = os.path.splitext(self.db_name)
+        schema = self._attach(year, f"{base}_{year}{ext}")
+        low, high = year * 10000, (year + 1) * 10000
+        with self.conn:
+            _create_forecasts_v2(self.conn, schema)
+            cursor = self.conn.execute(f"""
+                INSERT OR IGNORE INTO {schema}.forecasts
+                SELECT area_code, forecast_date, report_datetime, weather_text
+                FROM main.forecasts WHERE forecast_date >= ? AND forecast_date < ?
+            """, (low, high))
+            self.conn.execute(
+                "DELETE FROM main.forecasts WHERE forecast_date >= ? AND forecast_date < ?",
+                (low, high),
+            )
+        return cursor.rowcount
+
+    def save_areas(self, areas_dict):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO areas VALUES (?, ?)",
+                ((code, info["name"]) for code, info in areas_dict.items()),
+            )
+
+    def get_areas(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT code, name FROM areas ORDER BY code")
+        return cursor.fetchall()
+
+    def save_area_index(self, index):
+        """地域階層の索引（地域索引.AreaIndex）を保存し、offices は areas にも入れる"""
+        if self.schema_version < 4:
+            raise RuntimeError("地域階層の保存にはスキーマ v4 以降が必要です")
+        with self.conn:
+            self.conn.execute("DELETE FROM area_hierarchy")
+            self.conn.executemany(
+                "INSERT INTO area_hierarchy (code, name, level, parent, kana, en_name) VALUES (?, ?, ?, ?, ?, ?)",
+                index.rows(),
+            )
+            self.conn.executemany("INSERT OR REPLACE INTO areas VALUES (?, ?)",
+                                  ((code, index.name_of(code)) for code, _ in index.offices))
+
+    @計測.timed("db_seconds", op="get_area_index")
+    def get_area_index(self):
+        """保存済みの地域階層の索引（まだ保存していなければ None）"""
+        if self.schema_version < 4:
+            return None
+        rows = self.conn.execute(
+            "SELECT code, name, level, parent, kana, en_name FROM area_hierarchy"
+        ).fetchall()
+        return AreaIndex.from_rows(rows) if rows else None
+
+    def save_forecast(self, area_code, report_time, forecast_list):
+        self.save_forecasts_bulk(
+            (area_code, report_time, date, weather) for date, weather in forecast_list
+        )
+
+    @計測.timed("db_seconds", op="save_forecasts_bulk")
+    def save_forecasts_bulk(self, records):
+        """(地域コード, 発表日時, 予報日, 天気) の行をまとめて1トランザクションで保存"""
+        if self.integer_encoded:
+            records = map(encode_record, records)
+        with self.conn:
+            if self.compact:
+                return self._save_compact(records)
+            # executemany は同じ文を1回だけ準備して使い回す
+            cursor = self.conn.executemany(INSERT_FORECAST_SQL, records)
+        return cursor.rowcount
+
+    @計測.timed("db_seconds", op="save_parsed_forecasts")
+    def save_parsed_forecasts(self, parsed_list):
+        """予報取込.parse_forecast の結果を、従来の forecasts と一緒に1トランザクションで保存"""
+        # 全要素のテーブル（forecast_elements / sub_areas）はスキーマ v3 以降にしかない
+        with_elements = self.schema_version >= 3
+        with self.conn:
+            for parsed in parsed_list:
+                records = ((parsed.area_code, parsed.report_time, date, weather)
+                           for date, weather in parsed.forecast_list)
+                if self.integer_encoded:
+                    records = map(encode_record, records)
+                if self.compact:
+                    self._save_compact(records)
+                else:
+                    self.conn.executemany(INSERT_FORECAST_SQL, records)
+                if with_elements:
+                    self.conn.executemany("INSERT OR REPLACE INTO sub_areas VALUES (?, ?)",
+                                          parsed.sub_areas.items())
+                    self.conn.executemany(INSERT_ELEMENT_SQL, parsed.rows())
+
+    # --- 省スペース形式 ---
+
+    def _text_id(self, text):
+        if text is None:
+            return None
+        text_id = self._text_ids.get(text)
+        if text_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO weather_texts (text) VALUES (?)", (text,))
+            text_id = self.conn.execute("SELECT id FROM weather_texts WHERE text = ?", (text,)).fetchone()[0]
+            self._text_ids[text] = text_id
+            self._texts[text_id] = text
+        return text_id
+
+    def _text(self, text_id):
+        if text_id is None:
+            return None
+        text = self._texts.get(text_id)
+        if text is None:
+            # 別の接続が足した文章もあるので、知らない id があれば読み直す
+            self._texts.update(self.conn.execute("SELECT id, text FROM weather_texts"))
+            self._text_ids.update((text, text_id) for text_id, text in self._texts.items())
+            text = self._texts[text_id]
+        return text
+
+    def _get_compact_forecast(self, area_code, forecast_date):
+        """予報日の区間と、その範囲の発表日時を1回ずつ読み、発表日時の新しい順に組み合わせる"""
+        revisions = self.conn.execute(COMPACT_REVISIONS_SQL, (area_code, forecast_date)).fetchall()
+        if not revisions:
+            return []
+        revisions.sort(reverse=True)
+        reports = self.conn.execute("""
+            SELECT report_datetime FROM reports
+            WHERE area_code = ? AND report_datetime BETWEEN ? AND ?
+            ORDER BY report_datetime DESC
+        """, (area_code, revisions[-1][0], max(valid_to for _, valid_to, _ in revisions)))
+        rows = []
+        i = 0
+        for (report,) in reports:
+            # 区間は重ならないので、新しい区間から順に見ていけばよい
+            while i < len(revisions) and revisions[i][0] > report:
+                i += 1
+            if i == len(revisions):
+                break
+            valid_from, valid_to, text_id = revisions[i]
+            if report <= valid_to:
+                rows.append((report, self._text(text_id)))
+        return rows
+
+    def _save_compact(self, records):
+        """整数エンコード済みの (地域, 発表日時, 予報日, 天気) を省スペース形式で保存（トランザクションの中で呼ぶ）
+
+        同じ予報日・同じ行が2回来たら最初のものを残す（forecasts の INSERT OR IGNORE と同じ）。
+        保存した行数を返す。
+        """
+        saved = 0
+        try:
+            for (area, report), rows in groupby(records, key=lambda r: (r[0], r[1])):
+                texts = {}
+                for _, _, forecast_date, weather in rows:
+                    texts.setdefault(forecast_date, weather)
+                saved += self._save_report(area, report, texts)
+        except BaseException:
+            # ロールバックされると、覚えた id が無効になることがある
+            self._text_ids.clear()
+            self._texts.clear()
+            raise
+        return saved
+
+    def _save_report(self, area, report, texts):
+        conn = self.conn
+        pending = {forecast_date: self._text_id(text) for forecast_date, text in texts.items()}
+        prev = conn.execute("SELECT MAX(report_datetime) FROM reports WHERE area_code = ? AND report_datetime < ?",
+                            (area, report)).fetchone()[0]
+        following = conn.execute("SELECT MIN(report_datetime) FROM reports WHERE area_code = ? AND report_datetime >= ?",
+                                 (area, report)).fetchone()[0]
+        saved = 0
+        if following == report:
+            # 保存済みの発表: まだない予報日だけを足す
+            following = conn.execute(
+                "SELECT MIN(report_datetime) FROM reports WHERE area_code = ? AND report_datetime > ?",
+                (area, report)).fetchone()[0]
+            for forecast_date in list(pending):
+                if conn.execute("""
+                    SELECT 1 FROM forecast_revisions
+                    WHERE area_code = ? AND forecast_date = ? AND valid_from <= ? AND valid_to >= ?
+                """, (area, forecast_date, report, report)).fetchone():
+                    del pending[forecast_date]
+        else:
+            conn.execute("INSERT INTO reports (area_code, report_datetime) VALUES (?, ?)", (area, report))
+            if following is not None:
+                # 古い発表が後から届いた: 前後の発表にまたがる区間は、この発表にも同じ天気があれば
+                # そのまま、なければ前後に分ける
+                spanning = conn.execute("""
+                    SELECT forecast_date, valid_from, valid_to, text_id FROM forecast_revisions
+                    WHERE area_code = ? AND valid_from < ? AND valid_to > ?
+                """, (area, report, report)).fetchall()
+                for forecast_date, valid_from, valid_to, text_id in spanning:
+                    if forecast_date in pending and pending[forecast_date] == text_id:
+                        del pending[forecast_date]
+                        saved += 1
+                        continue
+                    conn.execute("""
+                        UPDATE forecast_revisions SET valid_to = ?
+                        WHERE area_code = ? AND forecast_date = ? AND valid_from = ?
+                    """, (prev, area, forecast_date, valid_from))
+                    conn.execute(INSERT_REVISION_SQL, (area, forecast_date, following, valid_to, text_id))
+
+        for forecast_date, text_id in pending.items():
+            saved += 1
+            # 直前の発表と同じ天気なら区間を延ばすだけ（新しい行は作らない）
+            if prev is not None and conn.execute("""
+                UPDATE forecast_revisions SET valid_to = ?
+                WHERE area_code = ? AND forecast_date = ? AND valid_to = ? AND text_id IS ?
+            """, (report, area, forecast_date, prev, text_id)).rowcount:
+                continue
+            if following is not None and conn.execute("""
+                UPDATE forecast_revisions SET valid_from = ?
+                WHERE area_code = ? AND forecast_date = ? AND valid_from = ? AND text_id IS ?
+            """, (report, area, forecast_date, following, text_id)).rowcount:
+                continue
+            conn.execute(INSERT_REVISION_SQL, (area, forecast_date, report, report, text_id))
+        return saved
+
+    def compact_forecasts(self):
+        """forecasts の行を省スペース形式に移し、以後は省スペース形式で読み書きする（移した行数を返す）
+
+        ファイルを小さくするには、このあと VACUUM する。
+        """
+        if self.schema_version < 5:
+            raise RuntimeError("省スペース形式にはスキーマ v5 以降が必要です")
+        with self.conn:
+            rows = self.conn.execute("""
+                SELECT area_code, report_datetime, forecast_date, weather_text
+                FROM main.forecasts ORDER BY area_code, report_datetime
+            """)
+            moved = self._save_compact(rows)
+            self.conn.execute("DELETE FROM main.forecasts")
+        self.compact = True
+        return moved
+
+    def forecast_area_codes(self):
+        """予報を保存している地域コード（整数）"""
+        table = "reports" if self.compact else "forecasts"
+        return [row[0] for row in self.conn.execute(f"SELECT DISTINCT area_code FROM {table}")]
+
+    def forecast_rows(self, area_code, after_report=-1):
+        """整数エンコードのままの (地域, 予報日, 発表日時, 天気)。after_report より新しい発表だけ"""
+        if not self.compact:
+            return self.conn.execute("""
+                SELECT area_code, forecast_date, report_datetime, weather_text
+                FROM forecasts WHERE area_code = ? AND report_datetime > ?
+            """, (area_code, after_report))
+        # 区間ごとに reports を範囲で読む（CROSS JOIN で区間を先に読む順番に固定する）
+        cursor = self.conn.execute("""
+            SELECT v.area_code, v.forecast_date, r.report_datetime, v.text_id
+            FROM forecast_revisions v
+            CROSS JOIN reports r ON r.area_code = v.area_code
+                                AND r.report_datetime BETWEEN MAX(v.valid_from, ? + 1) AND v.valid_to
+            WHERE v.area_code = ? AND v.valid_to > ?
+        """, (after_report, area_code, after_report))
+        return ((area, forecast_date, report, self._text(text_id))
+                for area, forecast_date, report, text_id in cursor)
+
+    def get_forecast_elements(self, area_code, report_time=None):
+        """保存済みの全要素（report_time を省略すると最新の発表分）"""
+        if report_time is None:
+            report_time = self.get_latest_report_time(area_code)
+            if report_time is None:
+                return []
+        cursor = self.conn.execute("""
+            SELECT e.kind, e.series, e.sub_area_code, s.name, e.time_define,
+                   e.element, e.value_num, e.value_text
+            FROM forecast_elements e LEFT JOIN sub_areas s ON s.code = e.sub_area_code
+            WHERE e.area_code = ? AND e.report_datetime = ?
+            ORDER BY e.kind, e.series, e.sub_area_code, e.element, e.time_define
+        """, (encode_area(area_code), encode_report(report_time)))
+        return [
+            (kind, series, sub_code, name, decode_report(time_define) if time_define else None,
+             element, value_num, value_text)
+            for kind, series, sub_code, name, time_define, element, value_num, value_text in cursor
+        ]
+
+    def _forecast_query(self, target_date):
+        # 予報日の年のアーカイブがあればそちらだけを見る
+        if self.integer_encoded:
+            schema = self.archives.get(int(target_date[:4]), "main")
+        else:
+            schema = "main"
+        if self.compact and schema == "main":
+            return COMPACT_REVISIONS_SQL
+        return f"""
+            SELECT report_datetime, weather_text FROM {schema}.forecasts
+            WHERE area_code = ? AND forecast_date = ?
+            ORDER BY report_datetime DESC
+        """
+
+    def _forecast_params(self, area_code, target_date):
+        if self.integer_encoded:
+            return encode_area(area_code), encode_date(target_date)
+        return area_code, target_date
+
+    @計測.timed("db_seconds", op="get_forecast_by_date")
+    def get_forecast_by_date(self, area_code, target_date):
+        """（オプション: 日付選択で過去の予報を閲覧）"""
+        cursor = self.conn.cursor()
+        # 指定された日付の予報をすべて取得（発表日時が新しい順）
+        query, params = self._forecast_query(target_date), self._forecast_params(area_code, target_date)
+        if query is COMPACT_REVISIONS_SQL:
+            rows = self._get_compact_forecast(*params)
+        else:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        if self.integer_encoded:
+            rows = [(decode_report(report), weather) for report, weather in rows]
+        return rows
+
+    def explain_forecast_query(self, area_code, target_date):
+        """get_forecast_by_date の実行計画（EXPLAIN QUERY PLAN の detail 列）"""
+        cursor = self.conn.execute(
+            "EXPLAIN QUERY PLAN " + self._forecast_query(target_date),
+            self._forecast_params(area_code, target_date),
+        )
+        return [row[3] for row in cursor.fetchall()]
+
+    @計測.timed("db_seconds", op="get_latest_report_time")
+    def get_latest_report_time(self, area_code):
+        """保存済みの最新の発表日時"""
+        cursor = self.conn.cursor()
+        if not self.integer_encoded:
+            cursor.execute("SELECT MAX(report_datetime) FROM forecasts WHERE area_code = ?", (area_code,))
+            return cursor.fetchone()[0]
+        table = "reports" if self.compact else "forecasts"
+        cursor.execute(f"SELECT MAX(report_datetime) FROM {table} WHERE area_code = ?",
+                       (encode_area(area_code),))
+        value = cursor.fetchone()[0]
+        return None if value is None else decode_report(value)
@@ -0,0 +1,159 @@
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import 計測
+
+JST = timezone(timedelta(hours=9))
+# 気象庁の天気予報の定時発表（5時・11時・17時）
+PUBLISH_HOURS = (5, 11, 17)
+
+logger = logging.getLogger(__name__)
+
+
+class SyncScheduler:
+    """全 offices の予報をバックグラウンドで定期的に取得してDBに蓄積する"""
+    def __init__(self, app, db_factory, publish_hours=PUBLISH_HOURS, delay_minutes=10,
+                 max_workers=4, jitter=2.0, on_cycle=None):
+        self.app = app
+        # DBへの書き込みはスケジューラのスレッドが持つ1本の接続だけで行う
+        self.db_factory = db_factory
+        self.publish_hours = sorted(publish_hours)
+        self.delay = timedelta(minutes=delay_minutes)
+        self.max_workers = max_workers
+        self.jitter = jitter
+        self.on_cycle = on_cycle
+
+        self.stop_event = threading.Event()
+        # 他のスレッドで取得した予報の書き込み依頼（書き込みはこのスケジューラのスレッドだけが行う）
+        self.write_queue = queue.Queue()
+        self.thread = None
+        self.last_report = None
+
+    def next_run_time(self, now):
+        """now より後で、最も近い発表時刻（+待ち時間）"""
+        for day in range(2):
+            base = now.date() + timedelta(days=day)
+            for hour in self.publish_hours:
+                run_at = datetime(base.year, base.month, base.day, hour, tzinfo=JST) + self.delay
+                if run_at > now:
+                    return run_at
+        return now + timedelta(days=1)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="weather-sync", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def write(self, parsed, on_saved=None):
+        """取得済みの予報の保存を依頼する（保存したら on_saved(True/False)）"""
+        self.write_queue.put((parsed, on_saved))
+
+    def _run(self):
+        db = self.db_factory()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # 起動直後に1回同期し、その後は発表時刻に合わせて同期する
+            next_run = datetime.now(JST)
+            while not self.stop_event.is_set():
+                now = datetime.now(JST)
+                if now >= next_run:
+                    try:
+                        self.run_cycle(db, executor)
+                    except Exception:
+                        # 地域一覧の読み込みなどで失敗しても、次の発表時刻にまた同期する
+                        logger.exception("同期に失敗しました")
+                        計測.inc("weather_sync_errors_total", stage="cycle")
+                    next_run = self.next_run_time(datetime.now(JST))
+                    continue
+                # 次の同期までの間は、書き込み依頼を処理する
+                wait = min((next_run - now).total_seconds(), 1.0)
+                try:
+                    parsed, on_saved = self.write_queue.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                self._write_one(db, parsed, on_saved)
+
+    def _write_one(self, db, parsed, on_saved):
+        try:
+            saved = parsed.report_time != db.get_latest_report_time(parsed.area_code)
+            if saved:
+                db.save_parsed_forecasts([parsed])
+        except Exception as e:
+            logger.warning("保存エラー(%s): %s", parsed.area_code, e)
+            計測.inc("weather_sync_errors_total", stage="save")
+            saved = False
+        if on_saved:
+            on_saved(saved)
+
+    def _fetch(self, area_code, latest_report_time):
+        # 全地域が同じ瞬間にアクセスしないよう、少しずらす
+        time.sleep(random.uniform(0, self.jitter))
+        return self.app.fetch_forecast(area_code, latest_report_time)
+
+    def run_cycle(self, db, executor):
+        """全地域を1回同期して結果を返す"""
+        started = time.monotonic()
+        codes = [code for code, _ in db.get_areas()]
+        report = {"areas": len(codes), "saved": 0, "unchanged": 0, "errors": 0, "save_error": None,
+                  "max_lag": None}
+        parsed_list = []
+
+        # 保存済みの最新の発表日時（DBを読むのはこのスレッドだけ）
+        latest = {code: db.get_latest_report_time(code) for code in codes}
+        futures = {executor.submit(self._fetch, code, latest[code]): code for code in codes}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning("同期エラー(%s): %s", code, e)
+                計測.inc("weather_sync_errors_total", stage="fetch")
+                report["errors"] += 1
+                continue
+
+            if result is None or result.report_time == latest[code]:
+                report["unchanged"] += 1
+                continue
+            parsed_list.append(result)
+            report["saved"] += 1
+
+        # 全地域分を1トランザクションでまとめて書き込む
+        if parsed_list:
+            try:
+                db.save_parsed_forecasts(parsed_list)
+            except Exception as e:
+                # 1トランザクションなので1件も保存されていない。次の同期でまた取得する
+                logger.warning("保存エラー(%d件): %s", len(parsed_list), e)
+                計測.inc("weather_sync_errors_total", stage="save")
+                report["save_error"] = str(e)
+                report["errors"] += len(parsed_list)
+                report["saved"] = 0
+            else:
+                # 同期の遅れ = 発表日時から保存できるまでの時間
+                oldest = min(datetime.fromisoformat(p.report_time) for p in parsed_list)
+                report["max_lag"] = (datetime.now(JST) - oldest).total_seconds()
+
+        report["duration"] = time.monotonic() - started
+        self.last_report = report
+        計測.observe("weather_sync_cycle_seconds", report["duration"])
+        計測.inc("weather_sync_saved_total", report["saved"])
+
+        lag_text = "-" if report["max_lag"] is None else f"{report['max_lag'] / 60:.1f}分"
+        logger.info("同期完了: %d件更新 / %d件変化なし / %d件エラー, 所要 %.2f秒, 最大遅れ %s",
+                    report["saved"], report["unchanged"], report["errors"], report["duration"], lag_text)
+        if self.on_cycle:
+            try:
+                self.on_cycle(report)
+            except Exception:
+                # 画面側の処理の失敗は同期の失敗とは分けて数える
+                logger.exception("同期結果の通知でエラーが発生しました")
+                計測.inc("weather_sync_errors_total", stage="callback")
+        return report
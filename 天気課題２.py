@@ -1,98 +1,65 @@
-import flet as ft
-import requests
-import sqlite3
+import logging
 from datetime import datetime
 
+import flet as ft
+
+from キャッシュ import get_cache
+from 天気DB import WeatherDB
+from 地域索引 import AreaIndex
+from 天気同期 import SyncScheduler
+from 予報取込 import parse_forecast, peek_report_time
+from 仮想リスト import CardGrid, LazyListView, UIMetrics
+from 非同期取得 import FetchPipeline
+import 起動計測
+import 計測
+
 # 定数
 AREA_URL = "http://www.jma.go.jp/bosai/common/const/area.json"
 FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
-DB_NAME = "weather_history_app.db"
-
-class WeatherDB:
-    def __init__(self):
-        self.conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-        self.create_tables()
-
-    def create_tables(self):
-        cursor = self.conn.cursor()
-        # エリア情報（オプション: エリア情報をDBに格納）
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS areas (
-                code TEXT PRIMARY KEY,
-                name TEXT
-            )
-        """)
-        # 天気予報
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS forecasts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                area_code TEXT,
-                report_datetime TEXT,
-                forecast_date TEXT,
-                weather_text TEXT,
-                UNIQUE(area_code, report_datetime, forecast_date)
-            )
-        """)
-        self.conn.commit()
-
-    def save_areas(self, areas_dict):
-        cursor = self.conn.cursor()
-        for code, info in areas_dict.items():
-            cursor.execute("INSERT OR REPLACE INTO areas VALUES (?, ?)", (code, info["name"]))
-        self.conn.commit()
-
-    def get_areas(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT code, name FROM areas ORDER BY code")
-        return cursor.fetchall()
-
-    def save_forecast(self, area_code, report_time, forecast_list):
-        cursor = self.conn.cursor()
-        for date, weather in forecast_list:
-            cursor.execute("""
-                INSERT OR IGNORE INTO forecasts (area_code, report_datetime, forecast_date, weather_text)
-                VALUES (?, ?, ?, ?)
-            """, (area_code, report_time, date, weather))
-        self.conn.commit()
-
-    def get_forecast_by_date(self, area_code, target_date):
-        """（オプション: 日付選択で過去の予報を閲覧）"""
-        cursor = self.conn.cursor()
-        # 指定された日付の予報をすべて取得（発表日時が新しい順）
-        cursor.execute("""
-            SELECT report_datetime, weather_text FROM forecasts 
-            WHERE area_code = ? AND forecast_date = ?
-            ORDER BY report_datetime DESC
-        """, (area_code, target_date))
-        return cursor.fetchall()
+
+logger = logging.getLogger(__name__)
 
 class WeatherApp:
-    def __init__(self):
-        self.db = WeatherDB()
+    def __init__(self, db=None, cache=None, area_url=AREA_URL, forecast_url=FORECAST_URL):
+        self.db = db or WeatherDB()
+        self.cache = cache or get_cache()
+        # ベンチマークではローカルのスタブサーバーに向ける
+        self.area_url = area_url
+        self.forecast_url = forecast_url
+        self.area_index = None
 
     def initialize_data(self):
-        """エリア情報が空ならAPIから取得してDBに保存"""
-        areas = self.db.get_areas()
-        if not areas:
+        """地域階層の索引がDBになければAPIから取得してDBに保存"""
+        self.area_index = self.db.get_area_index()
+        if self.area_index is None:
             print("DBにエリア情報がないため、APIから取得します...")
-            res = requests.get(AREA_URL)
-            offices = res.json().get("offices", {})
-            self.db.save_areas(offices)
+            res = self.cache.get(self.area_url)
+            # centers〜class20s のすべての階層を索引にする（offices は areas にも入る）
+            self.area_index = AreaIndex.from_area_json(res.json())
+            self.db.save_area_index(self.area_index)
+
+    def fetch_forecast(self, area_code, latest_report_time=None):
+        """最新の予報を取得して列形式に変換（DBに保存済みの発表 latest_report_time と同じなら None）"""
+        res = self.cache.get(self.forecast_url.format(area_code))
+        # 304 やTTL内のヒットでも、前回の保存に失敗していればDBにはまだない。
+        # 先頭の発表日時だけを読んで、保存済みと同じときだけ解析もDB書き込みも省く
+        if (not res.changed and latest_report_time is not None
+                and peek_report_time(res.body) == latest_report_time):
+            return None
+        return parse_forecast(res.body, area_code)
 
     def sync_weather(self, area_code):
         """最新の天気を取得してDBに保存（蓄積）"""
         try:
-            res = requests.get(FORECAST_URL.format(area_code))
-            data = res.json()
-            report_time = data[0]["reportDatetime"]
-            time_series = data[0]["timeSeries"][0]
-            
-            times = [t[:10] for t in time_series["timeDefines"]]
-            weathers = time_series["areas"][0]["weathers"]
-            
-            self.db.save_forecast(area_code, report_time, list(zip(times, weathers)))
+            latest = self.db.get_latest_report_time(area_code)
+            parsed = self.fetch_forecast(area_code, latest)
+            # 発表日時が変わっていなければ保存済みと同じ内容
+            if parsed is None or parsed.report_time == latest:
+                return
+            self.db.save_parsed_forecasts([parsed])
         except Exception as e:
-            print(f"同期エラー: {e}")
+            logger.warning("同期エラー(%s): %s", area_code, e)
+            計測.inc("weather_sync_errors_total", stage="sync")
 
 def main(page: ft.Page):
     page.title = "気象庁 天気予報 履歴閲覧システム"
@@ -105,36 +72,30 @@ def main(page: ft.Page):
     # 状態管理用
     state = {"selected_area_code": None, "selected_area_name": None}
 
-    weather_display = ft.Column(expand=True, scroll=ft.ScrollMode.AUTO)
-    
+    # 操作ごとに作ったコントロール数と更新量を記録する
+    metrics = UIMetrics(verbose=True)
+    title = ft.Text("", style=ft.TextThemeStyle.HEADLINE_SMALL)
+    empty_message = ft.Text("該当日のデータがDBにありません。地域を選択して最新データを取得してください。",
+                            visible=False)
+    cards = CardGrid(metrics, title_style={"size": 12, "color": ft.Colors.BLUE_700},
+                     body_style={"size": 14})
+    weather_display = ft.Column([title, empty_message, cards.grid], expand=True, scroll=ft.ScrollMode.AUTO)
+
     def display_weather_cards(area_code, area_name, target_date):
-        """DBからデータを読み取って表示"""
-        results = app.db.get_forecast_by_date(area_code, target_date)
-        
-        weather_display.controls.clear()
-        weather_display.controls.append(
-            ft.Text(f"{area_name} : {target_date} の予報履歴", style=ft.TextThemeStyle.HEADLINE_SMALL)
-        )
-        
-        if not results:
-            weather_display.controls.append(ft.Text("該当日のデータがDBにありません。地域を選択して最新データを取得してください。"))
-        else:
-            grid = ft.ResponsiveRow()
-            for report_time, weather in results:
-                grid.controls.append(
-                    ft.Card(
-                        content=ft.Container(
-                            content=ft.Column([
-                                ft.Text(f"発表時刻: {report_time}", size=12, color=ft.Colors.BLUE_700),
-                                ft.Text(weather, size=14),
-                            ]),
-                            padding=15,
-                        ),
-                        col={"sm": 12, "md": 6}
-                    )
-                )
-            weather_display.controls.append(grid)
-        page.update()
+        """DBからデータを読み取って表示（変わったカードだけを送る）"""
+        # 同期のスレッドからも呼ばれるので、カード・metrics・app.db は1つの操作ずつ使う
+        with metrics.operation("display"):
+            results = app.db.get_forecast_by_date(area_code, target_date)
+
+            title.value = f"{area_name} : {target_date} の予報履歴"
+            empty_message.visible = not results
+            update = cards.render([
+                (report_time, f"発表時刻: {report_time}", weather) for report_time, weather in results
+            ])
+            title.update()
+            empty_message.update()
+            metrics.sent_update(2, (title.value,))
+            cards.flush(*update)
 
     # 日付選択ハンドラ
     def on_date_change(e):
@@ -145,23 +106,69 @@ def main(page: ft.Page):
     date_picker = ft.DatePicker(on_change=on_date_change)
     page.overlay.append(date_picker)
 
-    def on_area_click(e):
-        state["selected_area_code"] = e.control.data
-        state["selected_area_name"] = e.control.title.value
-        
-        # 最新情報を取得してDBへ
-        app.sync_weather(state["selected_area_code"])
-        
-        # 今日（最新）の情報を表示
+    def show_today():
+        # 今日（最新）の情報を表示（呼び出し側が metrics.lock を持って選択中の地域を確かめる）
         today = datetime.now().strftime("%Y-%m-%d")
         display_weather_cards(state["selected_area_code"], state["selected_area_name"], today)
 
-    # UI構成
-    area_list = ft.ListView(expand=True, spacing=2)
-    for code, name in app.db.get_areas():
-        area_list.controls.append(
-            ft.ListTile(title=ft.Text(name), on_click=on_area_click, data=code)
-        )
+    def on_area_click(e):
+        # 予報は office ごとなので、市区町村などを選んだときは含まれる office の予報を出す
+        area_code = app.area_index.office_of(e.control.data)
+        if area_code is None:
+            # 地方（centers）は、その中の府県の一覧に絞り込む
+            show_areas(app.area_index.children_of(e.control.data))
+            return
+        with metrics.lock:
+            state["selected_area_code"] = area_code
+            state["selected_area_name"] = e.control.title.value
+            # まずDBにある内容をすぐ表示し、最新の予報は裏で確認する
+            show_today()
+        pipeline.request(area_code, lambda parsed: on_fetched(area_code, parsed))
+
+    def on_fetched(area_code, parsed):
+        # 新しい発表があれば書き込み担当に保存させ、保存できたらその場で描き直す
+        if parsed is None:
+            return
+        scheduler.write(parsed, lambda saved: refresh_if_selected(area_code, saved))
+
+    def refresh_if_selected(area_code, saved):
+        # 書き込み担当のスレッドから呼ばれる。画面の操作と重ならないよう lock の中で確かめて描く
+        with metrics.lock:
+            if saved and state["selected_area_code"] == area_code:
+                show_today()
+
+    def on_sync_cycle(report):
+        # 同期が終わったら、表示中の地域を最新の内容で描き直す（これも同期のスレッドから呼ばれる）
+        with metrics.lock:
+            if report["saved"] and state["selected_area_code"]:
+                show_today()
+
+    scheduler = SyncScheduler(app, WeatherDB, on_cycle=on_sync_cycle)
+    scheduler.start()
+    def fetch_latest(area_code):
+        # DBに保存済みの発表と同じなら、本文の解析を省く（app.db は画面の操作と同じ lock の中で読む）
+        with metrics.lock:
+            latest = app.db.get_latest_report_time(area_code)
+        return app.fetch_forecast(area_code, latest)
+
+    # 選択が切り替わったら古い取得は捨て、同じ地域の取得はまとめる
+    pipeline = FetchPipeline(fetch_latest)
+
+    # UI構成（見える範囲の行だけを作る）
+    area_list = LazyListView(on_area_click, metrics, expand=True, spacing=2)
+    area_list.set_items(app.area_index.search(""))
+
+    def show_areas(items):
+        with metrics.operation("search"):
+            area_list.set_items(items)
+            area_list.view.update()
+            metrics.sent_update(len(area_list.view.controls),
+                                (label for _, label in items[:area_list.page_size]))
+
+    # 地域名・かな・英語名・コードの前方一致で、市区町村まで1文字ごとに絞り込む
+    search_box = ft.TextField(hint_text="地域を検索（例: ちよだ, 千代田, 13）", dense=True,
+                              prefix_icon=ft.Icons.SEARCH,
+                              on_change=lambda e: show_areas(app.area_index.search(e.control.value)))
 
     # メイン表示エリアのヘッダー
     header = ft.Row([
@@ -173,7 +180,8 @@ def main(page: ft.Page):
     page.add(
         ft.Row(
             [
-                ft.Container(content=area_list, width=250, bgcolor=ft.Colors.GREY_100),
+                ft.Container(content=ft.Column([search_box, area_list.view], expand=True),
+                             width=250, bgcolor=ft.Colors.GREY_100),
                 ft.VerticalDivider(width=1),
                 ft.Container(
                     content=ft.Column([header, weather_display], expand=True),
@@ -183,6 +191,9 @@ def main(page: ft.Page):
             expand=True,
         )
     )
+    起動計測.mark("最初の画面")
 
 if __name__ == "__main__":
+    # 同期の結果やエラーはログで出す（METRICS_PORT を付けると /metrics でも見られる）
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     ft.app(target=main)
\ No newline at end of file
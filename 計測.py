@@ -0,0 +1,232 @@
+"""軽量な計測（カウンター・ヒストグラム・タイマー）
+
+既定では無効で、無効のときの inc() / observe() / timer() は何も記録せずにすぐ戻る
+（本番で呼び出しを残したままにしてよい）。次のどれかで有効にする。
+
+  METRICS=1               … 記録する
+  METRICS_PORT=9464       … http://127.0.0.1:9464/metrics で Prometheus のテキスト形式、
+                            /metrics.json で JSON を返す
+  METRICS_FILE=path.json  … 終了時に JSON で書き出す
+
+関数には @timed(name) を付けてもよい。
+プログラムからは enable() / serve(port) / write_json(path) でも同じことができる。
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# ヒストグラムの区切り（秒）。HTTP・DB・描画のどれも収まるよう 0.5ms〜10秒
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = False
+_lock = threading.Lock()
+# (名前, ラベル) -> 値
+_counters = {}
+# (名前, ラベル) -> [区切りごとの件数..., 区切りを超えた件数], 合計, 件数
+_histograms = {}
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, value=1, **labels):
+    """カウンターを増やす"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """ヒストグラムに1件記録する（時間なら秒で）"""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    i = bisect_left(DEFAULT_BUCKETS, value)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * (len(DEFAULT_BUCKETS) + 1), 0.0, 0]
+        hist[0][i] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            inc(self.name.rsplit("_seconds", 1)[0] + "_errors_total", **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name, **labels):
+    """with で囲んだ処理の時間を name（秒のヒストグラム）に記録する
+
+    例外で抜けたときは、name の _seconds を _errors_total に替えたカウンターも増やす。
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _Timer(name, labels)
+
+
+def timed(name, **labels):
+    """関数の実行時間を記録するデコレーター（無効のときは元の関数を呼ぶだけ）"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Timer(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# --- 書き出し ---
+
+def snapshot():
+    """記録した値を JSON にできる形で返す"""
+    with _lock:
+        counters = list(_counters.items())
+        histograms = [(key, (list(h[0]), h[1], h[2])) for key, h in _histograms.items()]
+    result = {"counters": {}, "histograms": {}}
+    for (name, labels), value in sorted(counters):
+        result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+    for (name, labels), (buckets, total, count) in sorted(histograms):
+        result["histograms"].setdefault(name, []).append({
+            "labels": dict(labels), "count": count, "sum": total,
+            "mean": total / count if count else 0.0,
+            "buckets": dict(zip([str(b) for b in DEFAULT_BUCKETS] + ["+Inf"], buckets)),
+        })
+    return result
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    text = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                    for k, v in items)
+    return "{" + text + "}"
+
+
+def render_prometheus():
+    """Prometheus のテキスト形式（exposition format）で返す"""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in _histograms.items())
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (buckets, total, count) in histograms:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip(list(DEFAULT_BUCKETS) + ["+Inf"], buckets):
+            cumulative += n
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_json(path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def serve(port=9464, host="127.0.0.1"):
+    """/metrics と /metrics.json を返すサーバーを裏のスレッドで起動する（計測も有効にする）"""
+    # 使うときだけ読み込む（計測を使うだけのモジュールの起動を遅くしない）
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = render_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body = json.dumps(snapshot(), ensure_ascii=False).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    enable()
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+# 環境変数での設定（読み込んだ時点で1回だけ）
+if os.environ.get("METRICS") or os.environ.get("METRICS_PORT") or os.environ.get("METRICS_FILE"):
+    enable()
+    if os.environ.get("METRICS_PORT"):
+        serve(int(os.environ["METRICS_PORT"]))
+    if os.environ.get("METRICS_FILE"):
+        atexit.register(write_json, os.environ["METRICS_FILE"])
@@ -1,34 +1,49 @@
+import logging
+
 import flet as ft
-import requests
+
+from キャッシュ import get_cache
+from 仮想リスト import CardGrid, LazyListView, UIMetrics
+from 地域索引 import AreaIndex
+from 非同期取得 import FetchPipeline
+import 起動計測
+import 計測
 
 # 気象庁APIのエンドポイント
 AREA_URL = "http://www.jma.go.jp/bosai/common/const/area.json"
 FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
 
+logger = logging.getLogger(__name__)
+
 class WeatherApp:
     def __init__(self):
-        self.areas = {}
+        self.area_index = AreaIndex([])
 
     def fetch_areas(self):
         """地域リストを取得"""
         try:
-            res = requests.get(AREA_URL)
-            res.raise_for_status()
-            # 「offices」階層から都府県のリストを取得
-            self.areas = res.json().get("offices", {})
+            res = get_cache().get(AREA_URL)
+            # centers〜class20s のすべての階層を索引にする（一覧の初期表示は offices）
+            self.area_index = AreaIndex.from_area_json(res.json())
         except Exception as e:
-            print(f"エリア取得エラー: {e}")
+            logger.warning("エリア取得エラー: %s", e)
+            計測.inc("weather_fetch_errors_total", target="area")
 
     def fetch_weather(self, area_code):
         """特定の地域の天気情報を取得"""
         try:
-            res = requests.get(FORECAST_URL.format(area_code))
-            res.raise_for_status()
+            res = get_cache().get(FORECAST_URL.format(area_code))
             return res.json()
         except Exception as e:
-            print(f"天気取得エラー: {e}")
+            logger.warning("天気取得エラー(%s): %s", area_code, e)
+            計測.inc("weather_fetch_errors_total", target="forecast")
             return None
 
+    def peek_weather(self, area_code):
+        """通信せずに、前回取得した天気情報を返す（なければ None）"""
+        res = get_cache().peek(FORECAST_URL.format(area_code))
+        return res.json() if res else None
+
 def main(page: ft.Page):
     page.title = "気象庁 天気予報"
     page.theme_mode = ft.ThemeMode.LIGHT
@@ -40,76 +55,104 @@ def main(page: ft.Page):
 
     # 右側：天気表示エリア
     # エラー回避のため、Colorsは大文字の「ft.Colors」を使用します
+    # コントロールは最初に1回だけ作り、地域を切り替えても中身だけを書き換える
+    metrics = UIMetrics(verbose=True)
+    placeholder = ft.Text("左のリストから地域を選択してください", size=16, color=ft.Colors.GREY_500)
+    progress = ft.ProgressBar(width=400, color="blue", visible=False)
+    title = ft.Text("", style=ft.TextThemeStyle.HEADLINE_MEDIUM, visible=False)
+    report_text = ft.Text("", size=12, color=ft.Colors.GREY_700, visible=False)
+    divider = ft.Divider(visible=False)
+    error_text = ft.Text("データの取得に失敗しました", color=ft.Colors.RED, visible=False)
+    cards = CardGrid(metrics, col={"sm": 12, "md": 6, "lg": 4},  # 画面幅に応じて調整
+                     title_style={"weight": ft.FontWeight.BOLD}, body_style={"size": 13})
+    status_controls = [placeholder, progress, title, report_text, divider, error_text]
     weather_display = ft.Column(
         expand=True,
         scroll=ft.ScrollMode.AUTO,
-        controls=[ft.Text("左のリストから地域を選択してください", size=16, color=ft.Colors.GREY_500)]
+        controls=status_controls + [cards.grid],
     )
 
+    def show(*visible):
+        # 表示・非表示と文字だけが変わるので、小さなコントロールごとに送る
+        for control in status_controls:
+            control.visible = control in visible
+            control.update()
+        metrics.sent_update(len(status_controls), (title.value, report_text.value))
+
+    def render(area_name, data):
+        """取得済みの予報を表示（日付をキーにして、変わったカードだけ更新）"""
+        # 予報データの抽出
+        report_time = data[0]["reportDatetime"]
+        time_series = data[0]["timeSeries"][0]
+        forecast_area = time_series["areas"][0]
+
+        times = time_series["timeDefines"]
+        weathers = forecast_area["weathers"]
+
+        title.value = f"{area_name} の予報"
+        report_text.value = f"発表: {report_time}"
+        return cards.render([(i, times[i][:10], weathers[i]) for i in range(len(weathers))])
+
+    # 選択が切り替わったら古い取得は捨て、同じ地域の取得はまとめる
+    pipeline = FetchPipeline(app.fetch_weather)
+
     def on_area_click(e):
-        area_code = e.control.data
-        area_name = app.areas[area_code]["name"]
-        
-        weather_display.controls = [ft.ProgressBar(width=400, color="blue")]
-        page.update()
-
-        data = app.fetch_weather(area_code)
-        
-        if data:
-            # 予報データの抽出
-            report_time = data[0]["reportDatetime"]
-            time_series = data[0]["timeSeries"][0]
-            forecast_area = time_series["areas"][0]
-            
-            times = time_series["timeDefines"]
-            weathers = forecast_area["weathers"]
-
-            # 表示の更新
-            weather_display.controls = [
-                ft.Text(f"{area_name} の予報", style=ft.TextThemeStyle.HEADLINE_MEDIUM),
-                ft.Text(f"発表: {report_time}", size=12, color=ft.Colors.GREY_700),
-                ft.Divider(),
-            ]
-            
-            # 各日の予報をカード形式で表示
-            grid = ft.ResponsiveRow()
-            for i in range(len(weathers)):
-                grid.controls.append(
-                    ft.Card(
-                        content=ft.Container(
-                            content=ft.Column([
-                                ft.Text(times[i][:10], weight=ft.FontWeight.BOLD),
-                                ft.Text(weathers[i], size=13),
-                            ]),
-                            padding=15,
-                        ),
-                        col={"sm": 12, "md": 6, "lg": 4} # 画面幅に応じて調整
-                    )
-                )
-            weather_display.controls.append(grid)
-        else:
-            weather_display.controls = [ft.Text("データの取得に失敗しました", color=ft.Colors.RED)]
-        
-        page.update()
-
-    # 左側：地域リスト
-    area_list = ft.ListView(expand=True, spacing=2)
-    for code, info in sorted(app.areas.items()):
-        area_list.controls.append(
-            ft.ListTile(
-                title=ft.Text(info["name"]),
-                on_click=on_area_click,
-                data=code,
-                hover_color=ft.Colors.BLUE_50,
-            )
-        )
+        # 予報は office ごとなので、市区町村などを選んだときは含まれる office の予報を出す
+        area_code = app.area_index.office_of(e.control.data)
+        if area_code is None:
+            # 地方（centers）は、その中の府県の一覧に絞り込む
+            show_areas(app.area_index.children_of(e.control.data))
+            return
+        area_name = e.control.title.value
+        # 前に取得した予報があれば、通信を待たずにすぐ表示する
+        cached = app.peek_weather(area_code)
+        with metrics.operation("area_click"):
+            if cached:
+                update = render(area_name, cached)
+                show(title, report_text, divider, progress)
+                cards.flush(*update)
+            else:
+                cards.flush(*cards.render([]))
+                show(progress)
+
+        pipeline.request(area_code, lambda data: on_fetched(area_name, data, cached))
+
+    def on_fetched(area_name, data, cached):
+        # 最新の選択に対する結果だけがここに届く。取得のスレッドから呼ばれるので、
+        # 地域のクリックなど画面の操作とは metrics.operation で重ならないようにする
+        with metrics.operation("refresh"):
+            if data:
+                update = render(area_name, data)
+                show(title, report_text, divider)
+                cards.flush(*update)
+            elif cached:
+                show(title, report_text, divider)
+            else:
+                show(error_text)
+
+    # 左側：地域リスト（見える範囲の行だけを作る）
+    area_list = LazyListView(on_area_click, metrics, tile_style={"hover_color": ft.Colors.BLUE_50},
+                             expand=True, spacing=2)
+    area_list.set_items(app.area_index.search(""))
+
+    def show_areas(items):
+        with metrics.operation("search"):
+            area_list.set_items(items)
+            area_list.view.update()
+            metrics.sent_update(len(area_list.view.controls),
+                                (label for _, label in items[:area_list.page_size]))
+
+    # 地域名・かな・英語名・コードの前方一致で、市区町村まで1文字ごとに絞り込む
+    search_box = ft.TextField(hint_text="地域を検索（例: ちよだ, 千代田, 13）", dense=True,
+                              prefix_icon=ft.Icons.SEARCH,
+                              on_change=lambda e: show_areas(app.area_index.search(e.control.value)))
 
     # 全体レイアウト
     page.add(
         ft.Row(
             [
                 ft.Container(
-                    content=area_list,
+                    content=ft.Column([search_box, area_list.view], expand=True),
                     width=250,
                     bgcolor=ft.Colors.GREY_100,
                     padding=5,
@@ -124,7 +167,9 @@ def main(page: ft.Page):
             expand=True,
         )
     )
+    起動計測.mark("最初の画面")
 
 # 実行
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     ft.app(target=main)
\ No newline at end of file
@@ -1,13 +1,19 @@
-import flet as ft
-import requests
+import logging
 import sqlite3
 from datetime import datetime
 
+import flet as ft
+
+import 起動計測
+import 計測
+
 # 定数
 AREA_URL = "http://www.jma.go.jp/bosai/common/const/area.json"
 FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
 DB_NAME = "weather_history_app.db"
 
+logger = logging.getLogger(__name__)
+
 class WeatherDB:
     def __init__(self):
         self.conn = sqlite3.connect(DB_NAME, check_same_thread=False)
@@ -75,6 +81,8 @@ class WeatherApp:
         areas = self.db.get_areas()
         if not areas:
             print("DBにエリア情報がないため、APIから取得します...")
+            # requests は通信するときに初めて読み込む（画面を先に出すため）
+            import requests
             res = requests.get(AREA_URL)
             offices = res.json().get("offices", {})
             self.db.save_areas(offices)
@@ -82,6 +90,7 @@ class WeatherApp:
     def sync_weather(self, area_code):
         """最新の天気を取得してDBに保存（蓄積）"""
         try:
+            import requests
             res = requests.get(FORECAST_URL.format(area_code))
             data = res.json()
             report_time = data[0]["reportDatetime"]
@@ -92,7 +101,8 @@ class WeatherApp:
             
             self.db.save_forecast(area_code, report_time, list(zip(times, weathers)))
         except Exception as e:
-            print(f"同期エラー: {e}")
+            logger.warning("同期エラー(%s): %s", area_code, e)
+            計測.inc("weather_sync_errors_total", stage="sync")
 
 def main(page: ft.Page):
     page.title = "気象庁 天気予報 履歴閲覧システム"
@@ -183,6 +193,8 @@ def main(page: ft.Page):
             expand=True,
         )
     )
+    起動計測.mark("最初の画面")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     ft.app(target=main)
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""起動時間の計測（python -X importtime のように、最初に表示できるまでの時間を出す）
+
+環境変数 STARTUP_PROFILE=1 を付けて起動すると、各入口で mark() を呼んだ時点までの
+経過時間と、その時点で読み込み済みの重いライブラリを標準エラーに出す。
+
+  STARTUP_PROFILE=1 python dsprog最終課題/cli.py stats
+  STARTUP_PROFILE=1 python 天気課題２.py
+
+経過時間は、このモジュールを読み込んだ時刻から数える。起動した側が STARTUP_T0
+（time.time() の値）を渡せば、インタプリタの起動も含めた時間になる。
+モジュールごとの内訳は ベンチマーク/起動時間.py が -X importtime で集計する。
+"""
+import os
+import sys
+import time
+
+ENABLED = bool(os.environ.get("STARTUP_PROFILE"))
+# 読み込みに時間がかかるライブラリ（起動時に読み込まれているかを表示する）
+HEAVY_MODULES = ("flet", "requests", "sqlite3", "numpy", "pandas", "matplotlib")
+
+_t0 = float(os.environ.get("STARTUP_T0") or time.time())
+_marked = set()
+
+
+def elapsed_ms():
+    return (time.time() - _t0) * 1000
+
+
+def loaded_heavy_modules():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def mark(label):
+    """label までの経過時間を1回だけ出す（STARTUP_PROFILE がなければ何もしない）"""
+    if not ENABLED or label in _marked:
+        return
+    _marked.add(label)
+    modules = ", ".join(loaded_heavy_modules()) or "なし"
+    # ベンチマークが -X importtime の出力と並べて読むので、1行で出す
+    print(f"startup | {elapsed_ms():9.1f} ms | {label} | 読み込み済み: {modules}",
+          file=sys.stderr, flush=True)
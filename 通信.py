@@ -0,0 +1,124 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+import 計測
+
+# 接続・読み込みのタイムアウト（秒）
+DEFAULT_TIMEOUT = (3.05, 10)
+# 1ホストあたりに保持する接続数の上限
+DEFAULT_MAX_PER_HOST = 8
+# 再試行の対象にするステータスコード
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ConnectionStats:
+    """新規に開いた接続数と送信したリクエスト数を数える"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+
+    def add_opened(self):
+        with self.lock:
+            self.opened += 1
+
+    def add_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "opened": self.opened,
+                "requests": self.requests,
+                # 新規接続を開かずに済んだリクエスト = 再利用
+                "reused": max(self.requests - self.opened, 0),
+            }
+
+
+def _counting_pool(base, stats):
+    # urllib3 の接続プールを継承して、接続の作成とリクエストを数える
+    class CountingPool(base):
+        def _new_conn(self):
+            stats.add_opened()
+            return super()._new_conn()
+
+        def _make_request(self, *args, **kwargs):
+            stats.add_request()
+            return super()._make_request(*args, **kwargs)
+
+    return CountingPool
+
+
+class CountingAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self.stats),
+            "https": _counting_pool(HTTPSConnectionPool, self.stats),
+        }
+
+
+class HTTPClient:
+    """Keep-Alive で接続を使い回す共通HTTPクライアント"""
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_per_host=DEFAULT_MAX_PER_HOST,
+                 retries=3, backoff_factor=0.5):
+        self.timeout = timeout
+        self.stats = ConnectionStats()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,  # 0.5, 1.0, 2.0 ... 秒と指数的に待つ
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = CountingAdapter(
+            self.stats,
+            pool_connections=16,
+            pool_maxsize=max_per_host,
+            pool_block=True,  # 上限を超えたら新しい接続を開かずに空きを待つ
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        with 計測.timer("http_request_seconds"):
+            res = self.session.get(url, params=params, headers=headers,
+                                   timeout=timeout or self.timeout)
+        計測.inc("http_responses_total", status=res.status_code)
+        return res
+
+    def get_json(self, url, params=None):
+        res = self.get(url, params=params)
+        res.raise_for_status()
+        with 計測.timer("json_parse_seconds", source="http"):
+            return res.json()
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """プロセス内で共有するHTTPClientを返す"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HTTPClient()
+        return _client
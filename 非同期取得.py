@@ -0,0 +1,81 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class FetchPipeline:
+    """UIスレッドを止めずに取得する。古い選択の結果は捨て、同じキーの取得はまとめる
+
+    - まだ始まっていない、選択が切り替わった取得はキャンセルする
+    - すでに通信中のものは止められないので、終わったときに結果を捨てる
+    - 同じキーを取得中にもう一度要求されたら、新しく通信せずに同じ結果を待つ
+    """
+    def __init__(self, fetch, max_workers=2):
+        self.fetch = fetch
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        # cancel() はその場で完了コールバック（_forget）を呼ぶので、再入できるロックにする
+        self.lock = threading.RLock()
+        self.inflight = {}  # キー -> Future
+        self.generation = 0
+        self.counters = {"started": 0, "coalesced": 0, "cancelled": 0, "dropped": 0, "delivered": 0,
+                         "errors": 0}
+
+    def request(self, key, on_result, on_error=None):
+        """key の取得を始め、それが最新の要求のままなら on_result(結果) を呼ぶ"""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+
+            for other, future in list(self.inflight.items()):
+                if other != key and future.cancel():
+                    self.inflight.pop(other, None)
+                    self.counters["cancelled"] += 1
+
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.executor.submit(self.fetch, key)
+                self.inflight[key] = future
+                future.add_done_callback(lambda f, key=key: self._forget(key, f))
+                self.counters["started"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        future.add_done_callback(
+            lambda f: self._deliver(generation, f, on_result, on_error)
+        )
+        return future
+
+    def _forget(self, key, future):
+        with self.lock:
+            if self.inflight.get(key) is future:
+                self.inflight.pop(key)
+
+    def _deliver(self, generation, future, on_result, on_error):
+        if future.cancelled():
+            return
+        with self.lock:
+            if generation != self.generation:
+                # 後から別の要求が来ているので、この結果は表示しない
+                self.counters["dropped"] += 1
+                return
+            self.counters["delivered"] += 1
+
+        error = future.exception()
+        if error is not None:
+            with self.lock:
+                self.counters["errors"] += 1
+            if on_error:
+                on_error(error)
+            else:
+                logger.warning("取得エラー: %s", error)
+            return
+        on_result(future.result())
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)